@@ -0,0 +1,72 @@
+'''
+Compares loading a large config by parsing it with `json5` (the original loader), by parsing it with `load_jsonc`,
+and from the compiled config cache.
+
+Usage: python -m benchmarks.config [--patches N]
+'''
+import argparse
+import json
+import os
+import re
+import tempfile
+
+import json5
+
+from benchmarks.utils import bench, report
+from src.patcher.config import Config
+from src.snapshot import GlobPattern
+
+
+def make_config(path: str, patches: int):
+    config = {'patches': [
+        {
+            'patch': [
+                {'file': f'config/mod{i}.json', 'with': f'data/mod{i}.json', 'method': 'merge'},
+                {'file': f'resourcepacks/pack{i}.zip', 'with': f'packs/pack{i}.zip', 'method': 'insert'},
+            ],
+            'if': [
+                {'file': [f'mods/Mod{i}*.jar', f'mods/mod-{i}-*.jar']},
+                {'file': f'config/mod{i}.json', 'exists': False},
+                {'instance_pattern': f'.*/instances/group{i % 10}/.*'},
+            ],
+        }
+        for i in range(patches)
+    ]}
+    with open(path, 'w') as f:
+        f.write('// generated config\n')
+        f.write(json.dumps(config, indent=4))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--patches', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'config.jsonc')
+        make_config(path, args.patches)
+
+        # start every load with empty pattern caches, like a new process does
+        def fresh(load):
+            def wrapper():
+                GlobPattern.compile.cache_clear()
+                re.purge()
+                load()
+            return wrapper
+
+        def load_json5():
+            with open(path, 'r') as f:
+                Config(json5.load(f), root)
+
+        json5_time = bench(fresh(load_json5), args.repeat)
+        parse_time = bench(fresh(lambda: Config(path, root, cache=False)), args.repeat)
+        Config(path, root)  # create the cache
+        cached_time = bench(fresh(lambda: Config(path, root)), args.repeat)
+
+    report(f'json5 vs compiled cache ({args.patches} patches)', json5_time, cached_time)
+    report(f'load_jsonc vs compiled cache ({args.patches} patches)', parse_time, cached_time)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+'''
+Compares the serial `os.listdir` instance discovery with `src.discovery.scan.discover`,
+a full scan with a warm `src.discovery.index.InstanceIndex`, and the time until `iter_discover`
+yields the first instance, which is when the streaming mode starts patching.
+
+Usage: python -m benchmarks.discovery [--groups N] [--instances N] [--latency MS]
+
+Use `--latency` to simulate a network filesystem, where every directory listing or stat is a round trip.
+On a local SSD with a warm page cache the listings are so cheap that the thread pool can't pay off.
+'''
+import argparse
+import contextlib
+import os
+import tempfile
+import time
+from unittest import mock
+
+from benchmarks.utils import bench, report
+from src.discovery.index import InstanceIndex
+from src.discovery.scan import discover, iter_discover
+
+
+def legacy_from_path(path: str, ignore: list[str] = None, max_recursion: int = 2) -> list[str]:
+    '''The original serial implementation of `GameInstance.from_path`.'''
+    instances = []
+    if max_recursion == 0:
+        return instances
+
+    for folder in os.listdir(path):
+        wd = os.path.join(path, folder)
+        if not os.path.isdir(wd):
+            continue
+        if ignore and folder in ignore:
+            continue
+        if os.path.isdir(os.path.join(wd, 'saves')) or os.path.isdir(os.path.join(wd, 'mods')):
+            instances.append(wd)
+        else:
+            instances.extend(legacy_from_path(wd, ignore, max_recursion - 1))
+    return instances
+
+
+def make_tree(root: str, groups: int, instances: int):
+    '''Create `groups` folders with `instances` instances each, every instance holding a few folders and files.'''
+    for g in range(groups):
+        for i in range(instances):
+            instance = os.path.join(root, f'group{g}', f'instance{i}')
+            for folder in ('mods', 'config', 'resourcepacks', 'logs'):
+                os.makedirs(os.path.join(instance, folder))
+            open(os.path.join(instance, 'options.txt'), 'w').close()
+        # a group also contains a few plain files
+        open(os.path.join(root, f'group{g}', 'notes.txt'), 'w').close()
+
+
+@contextlib.contextmanager
+def simulated_latency(latency: float):
+    '''Delay every `os.listdir`, `os.scandir` and `os.stat` call by `latency` seconds.'''
+    if not latency:
+        yield
+        return
+
+    def delayed(func):
+        def wrapper(*args, **kwargs):
+            time.sleep(latency)
+            return func(*args, **kwargs)
+        return wrapper
+
+    with mock.patch('os.listdir', delayed(os.listdir)), \
+            mock.patch('os.scandir', delayed(os.scandir)), \
+            mock.patch('os.stat', delayed(os.stat)):
+        yield
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--groups', type=int, default=20)
+    parser.add_argument('--instances', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0, help='Simulated latency per call in ms')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        make_tree(root, args.groups, args.instances)
+        assert legacy_from_path(root) == discover(root)
+
+        with simulated_latency(args.latency / 1000):
+            before = bench(lambda: legacy_from_path(root), args.repeat)
+            after = bench(lambda: discover(root), args.repeat)
+        name = f'{args.groups * args.instances} instances, {args.latency} ms latency'
+        report(f'discovery ({name})', before, after)
+
+        index_path = os.path.join(root, 'index.json')
+        index = InstanceIndex(index_path)
+        index.discover(root)
+        index.save()
+
+        with simulated_latency(args.latency / 1000):
+            warm = bench(lambda: InstanceIndex(index_path).discover(root), args.repeat)
+        report(f'warm index ({name})', after, warm)
+
+        assert list(iter_discover(root)) == discover(root)
+        with simulated_latency(args.latency / 1000):
+            first = bench(lambda: next(iter_discover(root)), args.repeat)
+        report(f'first instance ({name})', after, first)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+'''
+Compares parsing and writing a large mod config with the original merge backends (`json5`, the pure Python
+`yaml.safe_load`/`safe_dump` and `toml`) and with the backends `src.patcher.merge` selects.
+
+Usage: python -m benchmarks.formats [--keys N]
+'''
+import argparse
+import io
+import json
+
+import json5
+import toml
+import yaml
+
+from benchmarks.utils import bench, report
+from src.patcher.merge import json_backend, toml_backend, yaml_backend
+
+
+def make_config(keys: int) -> dict:
+    '''A config like the big ones of mods: sections of options with numbers, strings, booleans and lists.'''
+    return {
+        f'section{s}': {
+            f'option{i}': {'enabled': i % 2 == 0, 'value': i * 1.5, 'name': f'option {i}', 'tags': ['a', 'b', str(i)]}
+            for i in range(keys // 10)
+        }
+        for s in range(10)
+    }
+
+
+def measure(name: str, text: str, data: dict, before: tuple, after: tuple, repeat: int):
+    '''Time parsing the text and writing the data with the (load, dump) functions of both backends.'''
+    def parse(load):
+        return lambda: load(io.StringIO(text))
+
+    def write(dump):
+        return lambda: dump(data, io.StringIO())
+
+    report(f'{name} parse', bench(parse(before[0]), repeat), bench(parse(after[0]), repeat))
+    report(f'{name} dump', bench(write(before[1]), repeat), bench(write(after[1]), repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--keys', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    data = make_config(args.keys)
+    # most mods write strict JSON
+    json_text = json.dumps(data, indent=4)
+    yaml_text = yaml.safe_dump(data)
+    toml_text = toml.dumps(data)
+
+    # every backend must read what the original one wrote
+    assert json_backend().load(io.StringIO(json_text)) == data
+    assert yaml_backend().load(io.StringIO(yaml_text)) == data
+    assert toml_backend().load(io.StringIO(toml_text)) == data
+
+    name = f'{args.keys} options'
+    measure(f'json ({name})', json_text, data,
+            (json5.load, lambda d, fp: json5.dump(d, fp, indent=4)), json_backend(), args.repeat)
+    measure(f'yaml ({name})', yaml_text, data, (yaml.safe_load, yaml.safe_dump), yaml_backend(), args.repeat)
+    measure(f'toml ({name})', toml_text, data, (toml.load, toml.dump), toml_backend(), args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+'''
+Measures the merge throughput when merging one source into many instances,
+with the source parsed for every target (before) and parsed once by `SOURCE_CACHE` (after).
+
+Usage: python -m benchmarks.merge [--instances N] [--keys N]
+'''
+import argparse
+import os
+import tempfile
+
+import json5
+
+from benchmarks.utils import bench, report
+from src.patcher.merge import SOURCE_CACHE, merge
+
+
+def make_files(root: str, instances: int, keys: int) -> tuple[str, list[str]]:
+    '''Create a JSON5 source with `keys` keys and a small JSON target for every instance.'''
+    source = os.path.join(root, 'source.json5')
+    with open(source, 'w', encoding='utf-8') as f:
+        json5.dump({f'key{i}': {'value': i, 'list': list(range(5))} for i in range(keys)}, f, indent=4)
+
+    targets = []
+    for i in range(instances):
+        target = os.path.join(root, f'instance{i}', 'config.json5')
+        os.makedirs(os.path.dirname(target))
+        targets.append(target)
+    reset_targets(targets)
+    return source, targets
+
+
+def reset_targets(targets: list[str]):
+    '''Write the small initial document to every target.'''
+    for i, target in enumerate(targets):
+        with open(target, 'w', encoding='utf-8') as f:
+            json5.dump({'own': i}, f)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--instances', type=int, default=100)
+    parser.add_argument('--keys', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        source, targets = make_files(root, args.instances, args.keys)
+
+        # resetting the targets is part of both measurements, it takes the same time for both
+        def uncached():
+            reset_targets(targets)
+            for target in targets:
+                SOURCE_CACHE.clear()
+                merge(source, target)
+
+        def cached():
+            reset_targets(targets)
+            SOURCE_CACHE.clear()
+            for target in targets:
+                merge(source, target)
+
+        before = bench(uncached, args.repeat)
+        after = bench(cached, args.repeat)
+        report(f'merge ({args.instances} instances, {args.keys} keys)', before, after)
+        print(f'  throughput: {args.instances / before:.0f} -> {args.instances / after:.0f} merges/s')
+
+
+if __name__ == '__main__':
+    main()
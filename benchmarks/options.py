@@ -0,0 +1,75 @@
+'''
+Measures merging a few options into the `options.txt` of many instances, with the whole file loaded,
+merged and dumped again (before) and merged line by line (after).
+
+Usage: python -m benchmarks.options [--instances N] [--lines N]
+'''
+import argparse
+import os
+import tempfile
+
+from benchmarks.utils import bench, report
+from src import options
+from src.patcher.merge import SOURCE_CACHE, _merge_file, merge_options, options_backend
+
+
+def make_options(lines: int) -> str:
+    '''An `options.txt` like the game writes: the version, then settings, key bindings and sound volumes.'''
+    entries = ['version:3465', 'autoJump:false', 'fov:0.0', 'lang:en_us', 'resourcePacks:["vanilla","file/pack.zip"]']
+    keys = list(options.KEY_CODES)
+    for i in range(lines - len(entries)):
+        if i % 3 == 0:
+            entries.append(f'key_key.mod{i}:{keys[i % len(keys)]}')
+        elif i % 3 == 1:
+            entries.append(f'soundCategory_mod{i}:1.0')
+        else:
+            entries.append(f'mod{i}.enabled:{"true" if i % 2 else "false"}')
+    return '\n'.join(entries) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--instances', type=int, default=300)
+    parser.add_argument('--lines', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    text = make_options(args.lines)
+    with tempfile.TemporaryDirectory() as root:
+        source = os.path.join(root, 'options.txt')
+        with open(source, 'w', encoding='utf-8') as f:
+            f.write('autoJump:true\nfov:0.5\nkey_key.chat:key.keyboard.y\n')
+
+        targets = []
+        for i in range(args.instances):
+            target = os.path.join(root, f'instance{i}', 'options.txt')
+            os.makedirs(os.path.dirname(target))
+            targets.append(target)
+
+        def run(merge_func):
+            def func():
+                for target in targets:
+                    with open(target, 'w', encoding='utf-8') as f:
+                        f.write(text)
+                SOURCE_CACHE.clear()
+                for target in targets:
+                    merge_func(source, target)
+            return func
+
+        def load_merge_dump(from_path, to_path):
+            backend = options_backend()
+            return _merge_file(from_path, to_path, backend.load, backend.dump, from_args={'remove_version': True})
+
+        # writing the targets is part of both measurements, it takes the same time for both
+        before = bench(run(load_merge_dump), args.repeat)
+        after = bench(run(merge_options), args.repeat)
+        report(f'options.txt merge ({args.instances} instances, {args.lines} lines)', before, after)
+
+        # merging again changes nothing, so no file is written
+        SOURCE_CACHE.clear()
+        unchanged = bench(lambda: [merge_options(source, target) for target in targets], args.repeat)
+        print(f'  unchanged: {unchanged * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+'''
+Compares selecting the handlers of each instance by matching the instance pattern of every handler with its own
+`re.match` (the original `InstanceConditionObject`), with a single `src.patcher.conditions.InstanceRouter`.
+
+Usage: python -m benchmarks.routing [--patterns N] [--instances N]
+'''
+import argparse
+import re
+
+from benchmarks.utils import bench, report
+from src.instance import GameInstance
+from src.patcher.config import Config
+
+
+def legacy_select(patterns: list[str], instances: list[GameInstance]) -> list[list[int]]:
+    compiled = [re.compile(pattern) for pattern in patterns]
+    return [[i for i, regex in enumerate(compiled) if regex.match(instance.path.replace('\\', '/')) is not None]
+            for instance in instances]
+
+
+def routed_select(config: Config, instances: list[GameInstance]) -> list[list[int]]:
+    index = {id(handler): i for i, handler in enumerate(config.patches)}
+    return [[index[id(handler)] for handler in config.router.select(instance)] for instance in instances]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--patterns', type=int, default=300)
+    parser.add_argument('--instances', type=int, default=800)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    # the usual mix: full instance paths, instances of a group, and a few patterns without a prefix
+    patterns = []
+    for i in range(args.patterns):
+        if i % 10 == 0:
+            patterns.append(f'.*/instance{i}$')
+        elif i % 2:
+            patterns.append(f'/home/user/PrismLauncher/instances/group{i % 20}/.*')
+        else:
+            patterns.append(f'/home/user/PrismLauncher/instances/group{i % 20}/instance{i}')
+    paths = [f'/home/user/PrismLauncher/instances/group{i % 20}/instance{i}' for i in range(args.instances)]
+    config = Config({'patches': [
+        {'patch': {'file': 'options.txt', 'with': 'options.txt', 'method': 'insert'},
+         'if': {'instance_pattern': pattern}}
+        for pattern in patterns
+    ]}, 'configs/')
+
+    def make_instances() -> list[GameInstance]:
+        return [GameInstance(path) for path in paths]
+
+    def fresh_config() -> Config:
+        # the router keeps the matches of each path
+        config.router._matches.clear()
+        return config
+
+    assert legacy_select(patterns, make_instances()) == routed_select(fresh_config(), make_instances())
+    before = bench(lambda: legacy_select(patterns, make_instances()), args.repeat)
+    after = bench(lambda: routed_select(fresh_config(), make_instances()), args.repeat)
+    report(f'handler selection ({args.patterns} patterns, {args.instances} instances)', before, after)
+
+
+if __name__ == '__main__':
+    main()
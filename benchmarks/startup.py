@@ -0,0 +1,113 @@
+'''
+Measures the startup of a no-change run on a single Prism instance, like the pre-launch command does it.
+
+Reports the wall-clock time of the whole process and the slowest imports from `-X importtime`,
+and fails if the run is slower than `--max-ms` or loads a merge backend although nothing is merged.
+
+Usage: python -m benchmarks.startup [--max-ms N] [--repeat N]
+'''
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules that must not be imported when no merge runs
+LAZY_MODULES = ('json5', 'yaml', 'toml', 'src.options')
+
+CONFIG = '''{
+    "patches": [
+        {
+            "patch": {"file": "options.txt", "with": "options.txt", "method": "insert"},
+            "if": {"file": "options.txt", "exists": false}
+        },
+        {
+            "patch": {"file": "config/ias.json", "with": "ias.json", "method": "merge"},
+            "if": {"file": ["mods/InGameAccountSwitcher*.jar", "mods/In-Game Account Switcher*.jar"]}
+        }
+    ]
+}
+'''
+
+
+def make_instance(root: str) -> tuple[list[str], str]:
+    '''Create a Prism instance and a config folder, return the command line arguments of the run.'''
+    instance = os.path.join(root, 'instances', 'instance')
+    os.makedirs(os.path.join(instance, '.minecraft', 'mods'))
+    configs = os.path.join(root, 'configs')
+    os.makedirs(configs)
+    with open(os.path.join(configs, 'config.jsonc'), 'w') as f:
+        f.write(CONFIG)
+    with open(os.path.join(configs, 'options.txt'), 'w') as f:
+        f.write('autoJump:false\n')
+
+    args = [
+        instance,
+        '--config', os.path.join(configs, 'config.jsonc'),
+        '--data', configs,
+        '--index', os.path.join(root, 'index.json'),
+    ]
+    return args
+
+
+def run(args: list[str], *flags: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *flags, os.path.join(ROOT, 'main.py'), *args],
+                          cwd=ROOT, capture_output=True, text=True, check=True)
+
+
+def import_times(stderr: str) -> list[tuple[int, str]]:
+    '''Parse the `-X importtime` output into (cumulative microseconds, module) pairs.'''
+    times = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        times.append((int(cumulative), module.strip()))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--max-ms', type=float, default=100, help='Fail if the best run is slower')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        run_args = make_instance(root)
+        # the first run applies the patches and creates the caches
+        run(run_args)
+
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = run(run_args)
+            best = min(best, time.perf_counter() - start)
+        assert 'No changes detected' in result.stdout, result.stdout
+
+        result = run(run_args, '-X', 'importtime')
+        times = import_times(result.stderr)
+
+    # only the top-level imports, their cumulative times include the nested ones
+    top_level = sorted((t for t in times if '.' not in t[1] or t[1].startswith('src.')), reverse=True)
+    print('slowest imports:')
+    for cumulative, module in top_level[:10]:
+        print(f'  {cumulative / 1000:8.2f} ms  {module}')
+
+    print(f'no-change run: {best * 1000:.2f} ms (max {args.max_ms} ms)')
+
+    failed = False
+    loaded = [module for module in LAZY_MODULES if any(name == module for _, name in times)]
+    if loaded:
+        print(f'FAIL: merge backends loaded without a merge: {", ".join(loaded)}')
+        failed = True
+    if best * 1000 > args.max_ms:
+        print('FAIL: the no-change run is too slow')
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
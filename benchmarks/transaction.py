@@ -0,0 +1,83 @@
+'''
+Measures how long the instance files are being changed when patching many instances, with the patches applied
+in place (before) and with the changes staged first and committed with renames (after).
+
+Usage: python -m benchmarks.transaction [--instances N] [--files N] [--size KB]
+'''
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.utils import report
+from src.patcher.config import Config
+from src.patcher.transaction import Transaction
+from src.instance import GameInstance
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--instances', type=int, default=50)
+    parser.add_argument('--files', type=int, default=20)
+    parser.add_argument('--size', type=int, default=256, help='Size of every patched file in KB')
+    parser.add_argument('--jobs', type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        data = os.path.join(root, 'data')
+        os.makedirs(data)
+        patches = []
+        for i in range(args.files):
+            with open(os.path.join(data, f'file{i}.bin'), 'wb') as f:
+                f.write(os.urandom(args.size * 1024))
+            patches.append({'file': f'config/file{i}.bin', 'with': f'file{i}.bin', 'method': 'overwrite'})
+        config = Config({'patches': [{'patch': patches}]}, data, cache=False)
+
+        instances = []
+        for i in range(args.instances):
+            path = os.path.join(root, 'instances', f'instance{i}')
+            os.makedirs(os.path.join(path, 'saves'))
+            instances.append(GameInstance(path))
+
+        def clean():
+            for instance in instances:
+                for i in range(args.files):
+                    path = os.path.join(instance.path, 'config', f'file{i}.bin')
+                    if os.path.exists(path):
+                        os.remove(path)
+                instance.files.clear()
+
+        # in place, the files of an instance change during the whole time it is patched
+        clean()
+        plan = config.plan(instances, use_manifest=False)
+        start = time.perf_counter()
+        plan.apply(jobs=args.jobs)
+        before = time.perf_counter() - start
+
+        # staged, the files of an instance only change during its commit
+        clean()
+        plan = config.plan(instances, use_manifest=False)
+        commit = Transaction.commit
+        committing = []
+
+        def timed_commit(transaction):
+            start = time.perf_counter()
+            commit(transaction)
+            committing.append(time.perf_counter() - start)
+
+        Transaction.commit = timed_commit
+        try:
+            start = time.perf_counter()
+            plan.apply(jobs=args.jobs, transactional=True)
+            total = time.perf_counter() - start
+        finally:
+            Transaction.commit = commit
+        after = sum(committing)
+
+        report(f'time the instance files are changing ({args.instances} instances, {args.files} x {args.size} KB)',
+               before, after)
+        print(f'  total apply: {before * 1000:.2f} ms in place, {total * 1000:.2f} ms staged')
+
+
+if __name__ == '__main__':
+    main()
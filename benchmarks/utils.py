@@ -0,0 +1,20 @@
+import time
+import typing
+
+
+def bench(func: typing.Callable[[], typing.Any], repeat: int = 5) -> float:
+    '''Run the function `repeat` times and return the best wall-clock time in seconds.'''
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def report(name: str, before: float, after: float):
+    '''Print the timings of the baseline and the new implementation.'''
+    print(f'{name}:')
+    print(f'  before: {before * 1000:10.2f} ms')
+    print(f'  after:  {after * 1000:10.2f} ms')
+    print(f'  speedup: {before / after:.2f}x')
@@ -1,42 +1,100 @@
 import argparse
+import sys
+import typing
 
 from src.patcher.config import Config
 from src.instance import GameInstance
+from src.discovery.index import InstanceIndex
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('instances', type=str,
-                        help='Path to instances dir; can be multiple', nargs='+')
+                        help='Path to instances dir; can be multiple', nargs='*')
+    parser.add_argument('--instance', '-i', type=str,
+                        help='Path to a single instance to patch without searching for instances, e.g. $INST_DIR')
     parser.add_argument('--config', '-c', type=str, help='Path to config file')
     parser.add_argument('--data', '-d', type=str, help='Path to config data dir')
     parser.add_argument('--max-recursion', '-r', type=int, default=2, help='Max recursion depth')
+    parser.add_argument('--no-config-cache', action='store_true',
+                        help='Always parse the config file instead of loading it from its compiled cache')
     parser.add_argument('--preview', '-p', action='store_true', help='Preview the changes')
+    parser.add_argument('--verify', action='store_true',
+                        help='Check the conditions again before applying the previewed changes')
+    parser.add_argument('--jobs', '-j', type=int,
+                        help='Number of threads used to find instances and to patch them; patches instances one by one by default')
+    parser.add_argument('--transactional', '-t', action='store_true',
+                        help='Prepare all changes first and write them at once, an error leaves its instance unchanged')
+    parser.add_argument('--ignore-state', action='store_true',
+                        help='Check every patch against the files, even if the instance state shows it as applied')
+    parser.add_argument('--index', type=str, default='.cache/instances.json', help='Path to the instance index file')
+    parser.add_argument('--stream', action='store_true',
+                        help='Patch each instance as soon as it is found, instead of finding all instances first')
+    parser.add_argument('--scan', action='store_true',
+                        help='Scan Prism/MultiMC instances folders too, instead of reading their instance.cfg files')
+    parser.add_argument('--rescan', action='store_true', help='Ignore the instance index and scan all folders again')
 
     args = parser.parse_args()
+    if not args.instances and not args.instance:
+        parser.error('at least one instances dir or --instance is required')
+    if args.stream and args.preview:
+        parser.error('--stream applies the changes right away, so it can\'t be used with --preview')
 
     print("[MC-PATCHER] Starting with args:", args)
 
-    instances = []
-    for instance in args.instances:
-        instances.extend(GameInstance.from_path(instance, max_recursion=args.max_recursion))
+    index = InstanceIndex(args.index, rescan=args.rescan) if args.instances else None
+
+    def find_instances(search=GameInstance.from_path) -> typing.Iterator[GameInstance]:
+        if args.instance:
+            yield GameInstance.from_instance_dir(args.instance)
+        for path in args.instances:
+            yield from search(path, max_recursion=args.max_recursion, jobs=args.jobs, index=index,
+                              registry=not args.scan)
 
     config = Config(
         config=args.config or 'configs/config.jsonc',
         config_files_dir=args.data or 'configs/',
+        cache=not args.no_config_cache,
     )
 
-    has_changes = config.preview(instances)
-    if not has_changes:
+    if args.stream:
+        applied, errors = config.stream(find_instances(GameInstance.iter_path), use_manifest=not args.ignore_state,
+                                        transactional=args.transactional)
+        if index:
+            index.save()
+        if not applied and not errors:
+            print('[MC-PATCHER] No changes detected')
+        report_errors(errors)
+        return
+
+    instances = list(find_instances())
+    if index:
+        index.save()
+
+    plan = config.preview(instances, use_manifest=not args.ignore_state)
+    if not plan:
         print('[MC-PATCHER] No changes detected')
+        # applying the empty plan only records the patches found applied, so the next run can skip them
+        report_errors(plan.errors if args.preview else config.apply(plan))
         return
 
     if args.preview:
         c = input('Apply changes? [y/n]: ')
-        if c.lower() == 'y':
-            config.apply(instances)
-    else:
-        config.apply(instances)
+        if c.lower() != 'y':
+            report_errors(plan.errors)
+            return
+
+    report_errors(config.apply(plan, verify=args.verify, jobs=args.jobs or 1, transactional=args.transactional))
+
+
+def report_errors(errors: list[tuple[GameInstance, Exception]]):
+    if not errors:
+        return
+    import traceback  # only needed when something fails
+    for instance, error in errors:
+        print(f'[MC-PATCHER] Failed to patch {instance.path}:', file=sys.stderr)
+        traceback.print_exception(error)
+    sys.exit(1)
 
 
 if __name__ == '__main__':
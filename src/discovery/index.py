@@ -0,0 +1,93 @@
+import json
+import os
+import threading
+import typing
+
+from src.discovery.scan import classify, discover, iter_discover, list_dirs
+
+
+class InstanceIndex:
+    '''
+    An on-disk cache of the scanned directories, used as a `Scanner` for `discover`.
+
+    Every scanned directory is stored with its mtime, classification and subfolder names.
+    Adding, removing or renaming a subfolder changes the mtime of the directory, so a directory whose
+    mtime didn't change since the last run can be taken from the index without listing it.
+    A warm run therefore costs one stat per directory and no listings at all.
+
+    Directories under a searched root that weren't scanned again are dropped when saving,
+    so removed folders don't stay in the index forever.
+    '''
+    VERSION = 1
+
+    def __init__(self, path: str, rescan: bool = False):
+        '''
+        :param path: The file to store the index in.
+        :param rescan: Ignore the stored index and scan everything again.
+        '''
+        self.path = path
+        self.entries: dict[str, dict] = {} if rescan else self._load()
+        self.scanned: dict[str, dict] = {}
+        self.roots: list[str] = []
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict[str, dict]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get('version') != self.VERSION:
+            return {}
+        return data.get('entries', {})
+
+    def discover(self, path: str, ignore: list[str] = None, max_recursion: int = 2, jobs: int = None) -> list[str]:
+        '''Same as `src.discovery.scan.discover`, but reuses the unchanged directories from the index.'''
+        self.roots.append(path)
+        return discover(path, ignore, max_recursion, jobs, scanner=self)
+
+    def iter_discover(self, path: str, ignore: list[str] = None, max_recursion: int = 2,
+                      jobs: int = None) -> typing.Iterator[str]:
+        '''Same as `src.discovery.scan.iter_discover`, but reuses the unchanged directories from the index.'''
+        self.roots.append(path)
+        return iter_discover(path, ignore, max_recursion, jobs, scanner=self)
+
+    def __call__(self, path: str, depth: int) -> list[str]:
+        '''Return the subfolder names of the directory, listing it only if it changed since the last run.'''
+        mtime = os.stat(path).st_mtime_ns
+        entry = self.entries.get(path)
+        hit = entry is not None and entry['mtime'] == mtime
+        if hit:
+            dirs = entry['dirs']
+        else:
+            dirs = list_dirs(path)
+
+        with self._lock:
+            self.scanned[path] = {'mtime': mtime, 'kind': classify(dirs, depth), 'dirs': dirs}
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return dirs
+
+    def save(self):
+        '''Write the scanned directories to the index file.'''
+        dirname = os.path.dirname(self.path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+        # keep the entries of the roots that weren't searched in this run
+        prefixes = tuple(os.path.join(root, '') for root in self.roots)
+        entries = {
+            path: entry for path, entry in self.entries.items()
+            if path not in self.roots and not path.startswith(prefixes)
+        }
+        entries.update(self.scanned)
+
+        # write to a temporary file first, so a crash never leaves a broken index behind
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.VERSION, 'entries': entries}, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,66 @@
+import json
+import os
+import typing
+
+from src.discovery.scan import PRISM_INSTANCE_FILE, prism_game_dir
+
+# Prism/MultiMC keep the instance groups in the instances folder
+PRISM_GROUPS_FILE = 'instgroups.json'
+PRISM_PACK_FILE = 'mmc-pack.json'
+
+MINECRAFT_UID = 'net.minecraft'
+# component uid -> loader name
+LOADERS = {
+    'net.fabricmc.fabric-loader': 'fabric',
+    'org.quiltmc.quilt-loader': 'quilt',
+    'net.minecraftforge': 'forge',
+    'net.neoforged': 'neoforge',
+    'com.mumfrey.liteloader': 'liteloader',
+}
+VANILLA = 'vanilla'
+
+
+def is_registry(path: str) -> bool:
+    '''Check if the path is the instances folder of Prism/MultiMC.'''
+    return os.path.isfile(os.path.join(path, PRISM_GROUPS_FILE))
+
+
+def iter_registry(path: str, ignore: list[str] = None) -> typing.Iterator[str]:
+    '''
+    Yield the game folders of the instances in a Prism/MultiMC instances folder.
+
+    The instances are read from the folder itself with a single listing: every subfolder with an `instance.cfg`
+    is an instance, even a new one without `saves` and `mods` folders.
+    '''
+    ignore = set(ignore or ())
+    with os.scandir(path) as it:
+        entries = [entry for entry in it if entry.is_dir() and entry.name not in ignore]
+    for entry in entries:
+        game_dir = prism_game_dir(entry.path)
+        if game_dir is not None:
+            yield game_dir
+
+
+def read_config(instance_dir: str) -> dict[str, str]:
+    '''Read the `instance.cfg` of a Prism/MultiMC instance folder, an INI file without sections.'''
+    config = {}
+    try:
+        with open(os.path.join(instance_dir, PRISM_INSTANCE_FILE), 'r', encoding='utf-8') as f:
+            for line in f:
+                key, sep, value = line.partition('=')
+                if sep and not key.startswith(('#', ';', '[')):
+                    config[key.strip()] = value.strip()
+    except OSError:
+        pass
+    return config
+
+
+def read_components(instance_dir: str) -> dict[str, str]:
+    '''Read the versions of the components of a Prism/MultiMC instance from its `mmc-pack.json`, by their uid.'''
+    try:
+        with open(os.path.join(instance_dir, PRISM_PACK_FILE), 'r', encoding='utf-8') as f:
+            pack = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return {component['uid']: str(component.get('version', ''))
+            for component in pack.get('components', []) if 'uid' in component}
@@ -0,0 +1,243 @@
+import collections
+import functools
+import itertools
+import os
+import typing
+
+# an instance is any folder that has one of these subfolders
+# new instances can only have one of them, so both are checked
+INSTANCE_MARKERS = frozenset(('saves', 'mods'))
+
+# a Prism/MultiMC instance folder has this file, and the game files in one of the game folders
+PRISM_INSTANCE_FILE = 'instance.cfg'
+PRISM_GAME_DIRS = ('.minecraft', 'minecraft')
+
+# how many tasks each worker gets per directory level, more batches balance the load better
+# at the cost of more scheduling overhead
+BATCHES_PER_WORKER = 4
+# levels with fewer directories are scanned without a thread pool
+PARALLEL_SCAN_THRESHOLD = 8
+
+# directory classifications
+INSTANCE = 'instance'  # a game instance
+CONTAINER = 'container'  # not an instance, its subfolders are searched
+IGNORED = 'ignored'  # not an instance, but too deep to search its subfolders
+
+# a function that returns the subfolder names of a directory, given its path and remaining depth
+Scanner = typing.Callable[[str, int], list[str]]
+
+
+class _Node:
+    '''A scanned directory and its (lazily filled) subdirectories.'''
+
+    def __init__(self, path: str):
+        self.path = path
+        self.kind = IGNORED
+        self.children: list['_Node'] = []
+
+
+def list_dirs(path: str) -> list[str]:
+    '''
+    List the names of the subdirectories of the given path.
+
+    Uses `os.scandir`, so the type of each entry comes from the directory listing itself
+    and no additional stat calls are needed on most filesystems.
+    '''
+    with os.scandir(path) as it:
+        return [entry.name for entry in it if entry.is_dir()]
+
+
+def scan_dir(path: str, depth: int) -> list[str]:
+    '''The default `Scanner`, always lists the directory.'''
+    return list_dirs(path)
+
+
+def classify(dirs: list[str], depth: int) -> str:
+    '''
+    Classify a directory by its subfolders.
+
+    :param dirs: The names of the subfolders.
+    :param depth: How many levels can still be searched, including this one.
+    '''
+    if not INSTANCE_MARKERS.isdisjoint(dirs):
+        return INSTANCE
+    return CONTAINER if depth > 1 else IGNORED
+
+
+def prism_game_dir(path: str) -> typing.Optional[str]:
+    '''
+    If the path is a Prism/MultiMC instance folder, like the `$INST_DIR` of the pre-launch command,
+    return the game folder inside it. Costs a few stat calls and no listing.
+    '''
+    if not os.path.isfile(os.path.join(path, PRISM_INSTANCE_FILE)):
+        return None
+    for name in PRISM_GAME_DIRS:
+        game_dir = os.path.join(path, name)
+        if os.path.isdir(game_dir):
+            return game_dir
+    return None
+
+
+def default_jobs() -> int:
+    '''The default number of worker threads, same as the `ThreadPoolExecutor` default.'''
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+class _LevelScanner:
+    '''
+    Scans the directories of a level, on a thread pool if there are enough of them.
+
+    The pool (and `concurrent.futures` itself) is only created when a level is large enough,
+    so a small tree like a single instance is scanned without starting any thread.
+    '''
+
+    def __init__(self, scanner: Scanner, workers: int):
+        self.scanner = scanner
+        self.workers = workers
+        self.executor = None
+
+    def scan(self, paths: list[str], depth: int) -> typing.Iterator[list[str]]:
+        '''Scan the given paths, the results are yielded in the order of the paths.'''
+        if self.workers <= 1 or len(paths) < PARALLEL_SCAN_THRESHOLD:
+            return (self.scanner(path, depth) for path in paths)
+
+        if self.executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        return self._scan_batched(paths, depth)
+
+    def _scan_batched(self, paths: list[str], depth: int) -> typing.Iterator[list[str]]:
+        # batches keep the per-task overhead low
+        def scan_many(batch: list[str]) -> list[list[str]]:
+            return [self.scanner(path, depth) for path in batch]
+
+        size = max(1, -(-len(paths) // (self.workers * BATCHES_PER_WORKER)))
+        batches = [paths[i:i + size] for i in range(0, len(paths), size)]
+        for batch in self.executor.map(scan_many, batches):
+            yield from batch
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+def discover(path: str, ignore: list[str] = None, max_recursion: int = 2, jobs: int = None,
+             scanner: Scanner = scan_dir) -> list[str]:
+    '''
+    Find the instance folders inside the given path.
+
+    Every directory is scanned exactly once. Directories of the same depth are scanned concurrently
+    on a bounded thread pool, but the result keeps the order of a serial depth-first walk.
+    If the path is a Prism instance folder itself, its game folder is returned without scanning anything.
+
+    :param path: The root folder to search in.
+    :param ignore: Folder names to skip at any depth.
+    :param max_recursion: How many levels below the root to search.
+    :param jobs: Max number of worker threads, defaults to the `ThreadPoolExecutor` default.
+    :param scanner: The function used to get the subfolders of a directory.
+    :return: The paths of the found instances.
+    '''
+    if max_recursion <= 0:
+        return []
+    game_dir = prism_game_dir(path)
+    if game_dir is not None:
+        return [game_dir]
+
+    level_scanner = _LevelScanner(scanner, jobs or default_jobs())
+    try:
+        return _discover(path, set(ignore or ()), max_recursion, level_scanner)
+    finally:
+        level_scanner.close()
+
+
+def iter_discover(path: str, ignore: list[str] = None, max_recursion: int = 2, jobs: int = None,
+                  scanner: Scanner = scan_dir) -> typing.Iterator[str]:
+    '''
+    Same as `discover`, but yields each instance as soon as it's found, in the same order,
+    so the caller can work on it while the rest of the tree is still scanned.
+
+    The directories are walked depth-first, and the next few subfolders of each directory on the current path
+    are scanned ahead on a thread pool. Only those listings are kept, so memory doesn't grow with the size of the tree.
+    '''
+    if max_recursion <= 0:
+        return
+    game_dir = prism_game_dir(path)
+    if game_dir is not None:
+        yield game_dir
+        return
+
+    workers = jobs or default_jobs()
+    executor = None
+    if workers > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        executor = ThreadPoolExecutor(max_workers=workers)
+
+    def submit(path: str, depth: int) -> typing.Callable[[], list[str]]:
+        if executor is None:
+            return functools.partial(scanner, path, depth)
+        return executor.submit(scanner, path, depth).result
+
+    ignore = set(ignore or ())
+    try:
+        # the root itself is never an instance, only its subfolders are searched
+        dirs = scanner(path, max_recursion + 1)
+        yield from _walk([os.path.join(path, name) for name in dirs if name not in ignore],
+                         max_recursion, ignore, submit, workers * BATCHES_PER_WORKER)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+def _walk(paths: list[str], depth: int, ignore: set[str],
+          submit: typing.Callable[[str, int], typing.Callable[[], list[str]]], lookahead: int) -> typing.Iterator[str]:
+    '''Yield the instances among the given folders and their subfolders, scanning up to `lookahead` folders ahead.'''
+    pending = collections.deque()
+    queued = iter(paths)
+    for path in itertools.islice(queued, lookahead):
+        pending.append((path, submit(path, depth)))
+
+    while pending:
+        path, result = pending.popleft()
+        for next_path in itertools.islice(queued, 1):
+            pending.append((next_path, submit(next_path, depth)))
+
+        dirs = result()
+        kind = classify(dirs, depth)
+        if kind == INSTANCE:
+            yield path
+        elif kind == CONTAINER:
+            yield from _walk([os.path.join(path, name) for name in dirs if name not in ignore],
+                             depth - 1, ignore, submit, lookahead)
+
+
+def _discover(path: str, ignore: set[str], max_recursion: int, level_scanner: _LevelScanner) -> list[str]:
+    def children(node: _Node, dirs: list[str]) -> list[_Node]:
+        return [_Node(os.path.join(node.path, name)) for name in dirs if name not in ignore]
+
+    # the root itself is never an instance, only its subfolders are searched
+    root = _Node(path)
+    root.kind = CONTAINER
+    root.children = children(root, level_scanner.scanner(path, max_recursion + 1))
+
+    level, depth = root.children, max_recursion
+    while level:
+        next_level = []
+        for node, dirs in zip(level, level_scanner.scan([node.path for node in level], depth)):
+            node.kind = classify(dirs, depth)
+            if node.kind == CONTAINER:
+                node.children = children(node, dirs)
+                next_level.extend(node.children)
+        level, depth = next_level, depth - 1
+
+    return _collect(root)
+
+
+def _collect(node: _Node) -> list[str]:
+    '''Return the instances of the scanned tree in depth-first order.'''
+    instances = []
+    for child in node.children:
+        if child.kind == INSTANCE:
+            instances.append(child.path)
+        else:
+            instances.extend(_collect(child))
+    return instances
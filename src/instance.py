@@ -1,34 +1,105 @@
+import functools
 import os
+import typing
+
+from src.discovery import prism
+from src.discovery.index import InstanceIndex
+from src.discovery.scan import PRISM_GAME_DIRS, PRISM_INSTANCE_FILE, discover, iter_discover, prism_game_dir
+from src.manifest import Manifest
+from src.mods import ModIndex
+from src.snapshot import FileSnapshot
 
 
 class GameInstance:
     def __init__(self, path: str):
         self.path = path
 
+    @functools.cached_property
+    def normpath(self) -> str:
+        '''The path with forward slashes, which the instance patterns are matched against.'''
+        return self.path.replace('\\', '/')
+
+    @functools.cached_property
+    def files(self) -> FileSnapshot:
+        '''A snapshot of the instance files, shared by all conditions.'''
+        return FileSnapshot(self.path)
+
+    @functools.cached_property
+    def manifest(self) -> Manifest:
+        '''The patches applied to the instance by previous runs.'''
+        return Manifest(self.path)
+
+    @functools.cached_property
+    def mods(self) -> ModIndex:
+        '''The metadata of the mod jars, read by the mod conditions.'''
+        return ModIndex(self.path)
+
+    @functools.cached_property
+    def prism_dir(self) -> typing.Optional[str]:
+        '''The Prism/MultiMC instance folder the game folder is in, if any.'''
+        parent, name = os.path.split(os.path.normpath(self.path))
+        if name in PRISM_GAME_DIRS and os.path.isfile(os.path.join(parent, PRISM_INSTANCE_FILE)):
+            return parent
+        return None
+
+    @functools.cached_property
+    def components(self) -> dict[str, str]:
+        '''The versions of the components of a Prism instance, like `net.minecraft`, empty for other instances.'''
+        return prism.read_components(self.prism_dir) if self.prism_dir else {}
+
+    @functools.cached_property
+    def minecraft_version(self) -> typing.Optional[str]:
+        '''The Minecraft version of a Prism instance.'''
+        version = self.components.get(prism.MINECRAFT_UID)
+        if version is None and self.prism_dir:
+            # instances of old MultiMC versions don't have a mmc-pack.json
+            version = prism.read_config(self.prism_dir).get('IntendedVersion')
+        return version
+
+    @functools.cached_property
+    def loader(self) -> typing.Optional[str]:
+        '''The mod loader of a Prism instance (`fabric`, `quilt`, `forge`, `neoforge`...), `vanilla` if it has none.'''
+        if not self.components:
+            return None
+        for uid, loader in prism.LOADERS.items():
+            if uid in self.components:
+                return loader
+        return prism.VANILLA
+
+    def installed_mods(self) -> dict[str, list[str]]:
+        '''The versions of every installed mod id, computed once until the files of the instance change.'''
+        results = self.files.results
+        installed = results.get(ModIndex)
+        if installed is None:
+            installed = results[ModIndex] = self.mods.scan(self.files.listdir('mods'))
+        return installed
+
+    @classmethod
+    def from_instance_dir(cls, path: str) -> 'GameInstance':
+        '''Create the instance of a known instance folder without searching, resolving Prism instance folders.'''
+        return cls(prism_game_dir(path) or path)
+
+    @classmethod
+    def from_path(cls, path: str, ignore: list[str] = None, max_recursion: int = 2,
+                  jobs: int = None, index: InstanceIndex = None, registry: bool = True) -> list['GameInstance']:
+        '''
+        Find the instances in the path.
+
+        :param registry: Read the instances of a Prism/MultiMC instances folder from its `instance.cfg` files
+                         instead of scanning it.
+        '''
+        if registry and prism.is_registry(path):
+            return [cls(instance) for instance in prism.iter_registry(path, ignore)]
+        search = index.discover if index else discover
+        return [cls(instance) for instance in search(path, ignore, max_recursion, jobs)]
+
     @classmethod
-    def from_path(cls, path: str, ignore: list[str] = None, max_recursion: int = 2) -> list['GameInstance']:
-        instances = []
-
-        # reached the maximum recursion depth
-        if max_recursion == 0:
-            return instances
-
-        for folder in os.listdir(path):
-            # ignore files
-            wd = os.path.join(path, folder)
-            if not os.path.isdir(wd):
-                continue
-
-            # ignore the folders in the ignore list
-            if ignore and folder in ignore:
-                continue
-
-            # check if the folder is an instance
-            # try both saves and mods folders because new instances can only have one of them
-            if os.path.isdir(os.path.join(wd, 'saves')) or os.path.isdir(os.path.join(wd, 'mods')):
-                instances.append(cls(wd))
-            else:
-                # if not, check the subfolders
-                instances.extend(cls.from_path(wd, ignore, max_recursion - 1))
-
-        return instances
+    def iter_path(cls, path: str, ignore: list[str] = None, max_recursion: int = 2,
+                  jobs: int = None, index: InstanceIndex = None, registry: bool = True) -> typing.Iterator['GameInstance']:
+        '''Same as `from_path`, but yields each instance as soon as it's found.'''
+        if registry and prism.is_registry(path):
+            search = prism.iter_registry(path, ignore)
+        else:
+            search = (index.iter_discover if index else iter_discover)(path, ignore, max_recursion, jobs)
+        for instance in search:
+            yield cls(instance)
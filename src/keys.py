@@ -0,0 +1,179 @@
+import typing
+
+# options.txt stores key bindings as LWJGL2 key codes before the 1.13 snapshots, and as key names since then
+LWJGL2 = 'lwjgl2'
+LWJGL3 = 'lwjgl3'
+# first data version that stores key names
+LWJGL3_VERSION = 1444
+
+# source: https://minecraft.wiki/w/Key_codes, and the options fix of the game that upgrades the key codes
+KEYBOARD = {
+    0: 'key.keyboard.unknown',
+    1: 'key.keyboard.escape',
+    2: 'key.keyboard.1',
+    3: 'key.keyboard.2',
+    4: 'key.keyboard.3',
+    5: 'key.keyboard.4',
+    6: 'key.keyboard.5',
+    7: 'key.keyboard.6',
+    8: 'key.keyboard.7',
+    9: 'key.keyboard.8',
+    10: 'key.keyboard.9',
+    11: 'key.keyboard.0',
+    12: 'key.keyboard.minus',
+    13: 'key.keyboard.equal',
+    14: 'key.keyboard.backspace',
+    15: 'key.keyboard.tab',
+    16: 'key.keyboard.q',
+    17: 'key.keyboard.w',
+    18: 'key.keyboard.e',
+    19: 'key.keyboard.r',
+    20: 'key.keyboard.t',
+    21: 'key.keyboard.y',
+    22: 'key.keyboard.u',
+    23: 'key.keyboard.i',
+    24: 'key.keyboard.o',
+    25: 'key.keyboard.p',
+    26: 'key.keyboard.left.bracket',
+    27: 'key.keyboard.right.bracket',
+    28: 'key.keyboard.enter',
+    29: 'key.keyboard.left.control',
+    30: 'key.keyboard.a',
+    31: 'key.keyboard.s',
+    32: 'key.keyboard.d',
+    33: 'key.keyboard.f',
+    34: 'key.keyboard.g',
+    35: 'key.keyboard.h',
+    36: 'key.keyboard.j',
+    37: 'key.keyboard.k',
+    38: 'key.keyboard.l',
+    39: 'key.keyboard.semicolon',
+    40: 'key.keyboard.apostrophe',
+    41: 'key.keyboard.grave.accent',
+    42: 'key.keyboard.left.shift',
+    43: 'key.keyboard.backslash',
+    44: 'key.keyboard.z',
+    45: 'key.keyboard.x',
+    46: 'key.keyboard.c',
+    47: 'key.keyboard.v',
+    48: 'key.keyboard.b',
+    49: 'key.keyboard.n',
+    50: 'key.keyboard.m',
+    51: 'key.keyboard.comma',
+    52: 'key.keyboard.period',
+    53: 'key.keyboard.slash',
+    54: 'key.keyboard.right.shift',
+    55: 'key.keyboard.keypad.multiply',
+    56: 'key.keyboard.left.alt',
+    57: 'key.keyboard.space',
+    58: 'key.keyboard.caps.lock',
+    59: 'key.keyboard.f1',
+    60: 'key.keyboard.f2',
+    61: 'key.keyboard.f3',
+    62: 'key.keyboard.f4',
+    63: 'key.keyboard.f5',
+    64: 'key.keyboard.f6',
+    65: 'key.keyboard.f7',
+    66: 'key.keyboard.f8',
+    67: 'key.keyboard.f9',
+    68: 'key.keyboard.f10',
+    69: 'key.keyboard.num.lock',
+    70: 'key.keyboard.scroll.lock',
+    71: 'key.keyboard.keypad.7',
+    72: 'key.keyboard.keypad.8',
+    73: 'key.keyboard.keypad.9',
+    74: 'key.keyboard.keypad.subtract',
+    75: 'key.keyboard.keypad.4',
+    76: 'key.keyboard.keypad.5',
+    77: 'key.keyboard.keypad.6',
+    78: 'key.keyboard.keypad.add',
+    79: 'key.keyboard.keypad.1',
+    80: 'key.keyboard.keypad.2',
+    81: 'key.keyboard.keypad.3',
+    82: 'key.keyboard.keypad.0',
+    83: 'key.keyboard.keypad.decimal',
+    87: 'key.keyboard.f11',
+    88: 'key.keyboard.f12',
+    100: 'key.keyboard.f13',
+    101: 'key.keyboard.f14',
+    102: 'key.keyboard.f15',
+    103: 'key.keyboard.f16',
+    104: 'key.keyboard.f17',
+    105: 'key.keyboard.f18',
+    113: 'key.keyboard.f19',
+    141: 'key.keyboard.keypad.equal',
+    156: 'key.keyboard.keypad.enter',
+    157: 'key.keyboard.right.control',
+    181: 'key.keyboard.keypad.divide',
+    183: 'key.keyboard.print.screen',
+    184: 'key.keyboard.right.alt',
+    197: 'key.keyboard.pause',
+    199: 'key.keyboard.home',
+    200: 'key.keyboard.up',
+    201: 'key.keyboard.page.up',
+    203: 'key.keyboard.left',
+    205: 'key.keyboard.right',
+    207: 'key.keyboard.end',
+    208: 'key.keyboard.down',
+    209: 'key.keyboard.page.down',
+    210: 'key.keyboard.insert',
+    211: 'key.keyboard.delete',
+    219: 'key.keyboard.left.win',
+    220: 'key.keyboard.right.win',
+    # the other LWJGL2 keys (kana, convert, yen, apps, power...) have no key name and are kept as codes
+}
+
+# mouse buttons are stored as negative codes starting at -100, the first three have names
+MOUSE_BUTTONS = 16
+MOUSE = {
+    -100 + button: ('key.mouse.left', 'key.mouse.right', 'key.mouse.middle')[button]
+    if button < 3 else f'key.mouse.{button + 1}'
+    for button in range(MOUSE_BUTTONS)
+}
+
+# key code -> key name, and back
+CODES_TO_NAMES: dict[int, str] = {**KEYBOARD, **MOUSE}
+NAMES_TO_CODES: dict[str, int] = {name: code for code, name in CODES_TO_NAMES.items()}
+
+
+def key_format(version: int | None) -> str:
+    '''The format of the key bindings of an options.txt with the given data version. Files without one are old.'''
+    return LWJGL3 if version and version >= LWJGL3_VERSION else LWJGL2
+
+
+def _build_tables() -> dict[tuple[str, str], dict]:
+    # the codes are also looked up as text, for values that weren't parsed as numbers
+    to_names = {**CODES_TO_NAMES, **{str(code): name for code, name in CODES_TO_NAMES.items()}}
+    return {
+        (LWJGL2, LWJGL3): to_names,
+        (LWJGL3, LWJGL2): dict(NAMES_TO_CODES),
+        (LWJGL2, LWJGL2): {},
+        (LWJGL3, LWJGL3): {},
+    }
+
+
+# (from format, to format) -> value -> translated value, built once on import
+TABLES = _build_tables()
+
+
+def table(from_format: str, to_format: str) -> dict:
+    '''The translation table of key binding values between two formats. Values missing from it are kept.'''
+    return TABLES[from_format, to_format]
+
+
+def translate(value: typing.Any, from_version: int | None, to_version: int | None) -> typing.Any:
+    '''Translate a single key binding value between the formats of two data versions.'''
+    return table(key_format(from_version), key_format(to_version)).get(value, value)
+
+
+def translate_all(options: dict, from_version: int | None, to_version: int | None) -> dict:
+    '''
+    Translate the key bindings (the `key_*` options) of an options dict between the formats of two data versions,
+    with a single table lookup per binding.
+
+    Codes and names that don't exist in the other format are kept as they are.
+
+    :return: A new dict with the translated options, in the same order.
+    '''
+    lookup = table(key_format(from_version), key_format(to_version)).get
+    return {key: lookup(value, value) if key.startswith('key_') else value for key, value in options.items()}
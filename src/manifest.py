@@ -0,0 +1,97 @@
+import json
+import os
+import stat
+import threading
+
+from src.patcher.files import HASH_CACHE
+
+
+def _signature(path: str, with_hash: bool = False) -> dict | None:
+    '''
+    Describe the current state of a path, `None` if it doesn't exist.
+
+    Symlinks are described by their target, files by their size and mtime, and optionally their content hash.
+    '''
+    try:
+        st = os.lstat(path)
+    except FileNotFoundError:
+        return None
+
+    if stat.S_ISLNK(st.st_mode):
+        return {'link': os.readlink(path)}
+    signature = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+    if with_hash and stat.S_ISREG(st.st_mode):
+        signature['hash'] = HASH_CACHE.hash(path, st)
+    return signature
+
+
+def _same(recorded: dict | None, current: dict | None) -> bool:
+    '''Compare two signatures, ignoring the hashes that only the recorded one has.'''
+    if recorded is None or current is None:
+        return recorded is current
+    return all(recorded.get(key) == value for key, value in current.items())
+
+
+class Manifest:
+    '''
+    The applied-state manifest of an instance, stored in `.mc-patcher/state.json`.
+
+    For every patched target it records the patches applied to it in order with their sources, and the resulting
+    target, so a later run can skip them with a few stat calls if none of them changed since.
+    A target has a single entry, so a patch that is later applied over the target of another one replaces its record.
+    '''
+    DIRNAME = '.mc-patcher'
+    FILENAME = 'state.json'
+    VERSION = 2
+
+    def __init__(self, instance_path: str):
+        self.path = os.path.join(instance_path, self.DIRNAME, self.FILENAME)
+        self.entries: dict[str, dict] = self._load()
+        self.dirty = False
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict[str, dict]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get('version') != self.VERSION:
+            return {}
+        return data.get('targets', {})
+
+    def is_current(self, file: str, sources: list[tuple[str, str]], to_path: str) -> bool:
+        '''
+        Check if the target is the result of applying the given patches in this order,
+        and neither their sources nor the target changed since.
+
+        :param sources: The key and the source path of each patch.
+        '''
+        entry = self.entries.get(file)
+        if entry is None or [patch['key'] for patch in entry['patches']] != [key for key, _ in sources]:
+            return False
+        return (all(_same(patch['source'], _signature(from_path))
+                    for patch, (_, from_path) in zip(entry['patches'], sources))
+                and _same(entry['target'], _signature(to_path)))
+
+    def record(self, file: str, sources: list[tuple[str, str]], to_path: str):
+        '''Record that the target is the result of applying the given patches to their sources, see `is_current`.'''
+        entry = {
+            'patches': [{'key': key, 'source': _signature(from_path, with_hash=True)} for key, from_path in sources],
+            'target': _signature(to_path, with_hash=True),
+        }
+        with self._lock:
+            if self.entries.get(file) != entry:
+                self.entries[file] = entry
+                self.dirty = True
+
+    def save(self):
+        '''Write the manifest, only if anything was recorded.'''
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.VERSION, 'targets': self.entries}, f, indent=4)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
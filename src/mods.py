@@ -0,0 +1,223 @@
+import json
+import os
+import re
+import typing
+
+# mod metadata files, in the order they are looked up in a jar
+FABRIC_METADATA = 'fabric.mod.json'
+QUILT_METADATA = 'quilt.mod.json'
+FORGE_METADATA = ('META-INF/mods.toml', 'META-INF/neoforge.mods.toml')
+JAR_MANIFEST = 'META-INF/MANIFEST.MF'
+
+_VERSION_NUMBERS = re.compile(r'\d+')
+_COMPARISON = re.compile(r'(>=|<=|==|!=|>|<|=)?\s*([^\s<>=!]+)')
+
+
+def version_key(version: str) -> tuple[int, ...]:
+    '''
+    The numbers of the release part of a version, which versions are compared by.
+
+    Build metadata (`+mc1.20.1`) and pre-release tags (`-beta.2`) are ignored, so `0.5.8+mc1.20.1` is `(0, 5, 8)`.
+    A number after a `-` isn't a pre-release tag but the mod version after the Minecraft version, as Forge mods
+    name them, so `1.20.1-2.1.0` is `(2, 1, 0)`.
+    '''
+    release, sep, rest = version.split('+', 1)[0].partition('-')
+    while sep and rest[:1].isdigit():
+        release, sep, rest = rest.partition('-')
+    return tuple(int(number) for number in _VERSION_NUMBERS.findall(release))
+
+
+def _compare(a: tuple[int, ...], b: tuple[int, ...]) -> int:
+    # missing numbers are zeros, so 1.20 == 1.20.0
+    size = max(len(a), len(b))
+    a, b = a + (0,) * (size - len(a)), b + (0,) * (size - len(b))
+    return (a > b) - (a < b)
+
+
+class VersionRange:
+    '''
+    A version range like `>=0.5 <0.6`, parsed once.
+
+    Alternatives are separated by `||`, and all space-separated comparisons of an alternative must match.
+    A version without an operator must be equal, and can end with a wildcard: `1.20.x` or `1.20.*`.
+    `*` or an empty range matches any version.
+    '''
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        self.alternatives = [self._parse(alternative) for alternative in spec.split('||')]
+
+    @staticmethod
+    def _parse(alternative: str) -> list[tuple[str, tuple[int, ...], bool]]:
+        comparisons = []
+        for op, version in _COMPARISON.findall(alternative):
+            if version in ('*', 'x', 'X'):
+                continue
+            prefix = version.endswith(('.x', '.X', '.*'))
+            if prefix:
+                version = version[:-2]
+            comparisons.append((op or '=', version_key(version), prefix))
+        return comparisons
+
+    def matches(self, version: str) -> bool:
+        key = version_key(version)
+        return any(all(self._matches(key, *comparison) for comparison in alternative)
+                   for alternative in self.alternatives)
+
+    @staticmethod
+    def _matches(key: tuple[int, ...], op: str, expected: tuple[int, ...], prefix: bool) -> bool:
+        if prefix:
+            result = key[:len(expected)] == expected
+            return not result if op == '!=' else result
+        order = _compare(key, expected)
+        return {
+            '=': order == 0, '==': order == 0, '!=': order != 0,
+            '>': order > 0, '>=': order >= 0, '<': order < 0, '<=': order <= 0,
+        }[op]
+
+    def __repr__(self):
+        return f'VersionRange({self.spec!r})'
+
+
+def read_jar(path: str) -> list[list[str]]:
+    '''
+    Read the ids and versions of the mods in a jar, from its Fabric, Quilt or (Neo)Forge metadata.
+
+    :return: A list of `[id, version]` pairs, including the ids a mod provides. Empty if the jar isn't a mod.
+    '''
+    import zipfile
+
+    try:
+        with zipfile.ZipFile(path) as jar:
+            names = set(jar.namelist())
+            if FABRIC_METADATA in names:
+                return _read_fabric(jar.read(FABRIC_METADATA))
+            if QUILT_METADATA in names:
+                return _read_quilt(jar.read(QUILT_METADATA))
+            for metadata in FORGE_METADATA:
+                if metadata in names:
+                    manifest = jar.read(JAR_MANIFEST) if JAR_MANIFEST in names else b''
+                    return _read_forge(jar.read(metadata), manifest)
+    except Exception:
+        # a broken jar or metadata of unexpected types (`"provides": null`, a list instead of an object...),
+        # the game won't load it either
+        pass
+    return []
+
+
+def _read_fabric(data: bytes) -> list[list[str]]:
+    # some mods have raw control characters in their descriptions, which Fabric accepts
+    metadata = json.loads(data.decode('utf-8-sig'), strict=False)
+    version = str(metadata.get('version', ''))
+    mods = [[metadata['id'], version]]
+    mods.extend([provided, version] for provided in metadata.get('provides', []))
+    return mods
+
+
+def _read_quilt(data: bytes) -> list[list[str]]:
+    loader = json.loads(data.decode('utf-8-sig'), strict=False)['quilt_loader']
+    version = str(loader.get('version', ''))
+    mods = [[loader['id'], version]]
+    for provided in loader.get('provides', []):
+        if isinstance(provided, dict):
+            mods.append([provided['id'], str(provided.get('version', version))])
+        else:
+            mods.append([provided, version])
+    return mods
+
+
+def _read_forge(data: bytes, manifest: bytes) -> list[list[str]]:
+    try:
+        import tomllib
+        metadata = tomllib.loads(data.decode('utf-8-sig'))
+    except ImportError:
+        import toml
+        metadata = toml.loads(data.decode('utf-8-sig'))
+
+    mods = []
+    for mod in metadata.get('mods', []):
+        version = str(mod.get('version', ''))
+        if version == '${file.jarVersion}':
+            # filled in from the jar manifest when the mod is built from a development environment
+            version = _manifest_version(manifest)
+        mods.append([mod['modId'], version])
+    return mods
+
+
+def _manifest_version(manifest: bytes) -> str:
+    for line in manifest.decode('utf-8', errors='replace').splitlines():
+        key, _, value = line.partition(':')
+        if key.strip() == 'Implementation-Version':
+            return value.strip()
+    return ''
+
+
+class ModIndex:
+    '''
+    The mod metadata of the jars in the `mods` folder of an instance, stored in `.mc-patcher/mods.json`.
+
+    Every jar is stored with its size and mtime, and is only opened again if one of them changed.
+    '''
+    DIRNAME = '.mc-patcher'
+    FILENAME = 'mods.json'
+    VERSION = 1
+
+    def __init__(self, instance_path: str):
+        self.mods_dir = os.path.join(instance_path, 'mods')
+        self.path = os.path.join(instance_path, self.DIRNAME, self.FILENAME)
+        self.jars: dict[str, dict] = self._load()
+        self.opened = 0
+
+    def _load(self) -> dict[str, dict]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get('version') != self.VERSION:
+            return {}
+        return data.get('jars', {})
+
+    def scan(self, names: typing.Iterable[str]) -> dict[str, list[str]]:
+        '''
+        Get the installed mods from the given file names of the mods folder, reading only the new and changed jars.
+        The index is saved if any jar changed.
+
+        :return: The versions of every installed mod id.
+        '''
+        jars, changed = {}, False
+        for name in names:
+            if not name.endswith('.jar'):
+                continue
+            try:
+                st = os.stat(os.path.join(self.mods_dir, name))
+            except OSError:
+                continue
+            entry = self.jars.get(name)
+            if entry is None or entry['size'] != st.st_size or entry['mtime_ns'] != st.st_mtime_ns:
+                entry = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+                         'mods': read_jar(os.path.join(self.mods_dir, name))}
+                self.opened += 1
+                changed = True
+            jars[name] = entry
+
+        if changed or jars.keys() != self.jars.keys():
+            self.jars = jars
+            self.save()
+
+        installed: dict[str, list[str]] = {}
+        for entry in jars.values():
+            for mod_id, version in entry['mods']:
+                installed.setdefault(mod_id, []).append(version)
+        return installed
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': self.VERSION, 'jars': self.jars}, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            # the index is only an optimization
+            pass
@@ -1,26 +1,77 @@
+import collections
+import functools
+import json
 import os
-import glob
 import re
+import typing
 
 from src.instance import GameInstance
+from src.mods import VersionRange
+from src.patcher.merge import load_document
+from src.snapshot import GlobPattern
+
+# cost classes of the conditions, cheaper ones are checked first
+COST_PATH = 0  # only looks at the instance path
+COST_METADATA = 1  # reads the metadata of the instance once
+COST_LISTING = 2  # lists at most one directory per path segment
+COST_TREE = 3  # lists every directory matched by a wildcard
+COST_MODS = 4  # stats every mod jar, and reads the changed ones
+COST_GLOB = 5  # falls back to `glob.glob`, which doesn't use the snapshot
+COST_CONTENT = 6  # reads and parses a file
+
+# characters that end the literal prefix of an instance pattern
+_REGEX_SPECIAL = frozenset('.^$*+?{}[]\\|()')
+# a quantifier makes the character before it optional
+_REGEX_QUANTIFIERS = frozenset('*+?{')
+
+# the end of a compiled condition program, see `ConditionGroup`
+_TRUE = -1
+_FALSE = -2
 
 
 class BaseConditionObject:
+    cost = COST_GLOB
+
     def __init__(self, *args, **kwargs):
-        pass  # TODO: implement "or" field for conditions
+        pass
+
+    @property
+    def key(self) -> tuple:
+        '''Identifies the condition, conditions with the same key always have the same result.'''
+        raise NotImplementedError
 
     def check(self, instance: GameInstance) -> bool:
-        return self._check(instance)
+        # the result is kept until the files of the instance change, so a condition shared by several handlers
+        # is evaluated once
+        results = instance.files.results
+        result = results.get(self)
+        if result is None:
+            result = results[self] = self._check(instance)
+        return result
 
     def _check(self, instance: GameInstance) -> bool:
         raise NotImplementedError
 
     @staticmethod
     def create_condition(condition_data: dict):
+        for op in ConditionGroup.OPERATORS:
+            if op in condition_data:
+                # a group has the same structure as "if": a condition or a list of them
+                conditions = condition_data[op]
+                conditions = [conditions] if isinstance(conditions, dict) else conditions
+                return ConditionGroup(op, [BaseConditionObject.create_condition(c) for c in conditions])
         if 'file' in condition_data:
             return FileConditionObject(**condition_data)
         if 'instance_pattern' in condition_data:
             return InstanceConditionObject(**condition_data)
+        if 'mod' in condition_data:
+            return ModConditionObject(**condition_data)
+        if 'minecraft_version' in condition_data:
+            return MinecraftVersionConditionObject(**condition_data)
+        if 'loader' in condition_data:
+            return LoaderConditionObject(**condition_data)
+        if 'content' in condition_data:
+            return ContentConditionObject(**condition_data)
 
         raise NotImplementedError(f'Unknown condition type: {condition_data}')
 
@@ -28,21 +79,350 @@ class BaseConditionObject:
 class FileConditionObject(BaseConditionObject):
     def __init__(self, file: str | list[str], exists: bool = True, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.file = [file] if isinstance(file, str) else file
+        self.file = list(self._flatten(file))
         self.exists = exists
+        # compile the patterns once, they are matched against the cached file snapshot of each instance
+        self.patterns = [GlobPattern.compile(f) for f in self.file]
+        self.cost = max(map(self._pattern_cost, self.patterns), default=COST_LISTING)
+
+    @property
+    def key(self) -> tuple:
+        return 'file', tuple(self.file), self.exists
 
     @staticmethod
-    def _check_file(base_path: str, file: str, exists: bool) -> bool:
-        return (glob.glob(file, root_dir=base_path) != []) == exists
+    def _pattern_cost(pattern: GlobPattern) -> int:
+        if pattern.fallback:
+            return COST_GLOB
+        # a wildcard in the last segment only filters the listing of its parent
+        if any(segment.literal is None for segment in pattern.segments[:-1]):
+            return COST_TREE
+        return COST_LISTING
+
+    @staticmethod
+    def _flatten(file: str | list) -> typing.Iterator[str]:
+        if isinstance(file, str):
+            yield file
+            return
+        for f in file:
+            yield from FileConditionObject._flatten(f)
+
+    def _check(self, instance: GameInstance) -> bool:
+        return any(instance.files.exists(pattern) == self.exists for pattern in self.patterns)
+
+
+class ModConditionObject(BaseConditionObject):
+    '''Matches if any of the mod ids is installed, optionally in a version range, by the metadata of the mod jars.'''
+    cost = COST_MODS
+
+    def __init__(self, mod: str | list[str], version: str = None, exists: bool = True, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.mod = [mod] if isinstance(mod, str) else list(mod)
+        self.version = version
+        self.exists = exists
+        self.range = VersionRange(version) if version else None
+
+    @property
+    def key(self) -> tuple:
+        return 'mod', tuple(self.mod), self.version, self.exists
+
+    def _check(self, instance: GameInstance) -> bool:
+        installed = instance.installed_mods()
+        found = any(self.range is None or any(self.range.matches(version) for version in installed[mod_id])
+                    for mod_id in self.mod if mod_id in installed)
+        return found == self.exists
+
+
+class MinecraftVersionConditionObject(BaseConditionObject):
+    '''Matches if the Minecraft version of a Prism instance is in the version range.'''
+    cost = COST_METADATA
+
+    def __init__(self, minecraft_version: str, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.minecraft_version = minecraft_version
+        self.range = VersionRange(minecraft_version)
+
+    @property
+    def key(self) -> tuple:
+        return 'minecraft_version', self.minecraft_version
+
+    def _check(self, instance: GameInstance) -> bool:
+        return instance.minecraft_version is not None and self.range.matches(instance.minecraft_version)
+
+
+class LoaderConditionObject(BaseConditionObject):
+    '''Matches if a Prism instance uses any of the mod loaders, `vanilla` matches instances without one.'''
+    cost = COST_METADATA
+
+    def __init__(self, loader: str | list[str], *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.loader = [loader] if isinstance(loader, str) else list(loader)
+
+    @property
+    def key(self) -> tuple:
+        return 'loader', tuple(self.loader)
+
+    def _check(self, instance: GameInstance) -> bool:
+        return instance.loader in self.loader
+
+
+class ContentConditionObject(BaseConditionObject):
+    '''
+    Matches by the content of an instance file: the value at a key path of a JSON, YAML, TOML or `options.txt` file,
+    or a regex searched in the text of any file.
+
+    The parsed files are cached in `SOURCE_CACHE`, shared with the merges of the run.
+    '''
+    cost = COST_CONTENT
+
+    def __init__(self, content: str, key: str | list = None, regex: str = None, exists: bool = True,
+                 *args, **kwargs):
+        # "value" may be null, so its absence is told apart from None
+        self.has_value = 'value' in kwargs
+        self.value = kwargs.pop('value', None)
+        super().__init__(*args, **kwargs)
+        if (key is None) == (regex is None):
+            raise ValueError(f'A content condition needs either "key" or "regex": {content}')
+        self.content = content
+        # "a.b.0" or ["a", "b", 0], the list form allows keys with dots
+        self.key_path = key.split('.') if isinstance(key, str) else key
+        self.regex = regex
+        self.exists = exists
+
+    @property
+    def key(self) -> tuple:
+        return ('content', self.content, tuple(self.key_path) if self.key_path is not None else None,
+                self.regex, json.dumps(self.value, sort_keys=True) if self.has_value else None, self.exists)
+
+    @functools.cached_property
+    def pattern(self) -> re.Pattern:
+        # compiled on the first check, and not pickled with the compiled config
+        return re.compile(self.regex, re.MULTILINE)
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state.pop('pattern', None)
+        return state
 
     def _check(self, instance: GameInstance) -> bool:
-        return any(self._check_file(instance.path, file, self.exists) for file in self.file)
+        return self._matches(os.path.join(instance.path, self.content)) == self.exists
+
+    def _matches(self, path: str) -> bool:
+        try:
+            text, document = load_document(path)
+        except Exception:
+            # a missing or broken file doesn't have any content to match
+            return False
+
+        if self.regex is not None:
+            return self.pattern.search(text) is not None
+        for part in self.key_path:
+            if isinstance(document, dict) and part in document:
+                document = document[part]
+            elif isinstance(document, list) and str(part).isdigit() and int(part) < len(document):
+                document = document[int(part)]
+            else:
+                return False
+        return not self.has_value or document == self.value
 
 
 class InstanceConditionObject(BaseConditionObject):
+    cost = COST_PATH
+
     def __init__(self, instance_pattern: str, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.instance_pattern = re.compile(instance_pattern)
+        self.pattern = instance_pattern
+        # set by `InstanceRouter` when the config is loaded
+        self.router: typing.Optional[InstanceRouter] = None
+
+    @property
+    def key(self) -> tuple:
+        return 'instance_pattern', self.pattern
+
+    @functools.cached_property
+    def instance_pattern(self) -> re.Pattern:
+        # compiled on the first check, and not pickled with the compiled config
+        return re.compile(self.pattern)
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state.pop('instance_pattern', None)
+        return state
+
+    def check(self, instance: GameInstance) -> bool:
+        # the router keeps the matches of each path, which don't change when the files do
+        if self.router is not None:
+            return self in self.router.matches(instance)
+        return super().check(instance)
+
+    def _check(self, instance: GameInstance) -> bool:
+        return self.instance_pattern.match(instance.normpath) is not None
+
+
+class InstanceRouter:
+    '''
+    Matches the path of an instance against all instance patterns of a config at once.
+
+    `re.match` only matches at the start of the path, so the patterns are stored in a trie by their literal prefix.
+    Walking the path down the trie finds the patterns whose prefix matches, and only their regexes are run.
+    The matching patterns of each instance path are computed once, and give the handlers that apply to it
+    without checking the instance conditions of every handler.
+    '''
+
+    def __init__(self, conditions: typing.Iterable[InstanceConditionObject]):
+        # char -> subtree, the conditions of a node are stored under None
+        self.trie: dict = {}
+        for condition in conditions:
+            node = self.trie
+            for char in self._literal_prefix(condition.pattern):
+                node = node.setdefault(char, {})
+            node.setdefault(None, []).append(condition)
+            condition.router = self
+        self._matches: dict[str, frozenset[InstanceConditionObject]] = {}
+
+        # see `add_handlers`
+        self.handlers: list = []
+        self.unrouted: list[int] = []
+        self.required: dict[InstanceConditionObject, list[int]] = {}
+        self.counts: list[int] = []
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state['_matches'] = {}
+        return state
+
+    @staticmethod
+    def _literal_prefix(pattern: str) -> str:
+        '''Return the start of the pattern that every matching path starts with.'''
+        if '|' in pattern:
+            # the alternatives may not share a prefix
+            return ''
+        prefix = []
+        for char in pattern:
+            if char in _REGEX_SPECIAL:
+                if char in _REGEX_QUANTIFIERS and prefix:
+                    prefix.pop()
+                break
+            prefix.append(char)
+        return ''.join(prefix)
+
+    def matches(self, instance: GameInstance) -> frozenset[InstanceConditionObject]:
+        '''Return the conditions whose pattern matches the path of the instance.'''
+        path = instance.normpath
+        matches = self._matches.get(path)
+        if matches is None:
+            matches = frozenset(condition for condition in self._candidates(path)
+                                if condition.instance_pattern.match(path) is not None)
+            self._matches[path] = matches
+        return matches
+
+    def add_handlers(self, handlers: list):
+        '''Index the instance conditions each handler requires, so `select` can route instances to handlers.'''
+        self.handlers = handlers
+        for i, handler in enumerate(handlers):
+            # only the top-level conditions must match, the ones inside groups are checked by the handler
+            required = [condition for condition in handler.conditions if isinstance(condition, InstanceConditionObject)]
+            self.counts.append(len(required))
+            if not required:
+                self.unrouted.append(i)
+            for condition in required:
+                self.required.setdefault(condition, []).append(i)
+
+    def select(self, instance: GameInstance) -> list:
+        '''Return the handlers whose required instance conditions all match the instance, in config order.'''
+        hits = collections.Counter()
+        for condition in self.matches(instance):
+            hits.update(self.required.get(condition, ()))
+        selected = self.unrouted + [i for i, count in hits.items() if count == self.counts[i]]
+        selected.sort()
+        return [self.handlers[i] for i in selected]
+
+    def _candidates(self, path: str) -> typing.Iterator[InstanceConditionObject]:
+        node = self.trie
+        yield from node.get(None, ())
+        for char in path:
+            node = node.get(char)
+            if node is None:
+                return
+            yield from node.get(None, ())
+
+
+class ConditionGroup(BaseConditionObject):
+    '''
+    Combines other conditions, which can be groups themselves: `and` matches if all of them match,
+    `or` if any of them matches, and `not` if its only condition doesn't match.
+
+    The tree is compiled into a flat program of its leaf conditions. Every step checks one leaf and jumps
+    to the next step depending on the result, so the evaluation short-circuits without walking the tree.
+    '''
+    OPERATORS = ('and', 'or', 'not')
+
+    def __init__(self, op: str, conditions: list[BaseConditionObject], *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if op not in self.OPERATORS:
+            raise ValueError(f'Unknown condition operator: {op}')
+        if op == 'not' and len(conditions) != 1:
+            raise ValueError(f'"not" needs exactly one condition, got {len(conditions)}')
+        self.op = op
+        self.conditions = conditions
+        self.cost = max((condition.cost for condition in conditions), default=COST_PATH)
+
+        # (leaf, next step if it matches, next step if it doesn't)
+        self.program: list[tuple[BaseConditionObject, int, int]] = []
+        self.entry = self._compile(self, _TRUE, _FALSE)
+
+    @property
+    def key(self) -> tuple:
+        return self.op, tuple(condition.key for condition in self.conditions)
+
+    def _compile(self, condition: BaseConditionObject, on_true: int, on_false: int) -> int:
+        '''Append the steps of the condition to the program, and return the step to start it from.'''
+        if not isinstance(condition, ConditionGroup):
+            self.program.append((condition, on_true, on_false))
+            return len(self.program) - 1
+        if condition.op == 'not':
+            return self._compile(condition.conditions[0], on_false, on_true)
+
+        # compiled backwards, so every condition knows where its successor starts
+        entry = on_true if condition.op == 'and' else on_false
+        for child in reversed(condition.conditions):
+            if condition.op == 'and':
+                entry = self._compile(child, entry, on_false)
+            else:
+                entry = self._compile(child, on_true, entry)
+        return entry
 
     def _check(self, instance: GameInstance) -> bool:
-        return self.instance_pattern.match(instance.path.replace('\\', '/')) is not None
+        step = self.entry
+        while step >= 0:
+            condition, on_true, on_false = self.program[step]
+            step = on_true if condition.check(instance) else on_false
+        return step == _TRUE
+
+
+class ConditionPlanner:
+    '''
+    Prepares the conditions of all handlers of a config once, when it is loaded.
+
+    Identical conditions of different handlers and groups are replaced with a single shared object, so their result
+    is computed once per instance, and the conditions of each handler are ordered cheapest first,
+    so an expensive check is skipped if a cheap one already failed.
+    '''
+
+    def __init__(self):
+        self.shared: dict[tuple, BaseConditionObject] = {}
+
+    def plan(self, conditions: list[BaseConditionObject]) -> list[BaseConditionObject]:
+        '''Return the shared, deduplicated conditions of a handler, ordered by cost and then by config order.'''
+        unique = dict.fromkeys(map(self.share, conditions))
+        return sorted(unique, key=lambda condition: condition.cost)
+
+    def route(self) -> InstanceRouter:
+        '''Match all instance patterns of the planned conditions through a single `InstanceRouter`.'''
+        return InstanceRouter(condition for condition in self.shared.values()
+                              if isinstance(condition, InstanceConditionObject))
+
+    def share(self, condition: BaseConditionObject) -> BaseConditionObject:
+        '''Return the shared object of the condition, the conditions of a group are planned as well.'''
+        if isinstance(condition, ConditionGroup):
+            condition = ConditionGroup(condition.op, self.plan(condition.conditions))
+        return self.shared.setdefault(condition.key, condition)
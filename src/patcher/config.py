@@ -1,38 +1,222 @@
+import json
+import os
+import re
+import typing
+
+from src import __version__
 from src.instance import GameInstance
+from src.patcher.conditions import ConditionPlanner, InstanceRouter
+from src.patcher.merge import SOURCE_CACHE
+from src.patcher.patch import PatchObject, PatchHandler, is_applied, target_has_changes
+from src.patcher.plan import Plan, PlanStep
+from src.patcher.transaction import recover
+
+# match a string (kept as is), or a comment / a trailing comma
+_JSONC_COMMENT = re.compile(r'("(?:\\.|[^"\\])*")|//[^\n]*|/\*.*?\*/', re.DOTALL)
+_JSONC_TRAILING_COMMA = re.compile(r'("(?:\\.|[^"\\])*")|,(?=\s*[}\]])')
+
+
+def load_jsonc(text: str):
+    '''
+    Parse a JSON document with comments and trailing commas.
+
+    Uses the fast stdlib parser after removing the comments, and only falls back to the much slower
+    `json5` for the other JSON5 features, like unquoted keys or single-quoted strings.
+    '''
+    def keep_strings(m: re.Match) -> str:
+        return m.group(1) or ''
+
+    try:
+        return json.loads(_JSONC_TRAILING_COMMA.sub(keep_strings, _JSONC_COMMENT.sub(keep_strings, text)))
+    except ValueError:
+        import json5
+        return json5.loads(text)
+
+
+# the modules of the pickled classes: the compiled config is outdated as soon as any of them changes
+CODE_DIRS = (os.path.dirname(os.path.dirname(os.path.abspath(__file__))), os.path.dirname(os.path.abspath(__file__)))
 
-# file handlers
-import json5 as json
 
-from src.patcher.patch import PatchObject, PatchHandler
+def code_signature() -> str:
+    '''The names, sizes and mtimes of the modules in `CODE_DIRS`, which change whenever the code is updated.'''
+    entries = []
+    for folder in CODE_DIRS:
+        with os.scandir(folder) as it:
+            for entry in it:
+                if entry.name.endswith('.py'):
+                    st = entry.stat()
+                    entries.append(f'{folder}/{entry.name}:{st.st_size}:{st.st_mtime_ns}')
+    return '\n'.join(sorted(entries))
+
+
+def _is_inside(file: str, targets: set[str]) -> bool:
+    '''Check if a file is one of the targets, or inside one of them, like a file of a synced folder.'''
+    parts = os.path.normpath(file).split(os.sep)
+    return any(os.path.join(*parts[:i]) in targets for i in range(1, len(parts) + 1))
 
 
 class Config:
-    def __init__(self, config: dict | str, config_files_dir: str):
+    def __init__(self, config: dict | str, config_files_dir: str, cache: bool = True):
+        '''
+        :param config: The config, or the path to the config file.
+        :param config_files_dir: The folder the patch sources are taken from.
+        :param cache: Store the compiled patches of a config file in a cache file next to it,
+                      and load them from there while the config doesn't change.
+        '''
         if isinstance(config, str):
-            with open(config, 'r') as f:
-                config = json.load(f)
-
-        self.patches = [PatchHandler.from_dict(patch_data)
-                        for patch_data in config.get('patches', [])]
+            self.patches, self.router = self._load(config, cache)
+        else:
+            self.patches, self.router = self._compile(config)
         PatchObject.CONFIG_FILES_DIR = config_files_dir
 
-    def apply(self, instances: list[GameInstance]):
-        for instance in instances:
-            for patch in self.patches:
-                patch.apply(instance)
+    @staticmethod
+    def _compile(config: dict) -> tuple[list[PatchHandler], InstanceRouter]:
+        handlers = [PatchHandler.from_dict(patch_data)
+                    for patch_data in config.get('patches', [])]
+        planner = ConditionPlanner()
+        for handler in handlers:
+            handler.conditions = planner.plan(handler.conditions)
+        router = planner.route()
+        router.add_handlers(handlers)
+        return handlers, router
+
+    @classmethod
+    def _load(cls, path: str, cache: bool) -> tuple[list[PatchHandler], InstanceRouter]:
+        with open(path, 'rb') as f:
+            content = f.read()
+        if not cache:
+            return cls._compile(load_jsonc(content.decode('utf-8')))
+
+        import hashlib
+        import pickle
+
+        # the compiled patches depend on the config and on the code that compiled them
+        code = hashlib.sha256(code_signature().encode('utf-8')).hexdigest()
+        key = f'{__version__}:{code}:{hashlib.sha256(content).hexdigest()}'
+        cache_path = f'{path}.cache'
+        try:
+            with open(cache_path, 'rb') as f:
+                cached = pickle.load(f)
+            if cached['key'] == key:
+                return cached['patches'], cached['router']
+        except Exception:
+            # missing, outdated or broken cache
+            pass
 
-    def preview(self, instances: list[GameInstance]):
-        has_changes = False
+        patches, router = cls._compile(load_jsonc(content.decode('utf-8')))
+        try:
+            tmp_path = f'{cache_path}.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({'key': key, 'patches': patches, 'router': router}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            # the config folder may be read-only, the cache is only an optimization
+            pass
+        return patches, router
+
+    def plan(self, instances: list[GameInstance], use_manifest: bool = True) -> Plan:
+        '''
+        Evaluate the conditions and select the patches that would change the files of each instance.
+
+        Nothing is written, the patches found already applied are recorded in the manifests when the plan is applied.
+
+        :param use_manifest: Skip the patches that the manifest of the instance shows as applied and unchanged.
+                             Otherwise, every patch is checked against the files.
+        :return: The plan, with the instances that failed to be planned in `Plan.errors`.
+        '''
+        plan = Plan()
         for instance in instances:
-            patches: list[PatchObject] = []
-            for patch in self.patches:
-                patches.extend(patch.preview(instance))
+            planned = len(plan.steps)
+            try:
+                self._plan_instance(plan, instance, use_manifest)
+            except Exception as e:
+                # e.g. a broken file read by a condition, the other instances are still planned
+                del plan.steps[planned:]
+                plan.targets.pop(instance, None)
+                plan.errors.append((instance, e))
+            if len(plan.steps) == planned:
+                # nothing to apply, so the parsed files of the instance aren't needed anymore
+                SOURCE_CACHE.discard_tree(instance.path)
+        return plan
+
+    def _plan_instance(self, plan: Plan, instance: GameInstance, use_manifest: bool):
+        # an interrupted transactional commit is rolled back in every mode, otherwise a later
+        # transactional run would restore its old backups over the files written since
+        if recover(instance.path):
+            print(f'[MC-PATCHER] Rolled back an interrupted commit of {instance.path}')
+            instance.files.clear()
 
-            if not patches:
+        # only the handlers whose instance patterns match are checked
+        selected = [(patch, handler) for handler in self.router.select(instance) if handler.check(instance)
+                    for patch in handler.patches]
+
+        # a patch that replaces its whole target makes the earlier patches of that target pointless
+        targets: dict[str, list[int]] = {}
+        for index, (patch, _) in enumerate(selected):
+            if patch.replaces_target:
+                targets.pop(patch.file, None)
+            targets.setdefault(patch.file, []).append(index)
+
+        # the patches of a target are planned together, otherwise each of them would be checked against the target
+        # without the changes of the others, and applying some of them could flip it between their results
+        planned: dict[str, bool] = {}
+        for file, indexes in targets.items():
+            patches = [selected[index][0] for index in indexes]
+            if use_manifest and is_applied(instance, patches):
+                planned[file] = False
                 continue
-            for patch in patches:
-                print(f'Instance: {instance.path}')
-                print(f'  {patch.file} -> {patch.with_file} ({patch.method})')
-                has_changes = True
+            planned[file] = target_has_changes(instance, patches)
+            # recorded once the plan is applied, so the next run doesn't have to compare the files again
+            plan.targets.setdefault(instance, []).append(patches)
+
+        # the patches inside a planned folder, e.g. a sync, are applied after it again
+        kept = {index for indexes in targets.values() for index in indexes}
+        changed: set[str] = set()
+        for index, (patch, handler) in enumerate(selected):
+            if index in kept and (planned[patch.file] or _is_inside(patch.file, changed)):
+                changed.add(os.path.normpath(patch.file))
+                plan.steps.append(PlanStep(instance, patch, handler))
+
+    def apply(self, instances: list[GameInstance] | Plan, verify: bool = False,
+              jobs: int = 1, transactional: bool = False) -> list[tuple[GameInstance, Exception]]:
+        '''
+        Apply the patches to the instances.
+
+        :param instances: The instances, or a plan returned by `preview` to apply without evaluating the conditions again.
+        :param verify: Check the conditions of a plan again before applying it, see `Plan.apply`.
+        :param jobs: How many instances to patch at the same time.
+        :param transactional: Stage the changes and commit them all at once, see `Plan.apply`.
+        :return: The instances that failed with their errors.
+        '''
+        plan = instances if isinstance(instances, Plan) else self.plan(instances)
+        return plan.apply(verify=verify, jobs=jobs, transactional=transactional)
+
+    def preview(self, instances: list[GameInstance], use_manifest: bool = True) -> Plan:
+        '''Print the patches that would be applied and return them as a plan, which is empty if there are no changes.'''
+        plan = self.plan(instances, use_manifest)
+        self._print_plan(plan)
+        return plan
+
+    def stream(self, instances: typing.Iterable[GameInstance], use_manifest: bool = True,
+               transactional: bool = False) -> tuple[int, list[tuple[GameInstance, Exception]]]:
+        '''
+        Plan and apply the patches of each instance as soon as the iterable yields it,
+        e.g. while `GameInstance.iter_path` is still searching for the next instances.
+
+        The instances are patched one by one in the order they are yielded, and aren't kept after that.
+
+        :return: The number of applied patches, and the instances that failed with their errors.
+        '''
+        applied, errors = 0, []
+        for instance in instances:
+            plan = self.plan([instance], use_manifest)
+            self._print_plan(plan)
+            applied += len(plan)
+            errors.extend(plan.apply(transactional=transactional))
+        return applied, errors
 
-        return has_changes
+    @staticmethod
+    def _print_plan(plan: Plan):
+        for instance, patch, _ in plan:
+            print(f'Instance: {instance.path}')
+            print(f'  {patch.file} -> {patch.with_file} ({patch.method})')
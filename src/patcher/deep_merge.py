@@ -0,0 +1,122 @@
+import typing
+
+# what happens to a key of the merge source
+REPLACE = 'replace'  # the target value is replaced with the source value
+MERGE = 'merge'  # dicts are merged key by key, other values are replaced
+APPEND_UNIQUE = 'append-unique'  # the items of a source list missing from the target list are appended to it
+DELETE = 'delete'  # the key is removed from the target, the source value is ignored
+POLICIES = (REPLACE, MERGE, APPEND_UNIQUE, DELETE)
+
+
+class Change(typing.NamedTuple):
+    '''A single difference between the target and the merged document.'''
+    op: str  # 'set', 'append' or 'delete'
+    path: tuple[str, ...]
+    value: typing.Any
+
+
+class MergePolicies:
+    '''
+    The merge policies of the key paths of a document, like `{"quality": "replace", "*.tags": "append-unique"}`.
+
+    A path is a list of keys separated by dots, and a `*` key matches any key at its level.
+    An exact path takes precedence over the patterns, and the patterns are tried in order.
+    The keys without a policy get the default one: `REPLACE` updates only the top-level keys of the target,
+    and `MERGE` merges nested dicts key by key.
+    '''
+
+    def __init__(self, policies: dict[str, str] = None, default: str = REPLACE):
+        self.spec = dict(policies or {})
+        self.default = default
+        self.exact: dict[tuple[str, ...], str] = {}
+        self.patterns: list[tuple[tuple[str, ...], str]] = []
+        for path, policy in self.spec.items():
+            if policy not in POLICIES:
+                raise ValueError(f'Unknown merge policy for "{path}": {policy}, expected one of {", ".join(POLICIES)}')
+            segments = tuple(path.split('.'))
+            if '*' in segments:
+                self.patterns.append((segments, policy))
+            else:
+                self.exact[segments] = policy
+
+    def get(self, path: tuple[str, ...]) -> str:
+        policy = self.exact.get(path)
+        if policy is not None:
+            return policy
+        for segments, policy in self.patterns:
+            if len(segments) == len(path) and all(s == '*' or s == key for s, key in zip(segments, path)):
+                return policy
+        return self.default
+
+    def __repr__(self):
+        return f'MergePolicies({self.spec!r})'
+
+
+DEFAULT_POLICIES = MergePolicies()
+
+
+def deep_merge(target: dict, source: dict, policies: MergePolicies = None) -> tuple[dict, list[Change]]:
+    '''
+    Merge the source document into the target document, without modifying either of them.
+
+    Only the keys of the source are visited, and only the dicts on the way to a change are copied,
+    so the cost depends on the size of the source rather than on the size of the target.
+
+    :return: The merged document, which is the target itself if nothing changed, and the changes.
+    '''
+    changes: list[Change] = []
+    merged = _merge_dict(target, source, (), policies or DEFAULT_POLICIES, changes)
+    return merged, changes
+
+
+def _same(a: typing.Any, b: typing.Any) -> bool:
+    # True == 1, but an options.txt value must keep its type
+    return type(a) is type(b) and a == b
+
+
+def _merge_dict(target: dict, source: dict, path: tuple[str, ...],
+                policies: MergePolicies, changes: list[Change]) -> dict:
+    result = target  # copied on the first change
+    for key, value in source.items():
+        key_path = path + (key,)
+        policy = policies.get(key_path)
+        exists = key in target
+        current = target.get(key)
+
+        if policy == DELETE:
+            if exists:
+                new = _DELETED
+                changes.append(Change('delete', key_path, None))
+            else:
+                continue
+        elif policy == MERGE and isinstance(current, dict) and isinstance(value, dict):
+            new = _merge_dict(current, value, key_path, policies, changes)
+        elif policy == APPEND_UNIQUE and isinstance(current, list) and isinstance(value, list):
+            added = []
+            for item in value:
+                if item not in current and item not in added:
+                    added.append(item)
+            if added:
+                new = current + added
+                changes.append(Change('append', key_path, added))
+            else:
+                new = current
+        elif exists and _same(current, value):
+            new = current
+        else:
+            new = value
+            changes.append(Change('set', key_path, value))
+
+        if new is current and exists:
+            continue
+        if result is target:
+            result = dict(target)
+        if new is _DELETED:
+            del result[key]
+        else:
+            result[key] = new
+    return result
+
+
+# marks a key to remove from the merged dict
+_DELETED = object()
@@ -0,0 +1,185 @@
+import errno
+import os
+import stat
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# read files in chunks of this size when hashing
+CHUNK_SIZE = 1024 * 1024
+
+# the Linux ioctl that makes a file share the extents of another one (btrfs, xfs, bcachefs...)
+FICLONE = 0x40049409
+
+# errors meaning that the filesystem doesn't support a copy technique, so the next one should be tried
+UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTTY, errno.EPERM, errno.EBADF}
+
+
+class HashCache:
+    '''
+    Caches the content hashes of files, keyed by the path, mtime and size.
+
+    A source file copied into many instances is read only once per run.
+    '''
+
+    def __init__(self):
+        self._hashes: dict[tuple[str, int, int], str] = {}
+        self._lock = threading.Lock()
+
+    def hash(self, path: str, st: os.stat_result = None) -> str:
+        st = st or os.stat(path)
+        key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+        with self._lock:
+            digest = self._hashes.get(key)
+        if digest is None:
+            digest = file_hash(path)
+            with self._lock:
+                self._hashes[key] = digest
+        return digest
+
+    def clear(self):
+        with self._lock:
+            self._hashes.clear()
+
+
+# shared by all patches of a run
+HASH_CACHE = HashCache()
+
+
+def file_hash(path: str) -> str:
+    '''Return the SHA-256 hex digest of the file content.'''
+    import hashlib  # loading OpenSSL is slow, and most runs don't hash anything
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(CHUNK_SIZE):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def files_equal(from_path: str, to_path: str) -> bool:
+    '''
+    Check if the target is a regular file with the same content as the source.
+
+    Files of different sizes are never equal, and files with the same size and mtime are assumed to be equal
+    (`copy_file` keeps the mtime of the source). Only otherwise the content hashes are compared.
+    '''
+    try:
+        to_st = os.lstat(to_path)
+    except FileNotFoundError:
+        return False
+    # a symlink is not a copy, even if it points to the same content
+    if not stat.S_ISREG(to_st.st_mode):
+        return False
+
+    from_st = os.stat(from_path)
+    if from_st.st_size != to_st.st_size:
+        return False
+    if from_st.st_mtime_ns == to_st.st_mtime_ns:
+        return True
+    return HASH_CACHE.hash(from_path, from_st) == HASH_CACHE.hash(to_path, to_st)
+
+
+def _keep_mtime(from_path: str, to_path: str):
+    st = os.stat(from_path)
+    os.utime(to_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+
+def copy_file(from_path: str, to_path: str):
+    '''Copy the file content and keep the mtime of the source, so `files_equal` can skip hashing next time.'''
+    import shutil
+    shutil.copyfile(from_path, to_path)
+    _keep_mtime(from_path, to_path)
+
+
+def _clone(src: int, dst: int, size: int) -> bool:
+    '''Try to clone the file without copying its data, return whether it worked.'''
+    if fcntl is not None:
+        try:
+            fcntl.ioctl(dst, FICLONE, src)
+            return True
+        except OSError as e:
+            if e.errno not in UNSUPPORTED_ERRNOS:
+                raise
+
+    # copy_file_range copies in the kernel, and can reflink or copy on the server side on some filesystems
+    if hasattr(os, 'copy_file_range'):
+        copied = 0
+        try:
+            while copied < size:
+                n = os.copy_file_range(src, dst, size - copied)
+                if n == 0:
+                    break
+                copied += n
+            return copied == size
+        except OSError as e:
+            if e.errno not in UNSUPPORTED_ERRNOS:
+                raise
+            os.ftruncate(dst, 0)
+            os.lseek(dst, 0, os.SEEK_SET)
+    return False
+
+
+def reflink_file(from_path: str, to_path: str) -> bool:
+    '''
+    Copy the file as a copy-on-write clone if the filesystem supports it, otherwise as a regular copy.
+
+    :return: Whether the data was cloned or copied in the kernel, instead of a regular copy.
+    '''
+    with open(from_path, 'rb') as src, open(to_path, 'wb') as dst:
+        cloned = _clone(src.fileno(), dst.fileno(), os.fstat(src.fileno()).st_size)
+    if not cloned:
+        import shutil
+        shutil.copyfile(from_path, to_path)
+    _keep_mtime(from_path, to_path)
+    return cloned
+
+
+def is_hardlink_to(link_path: str, target: str) -> bool:
+    '''Check if both paths are the same file.'''
+    try:
+        return os.path.samefile(link_path, target) and not os.path.islink(link_path)
+    except OSError:
+        return False
+
+
+def can_hardlink(from_path: str, to_path: str) -> bool:
+    '''Check if the target can be a hard link to the source, which needs both to be on the same filesystem.'''
+    # the folder of the target may not exist yet, its closest existing parent is on the same filesystem
+    folder = os.path.dirname(os.path.abspath(to_path))
+    while not os.path.exists(folder) and os.path.dirname(folder) != folder:
+        folder = os.path.dirname(folder)
+    try:
+        return os.stat(from_path).st_dev == os.stat(folder).st_dev
+    except OSError:
+        return True
+
+
+def hardlink_file(from_path: str, to_path: str) -> bool:
+    '''
+    Replace the target with a hard link to the source. If hard links are not possible
+    (e.g. the instance is on another filesystem), fall back to a copy.
+
+    :return: Whether the target changed, an equal copy is kept when falling back.
+    '''
+    # link next to the target first, so the target is replaced in one step
+    tmp_path = f'{to_path}.mc-patcher-link'
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(from_path, tmp_path)
+    except OSError as e:
+        if e.errno not in UNSUPPORTED_ERRNOS | {errno.EMLINK}:
+            raise
+        if files_equal(from_path, to_path):
+            return False
+        copy_file(from_path, tmp_path)
+    os.replace(tmp_path, to_path)
+    return True
+
+
+def is_link_to(link_path: str, target: str) -> bool:
+    '''Check if the path is a symlink that points to the target.'''
+    return os.path.islink(link_path) and os.readlink(link_path) == target
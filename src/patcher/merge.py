@@ -1,18 +1,95 @@
 import fnmatch
+import functools
+import io
+import json
 import os
+import threading
 import typing
 
-import json5 as json
-import toml
-import yaml
-from src import options
+from src.patcher.deep_merge import DEFAULT_POLICIES, DELETE, MergePolicies, deep_merge
+
+# the format backends are imported by the backend functions, so they are only loaded when a file of their type is merged
 
 
 class MergeError(Exception):
     ...
 
 
-def merge(from_path: str, to_path: str):
+class SourceCache:
+    '''
+    Caches the parsed documents of a run: the merge sources, so a source merged into many instances is parsed
+    only once, and the merge targets and the files read by content conditions, so a file checked by conditions
+    and then merged is parsed only once too.
+
+    Entries are keyed by the path, the loader and its arguments, and are reloaded when the file's mtime or size changes.
+    The returned documents are shared, so they must not be modified.
+    The documents of an instance's files are dropped once it is patched, so only the sources stay for the whole run.
+    '''
+
+    def __init__(self):
+        self._documents: dict[tuple, tuple[tuple[int, int], str, typing.Any]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, path: str, loader: typing.Callable[[typing.IO], typing.Any], **loader_args) -> typing.Any:
+        return self.load_text(path, loader, **loader_args)[1]
+
+    def load_text(self, path: str, loader: typing.Callable[[typing.IO], typing.Any],
+                  **loader_args) -> tuple[str, typing.Any]:
+        '''Same as `load`, but also returns the text the document was parsed from.'''
+        st = os.stat(path)
+        signature = (st.st_mtime_ns, st.st_size)
+        key = (os.path.abspath(path), loader, tuple(sorted(loader_args.items())))
+
+        with self._lock:
+            cached = self._documents.get(key)
+            if cached is not None and cached[0] == signature:
+                self.hits += 1
+                return cached[1], cached[2]
+            self.misses += 1
+
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        document = loader(io.StringIO(text), **loader_args)
+        with self._lock:
+            self._documents[key] = (signature, text, document)
+        return text, document
+
+    def discard(self, path: str):
+        '''
+        Drop the documents of a file, after writing it. On filesystems with coarse timestamps the written file
+        can keep its mtime and size, so the cached document would still look current.
+        '''
+        path = os.path.abspath(path)
+        with self._lock:
+            for key in [key for key in self._documents if key[0] == path]:
+                del self._documents[key]
+
+    def discard_tree(self, root: str):
+        '''Drop the documents of all files inside a folder, e.g. of an instance once it is patched.'''
+        root = os.path.join(os.path.abspath(root), '')
+        with self._lock:
+            for key in [key for key in self._documents if key[0].startswith(root)]:
+                del self._documents[key]
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+
+
+# shared by all merges of a run
+SOURCE_CACHE = SourceCache()
+
+
+def merge(from_path: str, to_path: str, dry_run: bool = False, policies: MergePolicies = None) -> bool:
+    '''
+    Merge the source file into the target file. The target is only written if its content changes.
+
+    :param dry_run: Don't write the target, only check if it would change.
+    :param policies: How the keys of the source are merged, see `deep_merge`. The top-level keys are replaced by default.
+    :return: Whether the target changed (or would change).
+    '''
     _, ext_from = os.path.splitext(from_path)
     _, ext_to = os.path.splitext(to_path)
     if ext_from != ext_to:
@@ -20,63 +97,192 @@ def merge(from_path: str, to_path: str):
 
     for pattern, merge_func in MERGE_MAP.items():
         if fnmatch.fnmatch(to_path, pattern):
-            merge_func(from_path, to_path)
-            return
+            return merge_func(from_path, to_path, dry_run, policies)
     raise MergeError(f'Unknown file type: "{to_path}"')
 
 
 def _merge_file(
     from_path: str, to_path: str,
     loader: typing.Callable[[typing.IO], dict], dumper: typing.Callable[[dict, typing.IO], None],
-    from_args: dict = None, to_args: dict = None, dump_args: dict = None
-):
-    '''Merge two files using the given loader and dumper functions.'''
-    with open(from_path, 'r', encoding='utf-8') as f:
-        from_data = loader(f, **(from_args or {}))
-    with open(to_path, 'r', encoding='utf-8') as f:
-        to_data = loader(f, **(to_args or {}))
-    to_data.update(from_data)
+    from_args: dict = None, to_args: dict = None, dump_args: dict = None, dry_run: bool = False,
+    policies: MergePolicies = None
+) -> bool:
+    '''
+    Merge two files using the given loader and dumper functions.
+
+    The target is only serialized if the merge changes its document, and only written if the result
+    differs from the current content.
+    '''
+    from_data = SOURCE_CACHE.load(from_path, loader, **(from_args or {}))
+    original, to_data = SOURCE_CACHE.load_text(to_path, loader, **(to_args or {}))
+    if not isinstance(from_data, dict) or not isinstance(to_data, dict):
+        raise MergeError(f'Can only merge documents with keys: "{from_path}" and "{to_path}"')
+
+    # the cached documents are shared with the content conditions, the merge doesn't modify them
+    to_data, changes = deep_merge(to_data, from_data, policies)
+    if not changes:
+        return False
+
+    merged = io.StringIO()
+    dumper(to_data, merged, **(dump_args or {}))
+    merged = merged.getvalue()
+    if merged == original:
+        return False
+
+    if not dry_run:
+        with open(to_path, 'w', encoding='utf-8') as f:
+            f.write(merged)
+        SOURCE_CACHE.discard(to_path)
+    return True
+
+
+def load_document(path: str) -> tuple[str, typing.Any]:
+    '''
+    Read an instance file and parse it with the backend its merge uses, or keep it as plain text if it can't be merged.
+    The document is cached in `SOURCE_CACHE`, so it must not be modified.
+
+    :return: The text of the file, and the parsed document.
+    '''
+    for pattern, backend in BACKEND_MAP.items():
+        if fnmatch.fnmatch(path, pattern):
+            return SOURCE_CACHE.load_text(path, backend().load)
+    return SOURCE_CACHE.load_text(path, _read_text)
+
+
+def _read_text(fp: typing.IO) -> str:
+    return fp.read()
+
+
+class Backend(typing.NamedTuple):
+    '''The functions a file format is parsed and written with.'''
+    load: typing.Callable[[typing.IO], typing.Any]
+    dump: typing.Callable[[typing.Any, typing.IO], None]
 
-    with open(to_path, 'w', encoding='utf-8') as f:
-        dumper(to_data, f, **(dump_args or {}))
 
+# Every backend is selected once, when a file of its format is first merged. The selected functions are also
+# the keys of the parsed documents in `SOURCE_CACHE`, so they must stay the same objects.
 
-def merge_json(from_path: str, to_path: str):
-    _merge_file(
-        from_path, to_path,
-        json.load, json.dump,
-        dump_args={'indent': 4}
-    )
+@functools.cache
+def json_backend() -> Backend:
+    '''Strict JSON is parsed by the stdlib `json`, files with JSON5 syntax fall back to `json5`.'''
+    return Backend(_load_json, _dump_json)
 
 
-def merge_yaml(from_path: str, to_path: str):
-    _merge_file(
-        from_path, to_path,
-        yaml.safe_load, yaml.safe_dump
-    )
+def _load_json(fp: typing.IO) -> typing.Any:
+    text = fp.read()
+    try:
+        return json.loads(text)
+    except ValueError:
+        # comments, trailing commas and the other JSON5 syntax some mods accept in their .json files
+        import json5
+        return json5.loads(text)
 
 
-def merge_toml(from_path: str, to_path: str):
-    _merge_file(
-        from_path, to_path,
-        toml.load, toml.dump
-    )
+def _dump_json(data: typing.Any, fp: typing.IO):
+    json.dump(data, fp, indent=4)
 
 
-def merge_options(from_path: str, to_path: str):
-    _merge_file(
-        from_path, to_path,
-        options.load, options.dump,
-        from_args={'remove_version': True},
-    )
+@functools.cache
+def json5_backend() -> Backend:
+    import json5
+    return Backend(json5.load, functools.partial(json5.dump, indent=4))
+
+
+@functools.cache
+def yaml_backend() -> Backend:
+    '''The safe loader and dumper of libyaml if PyYAML was built with it, the pure Python ones otherwise.'''
+    import yaml
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    dumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+    return Backend(functools.partial(yaml.load, Loader=loader), functools.partial(yaml.dump, Dumper=dumper))
+
+
+@functools.cache
+def toml_backend() -> Backend:
+    '''Parsed by the stdlib `tomllib` since Python 3.11, which can't write TOML, so `toml` writes it.'''
+    try:
+        import tomllib
+    except ImportError:
+        import toml
+        return Backend(toml.load, toml.dump)
+    return Backend(_load_toml, _dump_toml)
+
+
+def _load_toml(fp: typing.IO) -> dict:
+    import tomllib
+    return tomllib.loads(fp.read())
+
+
+def _dump_toml(data: dict, fp: typing.IO):
+    import toml
+    toml.dump(data, fp)
+
+
+@functools.cache
+def options_backend() -> Backend:
+    from src import options
+    return Backend(options.load, options.dump)
+
+
+def merge_json(from_path: str, to_path: str, dry_run: bool = False, policies: MergePolicies = None) -> bool:
+    backend = json_backend()
+    return _merge_file(from_path, to_path, backend.load, backend.dump, dry_run=dry_run, policies=policies)
+
+
+def merge_json5(from_path: str, to_path: str, dry_run: bool = False, policies: MergePolicies = None) -> bool:
+    backend = json5_backend()
+    return _merge_file(from_path, to_path, backend.load, backend.dump, dry_run=dry_run, policies=policies)
+
+
+def merge_yaml(from_path: str, to_path: str, dry_run: bool = False, policies: MergePolicies = None) -> bool:
+    backend = yaml_backend()
+    return _merge_file(from_path, to_path, backend.load, backend.dump, dry_run=dry_run, policies=policies)
+
+
+def merge_toml(from_path: str, to_path: str, dry_run: bool = False, policies: MergePolicies = None) -> bool:
+    backend = toml_backend()
+    return _merge_file(from_path, to_path, backend.load, backend.dump, dry_run=dry_run, policies=policies)
+
+
+def merge_options(from_path: str, to_path: str, dry_run: bool = False, policies: MergePolicies = None) -> bool:
+    '''
+    `options.txt` is merged line by line: only the options of the source are parsed in the target,
+    and its other lines are kept byte for byte.
+    '''
+    from src import options
+
+    source = SOURCE_CACHE.load(from_path, options_backend().load, remove_version=True)
+    policies = policies or DEFAULT_POLICIES
+    delete = {key for key in source if policies.get((key,)) == DELETE}
+
+    with open(to_path, 'r', encoding='utf-8', newline='') as f:
+        merged = options.merge(f, source, delete)
+    if merged is None:
+        return False
+
+    if not dry_run:
+        with open(to_path, 'w', encoding='utf-8', newline='') as f:
+            f.write(merged)
+        SOURCE_CACHE.discard(to_path)
+    return True
 
 
 # Map of file patterns to merge functions
 MERGE_MAP = {
     '**/*.json': merge_json,
-    '**/*.json5': merge_json,
+    '**/*.json5': merge_json5,
     '**/*.yaml': merge_yaml,
     '**/*.yml': merge_yaml,
     '**/*.toml': merge_toml,
     '**/options.txt': merge_options,
 }
+
+# Map of file patterns to the backends of their merge functions, for `load_document`
+BACKEND_MAP = {
+    '**/*.json': json_backend,
+    '**/*.json5': json5_backend,
+    '**/*.yaml': yaml_backend,
+    '**/*.yml': yaml_backend,
+    '**/*.toml': toml_backend,
+    '**/options.txt': options_backend,
+}
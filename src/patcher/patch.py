@@ -1,16 +1,24 @@
 import enum
 import os
-import shutil
 
 from src.instance import GameInstance
 from src.patcher.conditions import BaseConditionObject, FileConditionObject
-from src.patcher.merge import merge
+from src.patcher.deep_merge import MERGE, REPLACE, MergePolicies
+from src.patcher.files import (
+    can_hardlink, copy_file, files_equal, hardlink_file, is_hardlink_to, is_link_to, reflink_file,
+)
+from src.patcher.merge import SOURCE_CACHE, merge
+from src.patcher.sync import sync
+from src.patcher.transaction import Transaction
 
 
 class Method(enum.Enum):
     OVERWRITE = 'overwrite'
     INSERT = 'insert'
     SYMLINK = 'symlink'
+    HARDLINK = 'hardlink'
+    REFLINK = 'reflink'
+    SYNC = 'sync'
 
     MERGE = 'merge'
 
@@ -18,39 +26,161 @@ class Method(enum.Enum):
 class PatchObject:
     CONFIG_FILES_DIR: str
 
-    def __init__(self, file: str, with_file: str, method: str | Method):
+    def __init__(self, file: str, with_file: str, method: str | Method, delete: bool = False, checksum: bool = False,
+                 policies: dict[str, str] = None, deep: bool = False):
         self.file = file
         self.with_file = with_file
         self.method = Method(method) if isinstance(method, str) else method
+        # sync options
+        self.delete = delete
+        self.checksum = checksum
+        # merge options
+        self.policies = MergePolicies(policies, default=MERGE if deep else REPLACE) if policies or deep else None
 
-    def apply(self, instance: GameInstance):
-        os.makedirs(os.path.join(instance.path, os.path.dirname(self.file)), exist_ok=True)
+    @property
+    def key(self) -> str:
+        '''Identifies the patch in the applied-state manifest.'''
+        key = f'{self.method.value}:{self.with_file}:{self.file}'
+        if self.policies is not None:
+            # the same source merged with other policies gives another result
+            key += ':' + ','.join(f'{path}={policy}' for path, policy in sorted(self.policies.spec.items()))
+            if self.policies.default != REPLACE:
+                key += f':*={self.policies.default}'
+        return key
+
+    @property
+    def replaces_target(self) -> bool:
+        '''Whether the result of the patch doesn't depend on the previous target, unlike merges or inserts.'''
+        return self.method in (Method.OVERWRITE, Method.SYMLINK, Method.HARDLINK, Method.REFLINK)
 
+    def paths(self, instance: GameInstance) -> tuple[str, str]:
+        '''Return the source path in the configs folder and the target path in the instance.'''
         from_path = os.path.join(self.CONFIG_FILES_DIR, self.with_file)
         to_path = os.path.join(instance.path, self.file)
+        return from_path, to_path
+
+    def has_changes(self, instance: GameInstance) -> bool:
+        '''Check if applying the patch would change the instance files, without changing them.'''
+        from_path, to_path = self.paths(instance)
+
+        if self.method in (Method.OVERWRITE, Method.REFLINK):
+            return not files_equal(from_path, to_path)
+        elif self.method == Method.INSERT:
+            return not os.path.exists(to_path)
+        elif self.method == Method.SYMLINK:
+            return not is_link_to(to_path, from_path)
+        elif self.method == Method.HARDLINK:
+            if is_hardlink_to(to_path, from_path):
+                return False
+            # across filesystems `hardlink_file` keeps an equal copy
+            return can_hardlink(from_path, to_path) or not files_equal(from_path, to_path)
+        elif self.method == Method.SYNC:
+            return sync(from_path, to_path, self.delete, self.checksum, dry_run=True)
+        elif self.method == Method.MERGE:
+            # the target can be created by an earlier patch
+            return not os.path.exists(to_path) or merge(from_path, to_path, dry_run=True, policies=self.policies)
+        else:
+            raise NotImplementedError(f'Unknown method: {self.method}')
+
+    def apply(self, instance: GameInstance) -> bool:
+        '''
+        Apply the patch to the instance. Files are only written if their content would change.
+
+        :return: Whether the instance files were changed.
+        '''
+        os.makedirs(os.path.join(instance.path, os.path.dirname(self.file)), exist_ok=True)
+
+        from_path, to_path = self.paths(instance)
 
         if self.method == Method.OVERWRITE:
-            self._overwrite(from_path, to_path)
+            changed = self._overwrite(from_path, to_path)
         elif self.method == Method.INSERT:
-            self._insert(from_path, to_path)
+            changed = self._insert(from_path, to_path)
         elif self.method == Method.SYMLINK:
-            self._symlink(from_path, to_path)
+            changed = self._symlink(from_path, to_path)
+        elif self.method == Method.HARDLINK:
+            changed = self._hardlink(from_path, to_path)
+        elif self.method == Method.REFLINK:
+            changed = self._reflink(from_path, to_path)
+        elif self.method == Method.SYNC:
+            changed = sync(from_path, to_path, self.delete, self.checksum)
         elif self.method == Method.MERGE:
-            merge(from_path, to_path)
+            changed = merge(from_path, to_path, policies=self.policies)
         else:
             raise NotImplementedError(f'Unknown method: {self.method}')
 
-    def _overwrite(self, from_path: str, to_path: str):
-        if os.path.exists(to_path):
+        if changed:
+            instance.files.invalidate(self.file)
+        return changed
+
+    def stage(self, instance: GameInstance, transaction: Transaction) -> bool:
+        '''
+        Write the changes of the patch to the staging folder of a transaction instead of the instance,
+        see `apply`. Later patches of the same transaction see the staged files.
+
+        Sync patches mirror whole folders, so they can't be staged.
+
+        :return: Whether the patch staged a change.
+        '''
+        if self.method == Method.SYNC:
+            raise ValueError('Sync patches are applied in place, they can\'t be staged')
+
+        from_path = self.paths(instance)[0]
+        current = transaction.current(self.file)
+
+        if self.method in (Method.OVERWRITE, Method.REFLINK):
+            if files_equal(from_path, current):
+                return False
+            staged = transaction.stage(self.file)
+            if self.method == Method.OVERWRITE:
+                copy_file(from_path, staged)
+            else:
+                reflink_file(from_path, staged)
+        elif self.method == Method.INSERT:
+            if os.path.exists(current):
+                return False
+            copy_file(from_path, transaction.stage(self.file))
+        elif self.method == Method.SYMLINK:
+            if is_link_to(current, from_path):
+                return False
+            os.symlink(from_path, transaction.stage(self.file), target_is_directory=os.path.isdir(from_path))
+        elif self.method == Method.HARDLINK:
+            if is_hardlink_to(current, from_path):
+                return False
+            hardlink_file(from_path, transaction.stage(self.file))
+        elif self.method == Method.MERGE:
+            if self.file in transaction.staged:
+                return merge(from_path, current, policies=self.policies)
+            # merge into a staged copy of the target, which is dropped if nothing changes
+            import shutil
+            staged = transaction.stage(self.file)
+            shutil.copyfile(current, staged)
+            # the staged path is reused by the next transaction, with a new file that can have the same mtime
+            SOURCE_CACHE.discard(staged)
+            if not merge(from_path, staged, policies=self.policies):
+                transaction.unstage(self.file)
+                return False
+        else:
+            raise NotImplementedError(f'Unknown method: {self.method}')
+        return True
+
+    def _overwrite(self, from_path: str, to_path: str) -> bool:
+        if files_equal(from_path, to_path):
+            return False
+        if os.path.lexists(to_path):
             os.remove(to_path)
-        shutil.copyfile(from_path, to_path)
+        copy_file(from_path, to_path)
+        return True
 
-    def _insert(self, from_path: str, to_path: str):
+    def _insert(self, from_path: str, to_path: str) -> bool:
         if os.path.exists(to_path):
-            return
-        shutil.copyfile(from_path, to_path)
+            return False
+        copy_file(from_path, to_path)
+        return True
 
-    def _symlink(self, from_path: str, to_path: str):
+    def _symlink(self, from_path: str, to_path: str) -> bool:
+        if is_link_to(to_path, from_path):
+            return False
         if os.path.exists(to_path):
             os.remove(to_path)
         if os.path.islink(to_path):
@@ -59,6 +189,72 @@ class PatchObject:
             os.symlink(from_path, to_path, target_is_directory=True)
         else:
             os.symlink(from_path, to_path)
+        return True
+
+    def _hardlink(self, from_path: str, to_path: str) -> bool:
+        if is_hardlink_to(to_path, from_path):
+            return False
+        return hardlink_file(from_path, to_path)
+
+    def _reflink(self, from_path: str, to_path: str) -> bool:
+        if files_equal(from_path, to_path):
+            return False
+        if os.path.lexists(to_path):
+            os.remove(to_path)
+        reflink_file(from_path, to_path)
+        return True
+
+
+def is_applied(instance: GameInstance, patches: list[PatchObject]) -> bool:
+    '''Check if the manifest shows that the patches of a target were applied in this order and nothing changed since.'''
+    # the manifest only tracks single files, a change deep inside a synced tree is not visible on its root
+    if any(patch.method == Method.SYNC for patch in patches):
+        return False
+    return instance.manifest.is_current(patches[-1].file, _sources(instance, patches), patches[-1].paths(instance)[1])
+
+
+def record_applied(instance: GameInstance, patches: list[PatchObject]):
+    '''Record in the manifest that the patches of a target are applied, see `is_applied`.'''
+    if any(patch.method == Method.SYNC for patch in patches):
+        return
+    instance.manifest.record(patches[-1].file, _sources(instance, patches), patches[-1].paths(instance)[1])
+
+
+def _sources(instance: GameInstance, patches: list[PatchObject]) -> list[tuple[str, str]]:
+    return [(patch.key, patch.paths(instance)[0]) for patch in patches]
+
+
+def target_has_changes(instance: GameInstance, patches: list[PatchObject]) -> bool:
+    '''
+    Check if applying patches of the same target in order would change it, without changing it.
+
+    An earlier patch changes what the later ones see, e.g. two merges setting the same key both change the target
+    on their own, even when together they leave it as it is. So several patches are applied to a copy of the target
+    in a temporary folder, and the result is compared with the target.
+    '''
+    if len(patches) == 1:
+        return patches[0].has_changes(instance)
+    file = os.path.normpath(patches[0].file)
+    # links would make the copy write their sources, and only relative targets can be copied
+    if os.path.isabs(file) or file.startswith(os.pardir) or any(
+            patch.method in (Method.SYMLINK, Method.HARDLINK, Method.SYNC) for patch in patches):
+        return True
+
+    import shutil
+    import tempfile
+    to_path = patches[0].paths(instance)[1]
+    with tempfile.TemporaryDirectory() as tmp:
+        copy = os.path.join(tmp, file)
+        if os.path.exists(to_path):
+            os.makedirs(os.path.dirname(copy), exist_ok=True)
+            shutil.copyfile(to_path, copy)
+        try:
+            scratch = GameInstance(tmp)
+            for patch in patches:
+                patch.apply(scratch)
+        finally:
+            SOURCE_CACHE.discard_tree(tmp)
+        return os.path.exists(copy) and not files_equal(copy, to_path)
 
 
 class PatchHandler:
@@ -91,14 +287,17 @@ class PatchHandler:
 
         return cls(patch_objs, condition_objs)
 
+    def check(self, instance: GameInstance) -> bool:
+        return all(condition.check(instance) for condition in self.conditions)
+
     def apply(self, instance: GameInstance):
-        if all(condition.check(instance) for condition in self.conditions):
+        if self.check(instance):
             for patch in self.patches:
                 patch.apply(instance)
 
     def preview(self, instance: GameInstance):
         patches: list[PatchObject] = []
-        if all(condition.check(instance) for condition in self.conditions):
+        if self.check(instance):
             for patch in self.patches:
                 patches.append(patch)
 
@@ -0,0 +1,182 @@
+import typing
+
+from src.instance import GameInstance
+from src.patcher.merge import SOURCE_CACHE
+from src.patcher.patch import Method, PatchHandler, PatchObject, record_applied
+from src.patcher.transaction import Transaction
+
+
+class PlanStep(typing.NamedTuple):
+    instance: GameInstance
+    patch: PatchObject
+    handler: PatchHandler  # the handler whose conditions selected the patch
+
+
+class Plan:
+    '''
+    The patches selected for each instance by a preview.
+
+    Applying a plan doesn't evaluate the conditions again, so the filesystem work for them is done only once.
+    '''
+
+    def __init__(self, steps: list[PlanStep] = None):
+        self.steps = steps or []
+        # the patches of each checked target of the instances, recorded in their manifests when the plan is applied
+        self.targets: dict[GameInstance, list[list[PatchObject]]] = {}
+        # the instances that failed to be planned, with their errors
+        self.errors: list[tuple[GameInstance, Exception]] = []
+
+    def __iter__(self) -> typing.Iterator[PlanStep]:
+        return iter(self.steps)
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    def __bool__(self) -> bool:
+        return bool(self.steps)
+
+    def instances(self) -> list[GameInstance]:
+        '''The planned instances, in order.'''
+        return [instance for instance, _ in self.by_instance()]
+
+    def by_instance(self) -> list[tuple[GameInstance, list[PlanStep]]]:
+        '''Group the steps by instance, keeping the order of the instances and of the steps of each instance.'''
+        groups: dict[int, tuple[GameInstance, list[PlanStep]]] = {}
+        for step in self.steps:
+            groups.setdefault(id(step.instance), (step.instance, []))[1].append(step)
+        return list(groups.values())
+
+    def apply(self, verify: bool = False, jobs: int = 1,
+              transactional: bool = False) -> list[tuple[GameInstance, Exception]]:
+        '''
+        Apply the planned patches.
+
+        The patches of an instance are always applied in order, but different instances can be patched concurrently.
+        An error stops patching the instance it happened in, the other instances are still patched.
+
+        :param verify: Check the conditions of each handler again before applying its patches,
+                       and skip them if they no longer match. Useful if the files could have changed since the preview.
+        :param jobs: How many instances to patch at the same time.
+        :param transactional: Stage the changes of all instances first, then commit them with renames, see `Transaction`.
+                              An error while staging leaves its instance unchanged.
+        :return: The instances that failed to be planned, then the instances that failed to be patched,
+                 with their errors.
+        '''
+        groups = self.by_instance()
+        if not transactional:
+            errors = self._map(lambda group: self._apply_instance(*group, verify), groups, jobs)
+        else:
+            # the slow copying and merging is done concurrently, the commits only rename the staged files
+            staged = self._map(lambda group: self._stage_instance(*group, verify), groups, jobs)
+            errors = [
+                error if error is not None else self._commit_instance(instance, transaction, steps)
+                for (instance, _), (transaction, steps, error) in zip(groups, staged)
+            ]
+        # the instances without steps only record the patches that were found applied
+        patched = {instance for instance, _ in groups}
+        groups += [(instance, []) for instance in self.targets if instance not in patched]
+        errors += [self._finish(instance, [], []) for instance in self.targets if instance not in patched]
+        return self.errors + [(instance, error) for (instance, _), error in zip(groups, errors) if error is not None]
+
+    @staticmethod
+    def _map(func: typing.Callable, groups: list, jobs: int) -> list:
+        if jobs > 1 and len(groups) > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                return list(executor.map(func, groups))
+        return [func(group) for group in groups]
+
+    @staticmethod
+    def _checked_steps(instance: GameInstance, steps: list[PlanStep], verify: bool) -> typing.Iterator[PlanStep]:
+        '''Yield the steps to apply, skipping those whose handler no longer matches if `verify` is set.'''
+        if verify:
+            # the snapshot was taken for the preview, so it may be outdated
+            instance.files.clear()
+
+        # each handler is checked only once, before its first patch is applied
+        checked: dict[int, bool] = {}
+        for step in steps:
+            if verify:
+                if id(step.handler) not in checked:
+                    checked[id(step.handler)] = step.handler.check(instance)
+                if not checked[id(step.handler)]:
+                    print(f'[MC-PATCHER] Skipping stale patch for {instance.path}: '
+                          f'{step.patch.file} -> {step.patch.with_file} ({step.patch.method})')
+                    continue
+            yield step
+
+    def _apply_instance(self, instance: GameInstance, steps: list[PlanStep], verify: bool) -> typing.Optional[Exception]:
+        '''Apply the steps of a single instance, returning the error that stopped it, if any.'''
+        error = None
+        applied = []
+        try:
+            for step in self._checked_steps(instance, steps, verify):
+                step.patch.apply(instance)
+                applied.append(step)
+        except Exception as e:
+            error = e
+
+        # keep the record of the patches applied before an error too
+        finish_error = self._finish(instance, steps, applied)
+        return error or finish_error
+
+    @classmethod
+    def _stage_instance(cls, instance: GameInstance, steps: list[PlanStep], verify: bool
+                        ) -> tuple[typing.Optional[Transaction], list[PlanStep], typing.Optional[Exception]]:
+        '''
+        Stage the steps of a single instance in a new transaction.
+
+        :return: The transaction and its steps, or the error that stopped staging, after which nothing is kept.
+        '''
+        transaction = Transaction(instance.path)
+        try:
+            staged = []
+            for step in cls._checked_steps(instance, steps, verify):
+                # sync patches are applied after the commit, see `_commit_instance`
+                if step.patch.method != Method.SYNC:
+                    step.patch.stage(instance, transaction)
+                staged.append(step)
+        except Exception as e:
+            transaction.discard()
+            SOURCE_CACHE.discard_tree(instance.path)
+            return None, [], e
+        return transaction, staged, None
+
+    def _commit_instance(self, instance: GameInstance, transaction: Transaction,
+                         steps: list[PlanStep]) -> typing.Optional[Exception]:
+        '''Commit the staged steps of a single instance, then apply its sync patches in place.'''
+        error = None
+        applied = []
+        try:
+            transaction.commit()
+            for step in steps:
+                if step.patch.method == Method.SYNC:
+                    step.patch.apply(instance)
+                else:
+                    instance.files.invalidate(step.patch.file)
+                applied.append(step)
+        except Exception as e:
+            error = e
+        finish_error = self._finish(instance, steps, applied)
+        return error or finish_error
+
+    def _finish(self, instance: GameInstance, steps: list[PlanStep],
+                applied: list[PlanStep]) -> typing.Optional[Exception]:
+        '''
+        Record the targets whose planned steps were all applied in the manifest of the instance, and save it.
+
+        :param steps: The planned steps of the instance.
+        :param applied: The steps that were applied, which can miss the steps after an error or the skipped ones.
+        :return: The error that stopped saving the manifest, if any.
+        '''
+        missed = {id(step.patch) for step in steps} - {id(step.patch) for step in applied}
+        error = None
+        try:
+            for patches in self.targets.get(instance, []):
+                if not any(id(patch) in missed for patch in patches):
+                    record_applied(instance, patches)
+            instance.manifest.save()
+        except Exception as e:
+            error = e
+        SOURCE_CACHE.discard_tree(instance.path)
+        return error
@@ -0,0 +1,159 @@
+import os
+import typing
+
+from src.patcher.files import HASH_CACHE, copy_file
+
+# below this number of copies, a thread pool costs more than it saves
+PARALLEL_COPY_THRESHOLD = 16
+# the copies are split into batches of this size for the thread pool
+COPY_BATCH_SIZE = 32
+
+
+class _Entry(typing.NamedTuple):
+    is_dir: bool
+    size: int
+    mtime_ns: int
+
+
+def _scan_tree(root: str, missing_ok: bool = False) -> dict[str, _Entry]:
+    '''
+    List all files and directories under the root, keyed by their '/'-separated path relative to the root.
+
+    :param missing_ok: Return an empty dict if the root doesn't exist, instead of raising `FileNotFoundError`.
+                       A root that isn't a directory always raises `NotADirectoryError`.
+    '''
+    entries: dict[str, _Entry] = {}
+    stack = ['']
+    while stack:
+        rel = stack.pop()
+        try:
+            it = os.scandir(os.path.join(root, rel) if rel else root)
+        except FileNotFoundError:
+            # a directory removed during the scan is skipped
+            if rel or missing_ok:
+                continue
+            raise
+        except NotADirectoryError:
+            if rel:
+                continue
+            raise
+        with it:
+            for entry in it:
+                path = f'{rel}/{entry.name}' if rel else entry.name
+                if entry.is_dir():
+                    entries[path] = _Entry(True, 0, 0)
+                    stack.append(path)
+                else:
+                    st = entry.stat()
+                    entries[path] = _Entry(False, st.st_size, st.st_mtime_ns)
+    return entries
+
+
+class SyncPlan:
+    '''The operations needed to make the target directory a mirror of the source directory.'''
+
+    def __init__(self, from_dir: str, to_dir: str, delete: bool = False, checksum: bool = False):
+        '''
+        :param delete: Also delete the files and directories of the target that are not in the source.
+        :param checksum: Compare the content hashes of files with the same size but a different mtime,
+                         instead of copying them right away.
+        :raises FileNotFoundError: If the source doesn't exist.
+        :raises NotADirectoryError: If the source isn't a directory.
+        '''
+        self.from_dir = from_dir
+        self.to_dir = to_dir
+
+        # the target itself must be a real directory, never write through a symlink
+        self.replace_root = os.path.islink(to_dir) or os.path.lexists(to_dir) and not os.path.isdir(to_dir)
+        # a missing source must not look like an empty one, which would empty the target with `delete`
+        source = _scan_tree(from_dir)
+        target = {} if self.replace_root else _scan_tree(to_dir, missing_ok=True)
+
+        self.mkdirs: list[str] = []
+        self.copies: list[str] = []
+        self.removals: list[str] = []
+
+        for path, entry in source.items():
+            existing = target.get(path)
+            if existing is not None and existing.is_dir != entry.is_dir:
+                # a file replaced a directory, or the other way around
+                self.removals.append(path)
+                existing = None
+
+            if entry.is_dir:
+                if existing is None:
+                    self.mkdirs.append(path)
+            elif existing is None or not self._same(path, entry, existing, checksum):
+                self.copies.append(path)
+
+        if delete:
+            # skip the paths inside a removed directory, they are removed with it
+            removed_dirs: list[str] = []
+            for path in sorted(target):
+                if path in source or path.startswith(tuple(removed_dirs)):
+                    continue
+                self.removals.append(path)
+                if target[path].is_dir:
+                    removed_dirs.append(f'{path}/')
+
+    def _same(self, path: str, entry: _Entry, existing: _Entry, checksum: bool) -> bool:
+        if entry.size != existing.size:
+            return False
+        if entry.mtime_ns == existing.mtime_ns:
+            return True
+        if not checksum:
+            return False
+        return HASH_CACHE.hash(os.path.join(self.from_dir, path)) == HASH_CACHE.hash(os.path.join(self.to_dir, path))
+
+    def __bool__(self) -> bool:
+        return bool(self.replace_root or self.mkdirs or self.copies or self.removals)
+
+    def apply(self, jobs: int = 4):
+        '''Run the operations: removals first, then the directories, then the copies in batches.'''
+        if self.replace_root:
+            os.remove(self.to_dir)
+        os.makedirs(self.to_dir, exist_ok=True)
+
+        for path in self.removals:
+            full = os.path.join(self.to_dir, path)
+            if os.path.isdir(full) and not os.path.islink(full):
+                import shutil
+                shutil.rmtree(full)
+            elif os.path.lexists(full):
+                os.remove(full)
+
+        # parents come before their children in a sorted list
+        for path in sorted(self.mkdirs):
+            os.makedirs(os.path.join(self.to_dir, path), exist_ok=True)
+
+        def copy_batch(batch: list[str]):
+            for path in batch:
+                to_path = os.path.join(self.to_dir, path)
+                # don't write through a symlink in the target
+                if os.path.islink(to_path):
+                    os.remove(to_path)
+                copy_file(os.path.join(self.from_dir, path), to_path)
+
+        if len(self.copies) < PARALLEL_COPY_THRESHOLD:
+            copy_batch(self.copies)
+            return
+        batches = [self.copies[i:i + COPY_BATCH_SIZE] for i in range(0, len(self.copies), COPY_BATCH_SIZE)]
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            # consume the results to raise the errors
+            list(executor.map(copy_batch, batches))
+
+
+def sync(from_dir: str, to_dir: str, delete: bool = False, checksum: bool = False, dry_run: bool = False) -> bool:
+    '''
+    Mirror the source directory into the target directory, copying only new and changed files.
+
+    :param delete: Also delete the files and directories of the target that are not in the source.
+    :param checksum: Compare the content of files with the same size but a different mtime.
+    :param dry_run: Don't change anything, only check if the target would change.
+    :return: Whether the target changed (or would change).
+    '''
+    plan = SyncPlan(from_dir, to_dir, delete, checksum)
+    if plan and not dry_run:
+        plan.apply()
+    return bool(plan)
@@ -0,0 +1,155 @@
+import json
+import os
+import typing
+
+
+class Transaction:
+    '''
+    Stages the file changes of an instance, and commits them all at once.
+
+    The changed files are written to a staging folder inside `.mc-patcher`, so they are on the same filesystem as
+    the instance, and are then moved over their targets with `os.replace`. Until the commit the instance isn't
+    changed at all, and the commit only renames files.
+
+    Before the first rename, a journal with the backups of the replaced files is written. If the commit fails,
+    or the process dies during it, the journal is used to restore the previous files, see `recover`.
+    '''
+    DIRNAME = '.mc-patcher'
+    STAGING_DIRNAME = 'staging'
+    JOURNAL_FILENAME = 'journal.json'
+    VERSION = 1
+
+    def __init__(self, instance_path: str):
+        self.instance_path = instance_path
+        self.state_dir = os.path.join(instance_path, self.DIRNAME)
+        self.staging_dir = os.path.join(self.state_dir, self.STAGING_DIRNAME)
+        self.journal_path = os.path.join(self.state_dir, self.JOURNAL_FILENAME)
+        # instance file -> its staged version, in the order they were first staged
+        self.staged: dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.staged)
+
+    def current(self, file: str) -> str:
+        '''The path the file has in the instance with the changes staged so far.'''
+        return self.staged.get(file) or os.path.join(self.instance_path, file)
+
+    def stage(self, file: str) -> str:
+        '''
+        Reserve the staged path of an instance file. Anything at that path is removed, so the caller can create it.
+
+        :return: The path to write the new version of the file to.
+        '''
+        path = self.staged.get(file)
+        if path is None:
+            path = os.path.join(self.staging_dir, 'files', file)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.staged[file] = path
+        if os.path.lexists(path):
+            os.remove(path)
+        return path
+
+    def unstage(self, file: str):
+        '''Drop the staged version of a file, e.g. when a merge into its staged copy changed nothing.'''
+        path = self.staged.pop(file, None)
+        if path is not None and os.path.lexists(path):
+            os.remove(path)
+
+    def commit(self):
+        '''
+        Replace the instance files with their staged versions.
+
+        The backups of the replaced files are made first, so the renames are the only changes made to the instance.
+        If a rename fails, the files replaced before it are restored and the error is raised.
+        '''
+        if not self.staged:
+            self.discard()
+            return
+
+        replaced = []
+        try:
+            backups = {file: self._backup(file) for file in self.staged}
+            self._write_journal(list(backups.items()))
+
+            for file, staged in self.staged.items():
+                target = os.path.join(self.instance_path, file)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(staged, target)
+                replaced.append((file, backups[file]))
+        except BaseException:
+            _restore(self.instance_path, replaced)
+            self.discard()
+            raise
+
+        self.discard()
+
+    def discard(self):
+        '''Remove the staged files, the backups and the journal, leaving the instance as it is.'''
+        self.staged.clear()
+        if os.path.lexists(self.journal_path):
+            os.remove(self.journal_path)
+        import shutil
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+
+    def _backup(self, file: str) -> typing.Optional[str]:
+        '''Keep the current version of a file in the staging folder, as a hard link if possible.'''
+        target = os.path.join(self.instance_path, file)
+        if not os.path.lexists(target):
+            return None
+        backup = os.path.join(self.staging_dir, 'backup', file)
+        os.makedirs(os.path.dirname(backup), exist_ok=True)
+        if os.path.lexists(backup):
+            os.remove(backup)
+        # a hard link costs nothing, symlinks are copied as links
+        if not os.path.islink(target):
+            try:
+                os.link(target, backup)
+                return backup
+            except OSError:
+                pass
+        import shutil
+        shutil.copy2(target, backup, follow_symlinks=False)
+        return backup
+
+    def _write_journal(self, entries: list[tuple[str, typing.Optional[str]]]):
+        tmp_path = f'{self.journal_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.VERSION, 'entries': entries}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+
+
+def _restore(instance_path: str, entries: list[tuple[str, typing.Optional[str]]]):
+    '''Put the backups back in place, and remove the files that didn't exist before the commit.'''
+    for file, backup in reversed(entries):
+        target = os.path.join(instance_path, file)
+        if backup is None:
+            if os.path.lexists(target):
+                os.remove(target)
+        elif os.path.lexists(backup):
+            os.replace(backup, target)
+
+
+def recover(instance_path: str) -> bool:
+    '''
+    Roll back a commit that was interrupted, if the instance has a journal left by it.
+
+    :return: Whether a commit was rolled back.
+    '''
+    transaction = Transaction(instance_path)
+    try:
+        with open(transaction.journal_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        # a staging folder without a journal was never committed
+        if os.path.isdir(transaction.staging_dir):
+            transaction.discard()
+        return False
+    except (OSError, ValueError):
+        data = {}
+
+    if isinstance(data, dict) and data.get('version') == Transaction.VERSION:
+        _restore(instance_path, [tuple(entry) for entry in data.get('entries', [])])
+    transaction.discard()
+    return True
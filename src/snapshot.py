@@ -0,0 +1,167 @@
+import fnmatch
+import functools
+import glob
+import os
+import re
+import typing
+
+# names are compared the same way the filesystem does
+CASE_INSENSITIVE = os.path.normcase('A') == 'a'
+
+
+def _split(path: str) -> list[str]:
+    '''Split a relative path into its segments, accepting both separators on Windows.'''
+    if os.sep != '/':
+        path = path.replace(os.sep, '/')
+    return path.split('/')
+
+
+class _Segment:
+    '''
+    A single path segment of a glob pattern.
+
+    The regex is compiled on the first match and is not pickled, so loading a cached config doesn't compile
+    the regexes of conditions that are never checked.
+    '''
+
+    def __init__(self, segment: str):
+        self.hidden = segment.startswith('.')
+        if glob.has_magic(segment):
+            self.literal = None
+            self.source = fnmatch.translate(segment)
+        else:
+            self.literal = os.path.normcase(segment)
+            self.source = None
+
+    @functools.cached_property
+    def regex(self) -> re.Pattern:
+        return re.compile(self.source, re.IGNORECASE if CASE_INSENSITIVE else 0)
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state.pop('regex', None)
+        return state
+
+    def filter(self, names: dict[str, bool]) -> list[str]:
+        '''Return the names of the directory listing that match the segment, like `glob.glob` would.'''
+        if self.literal is not None:
+            return [self.literal] if self.literal in names else []
+        return [
+            name for name in names
+            # same as glob, wildcards don't match hidden files unless the pattern is hidden too
+            if (self.hidden or not name.startswith('.')) and self.regex.match(name)
+        ]
+
+
+class GlobPattern:
+    '''
+    A glob pattern compiled once into a matcher per path segment.
+
+    Behaves like `glob.glob(pattern, root_dir=...)` without `recursive`, so `**` is the same as `*`.
+    Patterns that can leave the root (absolute paths, `.` and `..`) fall back to `glob.glob`.
+    '''
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        parts = _split(pattern)
+
+        # a trailing slash only matches directories
+        self.dir_only = len(parts) > 1 and parts[-1] == ''
+        parts = [part for part in parts if part]
+        self.fallback = os.path.isabs(pattern) or not parts or any(part in ('.', '..') for part in parts)
+        self.segments = [] if self.fallback else [_Segment(part) for part in parts]
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def compile(pattern: str) -> 'GlobPattern':
+        '''Compile the pattern, identical patterns share the same object.'''
+        return GlobPattern(pattern)
+
+    def __repr__(self):
+        return f'GlobPattern({self.pattern!r})'
+
+
+class FileSnapshot:
+    '''
+    A lazily built, cached view of the directory tree of an instance.
+
+    Every directory is listed at most once, no matter how many glob patterns are matched against it.
+    Writing a file through a patch must be followed by `invalidate`, so the snapshot sees the new file.
+    '''
+
+    def __init__(self, root: str):
+        self.root = root
+        # relative directory path ('/'-separated, normcased) -> {normcased name: is directory}
+        self._listings: dict[str, dict[str, bool]] = {}
+        # condition results and other data computed from the snapshot, dropped whenever it changes
+        self.results: dict[object, typing.Any] = {}
+
+    def listdir(self, path: str = '') -> dict[str, bool]:
+        '''
+        List a directory relative to the root.
+
+        :return: A dict of the entry names and whether they are directories, empty if the directory doesn't exist.
+        '''
+        listing = self._listings.get(path)
+        if listing is None:
+            listing = {}
+            try:
+                with os.scandir(os.path.join(self.root, *path.split('/')) if path else self.root) as it:
+                    for entry in it:
+                        listing[os.path.normcase(entry.name)] = entry.is_dir()
+            except OSError:
+                pass
+            self._listings[path] = listing
+        return listing
+
+    def exists(self, pattern: GlobPattern | str) -> bool:
+        '''Check if any file matches the glob pattern.'''
+        if isinstance(pattern, str):
+            pattern = GlobPattern.compile(pattern)
+        if pattern.fallback:
+            return glob.glob(pattern.pattern, root_dir=self.root) != []
+        return self._exists(pattern, '', 0)
+
+    def _exists(self, pattern: GlobPattern, path: str, i: int) -> bool:
+        listing = self.listdir(path)
+        last = i == len(pattern.segments) - 1
+        for name in pattern.segments[i].filter(listing):
+            is_dir = listing[name]
+            if last:
+                if is_dir or not pattern.dir_only:
+                    return True
+            elif is_dir and self._exists(pattern, f'{path}/{name}' if path else name, i + 1):
+                return True
+        return False
+
+    def clear(self):
+        '''Forget all listings, they are listed again when needed.'''
+        self._listings.clear()
+        self.results.clear()
+
+    def invalidate(self, path: str):
+        '''
+        Update the snapshot after a file or directory was written.
+
+        :param path: The written path, relative to the root.
+        '''
+        self.results.clear()
+        parts = [os.path.normcase(part) for part in _split(path) if part]
+        if not parts:
+            self.clear()
+            return
+
+        # listings inside the written path are stale, e.g. a directory symlink was replaced
+        written = '/'.join(parts)
+        for key in [key for key in self._listings if key == written or key.startswith(f'{written}/')]:
+            del self._listings[key]
+
+        # the written path and all its parents exist now
+        for i, part in enumerate(parts):
+            listing = self._listings.get('/'.join(parts[:i]))
+            if listing is None:
+                continue
+            if i == len(parts) - 1:
+                listing[part] = os.path.isdir(os.path.join(self.root, path))
+            else:
+                listing[part] = True
@@ -2,8 +2,14 @@ import unittest
 import unittest.util
 
 from tests.test_options import TestOptions
+from tests.test_keys import TestKeys
 from tests.test_instance import TestInstance
+from tests.test_snapshot import TestSnapshot
+from tests.test_manifest import TestManifest
+from tests.test_mods import TestMods
+from tests.test_main import TestMain
 from tests.patcher import *
+from tests.discovery import *
 
 unittest.util._MAX_LENGTH = 2000
 
@@ -0,0 +1,3 @@
+from tests.discovery.test_scan import TestScan, TestPrismInstance
+from tests.discovery.test_index import TestIndex
+from tests.discovery.test_prism import TestPrism
@@ -0,0 +1,72 @@
+import os
+from unittest import mock
+
+from src.discovery.index import InstanceIndex
+
+from tests.utils import TempDirTestCase
+
+
+def make_dirs(root: str, *paths: str):
+    for path in paths:
+        os.makedirs(os.path.join(root, path))
+
+
+class TestIndex(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.index_path = os.path.join(self.root, 'cache', 'index.json')
+        make_dirs(self.root, 'instances/a/mods', 'instances/b/saves', 'instances/group/c/mods', 'instances/empty')
+        self.instances = os.path.join(self.root, 'instances')
+
+    def discover(self, rescan: bool = False) -> tuple[InstanceIndex, list[str]]:
+        index = InstanceIndex(self.index_path, rescan=rescan)
+        found = index.discover(self.instances)
+        index.save()
+        return index, sorted(os.path.relpath(path, self.instances) for path in found)
+
+    def test_cold_and_warm(self):
+        index, found = self.discover()
+        self.assertEqual(found, ['a', 'b', os.path.join('group', 'c')])
+        self.assertEqual(index.hits, 0)
+
+        # nothing changed, so nothing is listed
+        with mock.patch('src.discovery.index.list_dirs') as list_dirs:
+            index, warm = self.discover()
+        list_dirs.assert_not_called()
+        self.assertEqual(warm, found)
+        self.assertEqual(index.misses, 0)
+
+    def test_classification(self):
+        index, _ = self.discover()
+        kinds = {os.path.relpath(path, self.instances): entry['kind'] for path, entry in index.scanned.items()}
+        self.assertEqual(kinds['a'], 'instance')
+        self.assertEqual(kinds['group'], 'container')
+        self.assertEqual(kinds['empty'], 'container')
+        self.assertEqual(kinds[os.path.join('group', 'c')], 'instance')
+
+    def test_changed_dir_is_rescanned(self):
+        self.discover()
+        make_dirs(self.instances, 'group/d/saves')
+        os.rmdir(os.path.join(self.instances, 'b', 'saves'))
+        os.rmdir(os.path.join(self.instances, 'b'))
+
+        index, found = self.discover()
+        self.assertEqual(found, ['a', os.path.join('group', 'c'), os.path.join('group', 'd')])
+        self.assertGreater(index.hits, 0)
+
+        # the removed folder is dropped from the index
+        index = InstanceIndex(self.index_path)
+        self.assertNotIn(os.path.join(self.instances, 'b'), index.entries)
+
+    def test_rescan(self):
+        self.discover()
+        index, _ = self.discover(rescan=True)
+        self.assertEqual(index.hits, 0)
+
+    def test_broken_index(self):
+        os.makedirs(os.path.dirname(self.index_path))
+        with open(self.index_path, 'w') as f:
+            f.write('not json')
+        index, found = self.discover()
+        self.assertEqual(len(found), 3)
+        self.assertEqual(index.hits, 0)
@@ -0,0 +1,69 @@
+import json
+import os
+
+from src.discovery.prism import is_registry, iter_registry
+from src.instance import GameInstance
+from src.patcher.conditions import BaseConditionObject
+
+from tests.utils import TempDirTestCase
+
+
+class TestPrism(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write('instgroups.json', '{"formatVersion": "1", "groups": {}}')
+
+        # a new fabric instance, without saves and mods
+        self.write('fabric/instance.cfg', 'InstanceType=OneSix\nname=Fabric\n')
+        self.write('fabric/mmc-pack.json', json.dumps({'components': [
+            {'uid': 'net.minecraft', 'version': '1.20.1'},
+            {'uid': 'net.fabricmc.fabric-loader', 'version': '0.15.0'},
+        ], 'formatVersion': 1}))
+        os.makedirs(os.path.join(self.root, 'fabric', '.minecraft'))
+
+        # an old MultiMC instance without a mmc-pack.json
+        self.write('old/instance.cfg', 'IntendedVersion=1.8.9\n')
+        os.makedirs(os.path.join(self.root, 'old', 'minecraft', 'saves'))
+
+        # not instances
+        os.makedirs(os.path.join(self.root, '_LAUNCHER_TEMP', 'mods'))
+        os.makedirs(os.path.join(self.root, 'never-launched'))
+        self.write('never-launched/instance.cfg', '')
+
+    def test_registry(self):
+        self.assertTrue(is_registry(self.root))
+        self.assertFalse(is_registry(os.path.join(self.root, 'fabric')))
+        self.assertEqual(sorted(iter_registry(self.root)),
+                         [os.path.join(self.root, 'fabric', '.minecraft'), os.path.join(self.root, 'old', 'minecraft')])
+        self.assertEqual(list(iter_registry(self.root, ignore=['fabric', 'old'])), [])
+
+    def test_from_path(self):
+        instances = GameInstance.from_path(self.root)
+        self.assertEqual(sorted(instance.path for instance in instances),
+                         [os.path.join(self.root, 'fabric', '.minecraft'), os.path.join(self.root, 'old', 'minecraft')])
+        self.assertEqual([instance.path for instance in GameInstance.iter_path(self.root, max_recursion=0)],
+                         [instance.path for instance in instances])
+
+        # a scan only finds the instance with saves, and the launcher temp folder
+        scanned = GameInstance.from_path(self.root, registry=False)
+        self.assertEqual(sorted(instance.path for instance in scanned),
+                         [os.path.join(self.root, '_LAUNCHER_TEMP'), os.path.join(self.root, 'old', 'minecraft')])
+
+    def test_metadata(self):
+        fabric = GameInstance(os.path.join(self.root, 'fabric', '.minecraft'))
+        old = GameInstance(os.path.join(self.root, 'old', 'minecraft'))
+        other = GameInstance(os.path.join(self.root, '_LAUNCHER_TEMP'))
+
+        self.assertEqual((fabric.minecraft_version, fabric.loader), ('1.20.1', 'fabric'))
+        self.assertEqual((old.minecraft_version, old.loader), ('1.8.9', None))
+        self.assertEqual((other.minecraft_version, other.loader), (None, None))
+
+        cases = [
+            ({'minecraft_version': '1.20.x'}, [True, False, False]),
+            ({'minecraft_version': '<1.12'}, [False, True, False]),
+            ({'loader': ['forge', 'fabric']}, [True, False, False]),
+            ({'loader': 'vanilla'}, [False, False, False]),
+        ]
+        for data, expected in cases:
+            condition = BaseConditionObject.create_condition(data)
+            self.assertEqual([condition.check(instance) for instance in (fabric, old, other)], expected, data)
@@ -0,0 +1,138 @@
+import unittest
+from unittest import mock
+
+from tests.utils import mock_dir
+
+import main
+from src.instance import GameInstance
+from src.patcher.plan import Plan
+
+from src.discovery.scan import discover, iter_discover, list_dirs, prism_game_dir
+
+
+mocks = mock_dir({
+    'root': {
+        'b': {
+            'mods': {},
+            'options.txt': '',
+        },
+        'a': {
+            'saves': {},
+        },
+        'group': {
+            'nested2': {'saves': {}},
+            'file': '',
+            'nested1': {'mods': {}},
+        },
+        'not-a-dir': '',
+        'deep': {
+            'deeper': {
+                'instance': {'mods': {}},
+            },
+        },
+    }
+})
+
+
+class TestScan(unittest.TestCase):
+    @mocks
+    def test_list_dirs(self, *mocks):
+        self.assertEqual(list_dirs('root/b'), ['mods'])
+        self.assertEqual(list_dirs('root/group'), ['nested2', 'nested1'])
+
+    @mocks
+    def test_discover_order(self, *mocks):
+        # the order of a serial depth-first walk is kept regardless of the number of workers
+        expected = ['root/b', 'root/a', 'root/group/nested2', 'root/group/nested1']
+        for jobs in (1, 2, 8):
+            self.assertEqual(discover('root', jobs=jobs), expected)
+
+    @mocks
+    def test_iter_discover(self, *mocks):
+        for jobs in (1, 2, 8):
+            for max_recursion in (0, 1, 2, 3):
+                self.assertEqual(list(iter_discover('root', max_recursion=max_recursion, jobs=jobs)),
+                                 discover('root', max_recursion=max_recursion, jobs=jobs))
+
+    @mocks
+    def test_iter_discover_lazy(self, *mocks):
+        _, scandir, *_ = mocks
+        instances = iter_discover('root', jobs=1, ignore=['group'])
+        self.assertEqual(next(instances), 'root/b')
+        # the first instance is yielded before its siblings are scanned
+        self.assertNotIn('root/a', [call.args[0] for call in scandir.call_args_list])
+        self.assertEqual(list(instances), ['root/a'])
+
+    @mocks
+    def test_discover_recursion(self, *mocks):
+        self.assertEqual(discover('root', max_recursion=0), [])
+        self.assertEqual(discover('root', max_recursion=1), ['root/b', 'root/a'])
+        self.assertEqual(discover('root', max_recursion=3)[-1], 'root/deep/deeper/instance')
+
+    @mocks
+    def test_discover_lists_once(self, *mocks):
+        _, scandir, *_ = mocks  # mocks are passed in the order they were created
+        discover('root', max_recursion=2)
+        paths = [call.args[0] for call in scandir.call_args_list]
+        self.assertEqual(len(paths), 8)
+        self.assertEqual(len(paths), len(set(paths)))
+
+
+prism_mocks = mock_dir({
+    'prism': {
+        'instance.cfg': '',
+        'mmc-pack.json': '',
+        '.minecraft': {
+            'mods': {},
+        },
+        'patches': {
+            'saves': {},
+        },
+    },
+    'multimc': {
+        'instance.cfg': '',
+        'minecraft': {},
+    },
+})
+
+
+class TestPrismInstance(unittest.TestCase):
+    @prism_mocks
+    def test_prism_game_dir(self, *mocks):
+        self.assertEqual(prism_game_dir('prism'), 'prism/.minecraft')
+        self.assertEqual(prism_game_dir('multimc'), 'multimc/minecraft')
+        self.assertIsNone(prism_game_dir('prism/.minecraft'))
+
+    @prism_mocks
+    def test_discover_skips_scan(self, *mocks):
+        _, scandir, *_ = mocks
+        self.assertEqual(discover('prism'), ['prism/.minecraft'])
+        # even an instance without saves and mods yet is found
+        self.assertEqual(discover('multimc'), ['multimc/minecraft'])
+        self.assertEqual(list(iter_discover('prism')), ['prism/.minecraft'])
+        scandir.assert_not_called()
+
+    @prism_mocks
+    def test_from_instance_dir(self, *mocks):
+        _, scandir, *_ = mocks
+        self.assertEqual(GameInstance.from_instance_dir('prism').path, 'prism/.minecraft')
+        self.assertEqual(GameInstance.from_instance_dir('multimc').path, 'multimc/minecraft')
+        # a folder without an instance.cfg is the game folder itself
+        self.assertEqual(GameInstance.from_instance_dir('prism/patches').path, 'prism/patches')
+        scandir.assert_not_called()
+
+    @prism_mocks
+    def test_main_instance(self, *mocks):
+        _, scandir, *_ = mocks
+        argv = ['main.py', '--instance', 'prism', '--config', 'config.jsonc']
+        with mock.patch('sys.argv', argv), mock.patch('main.Config') as config, \
+                mock.patch('main.InstanceIndex') as index, mock.patch('builtins.print'):
+            config.return_value.preview.return_value = Plan()
+            config.return_value.apply.return_value = []
+            main.main()
+
+        # the instance is patched without an index and without searching
+        instances = config.return_value.preview.call_args.args[0]
+        self.assertEqual([instance.path for instance in instances], ['prism/.minecraft'])
+        index.assert_not_called()
+        scandir.assert_not_called()
@@ -1,2 +1,8 @@
-from tests.patcher.test_conditions import TestConditions
+from tests.patcher.test_conditions import TestConditions, TestContentCondition
 from tests.patcher.test_merge import TestMerge
+from tests.patcher.test_plan import TestPlan
+from tests.patcher.test_patch import TestPatch
+from tests.patcher.test_sync import TestSync
+from tests.patcher.test_config import TestConfig
+from tests.patcher.test_deep_merge import TestDeepMerge
+from tests.patcher.test_transaction import TestTransaction
@@ -1,7 +1,15 @@
+import json
+import os
 import unittest
+from unittest import mock
+
+import json5
+
 from src.patcher.conditions import *
+from src.patcher.merge import SOURCE_CACHE, merge
+from src.patcher.patch import PatchHandler
 
-from tests.utils import mock_dir
+from tests.utils import TempDirTestCase, mock_dir
 
 mocks = mock_dir({
     'root': {
@@ -130,3 +138,155 @@ class TestConditions(unittest.TestCase):
         ]
         for condition in path_conditions:
             self.assertIsInstance(BaseConditionObject.create_condition(condition), InstanceConditionObject)
+
+    @mocks
+    def test_planner(self, *mocks):
+        planner = ConditionPlanner()
+        first = planner.plan([
+            FileConditionObject(file='*/mod*'),
+            FileConditionObject(file='mods/mod1'),
+            InstanceConditionObject(instance_pattern='root/.+'),
+        ])
+        second = planner.plan([
+            FileConditionObject(file='mods/mod1'),
+            FileConditionObject(file='mods/mod1'),
+            FileConditionObject(file='mods/mod1', exists=False),
+        ])
+
+        # cheapest first, identical conditions are shared
+        self.assertEqual([c.cost for c in first], [COST_PATH, COST_LISTING, COST_TREE])
+        self.assertEqual(len(second), 2)
+        self.assertIs(second[0], first[1])
+
+        # a shared condition is evaluated once per instance, until the files change
+        i1, *_ = GameInstance.from_path('root')
+        with mock.patch.object(FileConditionObject, '_check', return_value=True) as check:
+            for conditions in (first, second):
+                for condition in conditions:
+                    condition.check(i1)
+            self.assertEqual(check.call_count, 3)
+            i1.files.invalidate('mods/mod6')
+            second[0].check(i1)
+            self.assertEqual(check.call_count, 4)
+
+    @mocks
+    def test_condition_group(self, *mocks):
+        i1, i2, i3, i4 = GameInstance.from_path('root')
+        condition = BaseConditionObject.create_condition({
+            'or': [
+                {'file': 'mods/mod1'},
+                {'and': [
+                    {'file': 'mods/mod3'},
+                    {'not': {'instance_pattern': 'root/_.*'}},
+                ]},
+            ]
+        })
+        self.assertIsInstance(condition, ConditionGroup)
+        self.assertEqual([condition.check(i) for i in (i1, i2, i3, i4)], [True, True, False, False])
+
+        # nested groups are compiled into a single program of leaves
+        self.assertEqual(len(condition.program), 3)
+        self.assertTrue(all(not isinstance(leaf, ConditionGroup) for leaf, _, _ in condition.program))
+
+        self.assertTrue(ConditionGroup('and', []).check(i1))
+        self.assertFalse(ConditionGroup('or', []).check(i1))
+        with self.assertRaises(ValueError):
+            BaseConditionObject.create_condition({'not': [{'file': 'a'}, {'file': 'b'}]})
+
+    @mocks
+    def test_condition_group_short_circuit(self, *mocks):
+        i1, *_ = GameInstance.from_path('root')
+        planner = ConditionPlanner()
+        first, = planner.plan([BaseConditionObject.create_condition({'or': [
+            {'file': 'mods/mod1'},
+            {'file': 'mods/mod9'},
+        ]})])
+        second, = planner.plan([BaseConditionObject.create_condition({'and': [
+            {'file': 'mods/mod9'},
+            {'file': 'mods/mod1'},
+        ]})])
+
+        with mock.patch.object(FileConditionObject, '_check', autospec=True,
+                               side_effect=lambda c, _: c.file == ['mods/mod1']) as check:
+            self.assertTrue(first.check(i1))
+            self.assertFalse(second.check(i1))
+        # "or" stops at mod1, "and" stops at mod9
+        self.assertEqual([call.args[0].file for call in check.call_args_list], [['mods/mod1'], ['mods/mod9']])
+
+    @mocks
+    def test_instance_router(self, *mocks):
+        instances = GameInstance.from_path('root')
+        patterns = ['root/instance1', 'root/instance[0-9]', 'root/.+', 'root/_?instance3', 'root/folder|root/_',
+                    r'root/folder/instance\d', 'other/instance1', '(?i)ROOT/INSTANCE2', '.*4$']
+        conditions = [InstanceConditionObject(instance_pattern=p) for p in patterns]
+        expected = [[c.check(instance) for c in conditions] for instance in instances]
+
+        router = InstanceRouter(conditions)
+        self.assertEqual(router._literal_prefix('root/_?instance3'), 'root/')
+        self.assertEqual(router._literal_prefix('root/folder|root/_'), '')
+        self.assertEqual([[c.check(instance) for c in conditions] for instance in instances], expected)
+
+        # the regexes of patterns with another prefix are not run for the instance
+        i1, *_ = instances
+        candidates = list(router._candidates(i1.normpath))
+        self.assertNotIn(conditions[6], candidates)
+        self.assertEqual(router.matches(i1), frozenset(c for c, e in zip(conditions, expected[0]) if e))
+
+    @mocks
+    def test_router_select(self, *mocks):
+        i1, i2, *_ = GameInstance.from_path('root')
+        planner = ConditionPlanner()
+        handlers = [PatchHandler([], planner.plan([BaseConditionObject.create_condition(c) for c in conditions]))
+                    for conditions in (
+                        [{'instance_pattern': 'root/instance1'}, {'file': 'mods/mod1'}],
+                        [{'file': 'mods/mod1'}],
+                        [{'instance_pattern': 'root/instance.'}, {'instance_pattern': '.*2$'}],
+                        [{'or': [{'instance_pattern': 'root/instance1'}]}],
+                    )]
+        router = planner.route()
+        router.add_handlers(handlers)
+        self.assertEqual(router.select(i1), [handlers[0], handlers[1], handlers[3]])
+        self.assertEqual(router.select(i2), [handlers[1], handlers[2], handlers[3]])
+
+
+class TestContentCondition(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.instance = GameInstance(self.root)
+        self.data = os.path.join(self.root, 'data')
+        self.write('config/sodium.json', '{"quality": {"weather": "FAST", "levels": [1, 2]}, "enabled": null}')
+        self.write('config/mod.toml', '[general]\nenabled = true\n')
+        self.write('options.txt', 'version:3465\nlang:en_us\nkey_key.attack:key.mouse.left\n')
+        self.write('logs.txt', 'Loading Minecraft 1.20.1 with Fabric Loader 0.15.0\n')
+        self.write('config/broken.json', '{"quality": ')
+        SOURCE_CACHE.clear()
+
+    def check(self, **data) -> bool:
+        return BaseConditionObject.create_condition(data).check(self.instance)
+
+    def test_content(self):
+        self.assertTrue(self.check(content='config/sodium.json', key='quality.weather', value='FAST'))
+        self.assertFalse(self.check(content='config/sodium.json', key='quality.weather', value='FANCY'))
+        self.assertTrue(self.check(content='config/sodium.json', key='quality.levels.1', value=2))
+        self.assertTrue(self.check(content='config/sodium.json', key='enabled', value=None))
+        self.assertTrue(self.check(content='config/sodium.json', key='quality.missing', exists=False))
+        self.assertTrue(self.check(content='config/mod.toml', key='general.enabled', value=True))
+        self.assertTrue(self.check(content='options.txt', key=['key_key.attack'], value='key.mouse.left'))
+        self.assertTrue(self.check(content='logs.txt', regex=r'^Loading Minecraft 1\.20'))
+        self.assertFalse(self.check(content='missing.json', key='a'))
+        self.assertFalse(self.check(content='config/broken.json', key='quality'))
+        with self.assertRaises(ValueError):
+            self.check(content='options.txt')
+
+    def test_shared_with_merge(self):
+        self.write(os.path.join(self.data, 'sodium.json'), '{"enabled": true}')
+        conditions = [
+            BaseConditionObject.create_condition({'content': 'config/sodium.json', 'key': 'quality.weather'}),
+            BaseConditionObject.create_condition({'content': 'config/sodium.json', 'key': 'enabled', 'value': None}),
+        ]
+        with mock.patch('json.loads', side_effect=json.loads) as load:
+            self.assertTrue(all(condition.check(self.instance) for condition in conditions))
+            merge(os.path.join(self.data, 'sodium.json'), os.path.join(self.root, 'config', 'sodium.json'))
+        # the instance file is parsed once for both conditions and the merge, and the source once
+        self.assertEqual(load.call_count, 2)
+        self.assertEqual(json5.loads(self.read('config/sodium.json'))['enabled'], True)
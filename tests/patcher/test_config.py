@@ -0,0 +1,70 @@
+import os
+from unittest import mock
+
+import json5
+
+from src.patcher.conditions import FileConditionObject
+from src.patcher.config import Config, load_jsonc
+
+from tests.utils import TempDirTestCase
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+jsonc_documents = [
+    '{"a": 1}',
+    '{"a": "// not a comment", "b": "/* not a comment */"}',
+    '{\n    // comment\n    "a": 1, /* block\n comment */ "b": [1, 2,],\n}',
+    '{"a": 1, // comment after a trailing comma\n}',
+    '{"a": "escaped \\" // quote"}',
+]
+
+
+class TestConfig(TempDirTestCase):
+    def test_load_jsonc(self):
+        with open(os.path.join(ROOT, 'configs', 'config.example.jsonc'), 'r') as f:
+            documents = [*jsonc_documents, f.read()]
+
+        # all of them are parsed without json5
+        with mock.patch('json5.loads', side_effect=AssertionError):
+            parsed = [load_jsonc(document) for document in documents]
+        for document, data in zip(documents, parsed):
+            self.assertEqual(data, json5.loads(document))
+
+    def test_load_json5(self):
+        self.assertEqual(load_jsonc("{a: 'b', c: 0x10}"), {'a': 'b', 'c': 16})
+
+    def test_cache(self):
+        path = os.path.join(self.root, 'config.jsonc')
+        self.write(path, self.read(os.path.join(ROOT, 'configs', 'config.example.jsonc')))
+
+        config = Config(path, self.root)
+        self.assertTrue(os.path.isfile(f'{path}.cache'))
+
+        # loaded from the cache without parsing
+        with mock.patch('src.patcher.config.load_jsonc') as load:
+            cached = Config(path, self.root)
+        load.assert_not_called()
+        self.assertEqual(len(cached.patches), len(config.patches))
+        self.assertEqual(
+            [patch.with_file for handler in cached.patches for patch in handler.patches],
+            ['data/options.txt', 'data/ias.json']
+        )
+        self.assertIsInstance(cached.patches[1].conditions[1], FileConditionObject)
+
+        # so is the same config after the code was updated
+        with mock.patch('src.patcher.config.code_signature', return_value='updated'), \
+                mock.patch('src.patcher.config.load_jsonc', side_effect=load_jsonc) as load:
+            Config(path, self.root)
+        load.assert_called_once()
+
+        # a changed config is parsed again
+        with open(path, 'w') as f:
+            f.write('{"patches": []}')
+        self.assertEqual(Config(path, self.root).patches, [])
+
+        # so is a broken cache
+        with open(f'{path}.cache', 'wb') as f:
+            f.write(b'broken')
+        with mock.patch('src.patcher.config.load_jsonc', side_effect=load_jsonc) as load:
+            self.assertEqual(Config(path, self.root).patches, [])
+        load.assert_called_once()
@@ -0,0 +1,80 @@
+import copy
+import unittest
+
+from src.patcher.deep_merge import MERGE, Change, MergePolicies, deep_merge
+
+
+target = {
+    'version': 3,
+    'quality': {'weather': 'FANCY', 'clouds': {'enabled': True, 'height': 192}},
+    'tags': ['a', 'b'],
+    'old': {'removed': True},
+    'untouched': {'big': list(range(100))},
+}
+DEEP = MergePolicies(default=MERGE)
+
+
+class TestDeepMerge(unittest.TestCase):
+    def test_merge(self):
+        original = copy.deepcopy(target)
+        merged, changes = deep_merge(target, {'quality': {'clouds': {'height': 256}}, 'new': 1}, DEEP)
+        self.assertEqual(merged['quality'], {'weather': 'FANCY', 'clouds': {'enabled': True, 'height': 256}})
+        self.assertEqual(merged['new'], 1)
+        self.assertEqual(changes, [Change('set', ('quality', 'clouds', 'height'), 256), Change('set', ('new',), 1)])
+
+        # the target isn't modified, and the unchanged subtrees are shared
+        self.assertEqual(target, original)
+        self.assertIs(merged['untouched'], target['untouched'])
+        self.assertIsNot(merged['quality'], target['quality'])
+
+    def test_no_changes(self):
+        merged, changes = deep_merge(target, {'quality': {'weather': 'FANCY'}, 'version': 3, 'tags': ['a', 'b']}, DEEP)
+        self.assertIs(merged, target)
+        self.assertEqual(changes, [])
+
+        # a value of another type is a change, even if it's equal
+        _, changes = deep_merge({'a': 1}, {'a': True})
+        self.assertEqual(changes, [Change('set', ('a',), True)])
+
+    def test_shallow_by_default(self):
+        # a source object replaces the whole object, without keeping its old keys
+        merged, changes = deep_merge(target, {'quality': {'weather': 'FAST'}})
+        self.assertEqual(merged['quality'], {'weather': 'FAST'})
+        self.assertEqual(changes, [Change('set', ('quality',), {'weather': 'FAST'})])
+        self.assertEqual(MergePolicies({'quality': 'merge'}).get(('quality', 'clouds')), 'replace')
+
+    def test_policies(self):
+        policies = MergePolicies({
+            'quality': 'replace',
+            'tags': 'append-unique',
+            'old': 'delete',
+            'missing': 'delete',
+        })
+        merged, changes = deep_merge(target, {
+            'quality': {'weather': 'FAST'},
+            'tags': ['b', 'c', 'c'],
+            'old': None,
+            'missing': None,
+        }, policies)
+        self.assertEqual(merged['quality'], {'weather': 'FAST'})
+        self.assertEqual(merged['tags'], ['a', 'b', 'c'])
+        self.assertNotIn('old', merged)
+        self.assertEqual([change.op for change in changes], ['set', 'append', 'delete'])
+
+        # applying the same merge again changes nothing
+        _, changes = deep_merge(merged, {'tags': ['c'], 'old': None}, policies)
+        self.assertEqual(changes, [])
+
+    def test_policy_patterns(self):
+        policies = MergePolicies({'*': 'replace', 'quality.*': 'merge', 'quality.clouds': 'replace'}, default=MERGE)
+        self.assertEqual(policies.get(('tags',)), 'replace')
+        self.assertEqual(policies.get(('quality', 'weather')), 'merge')
+        self.assertEqual(policies.get(('quality', 'clouds')), 'replace')
+        self.assertEqual(policies.get(('quality', 'clouds', 'height')), 'merge')
+
+        # "*" replaces the top-level keys, like a shallow update
+        merged, _ = deep_merge(target, {'quality': {'weather': 'FAST'}}, MergePolicies({'*': 'replace'}, default=MERGE))
+        self.assertEqual(merged['quality'], {'weather': 'FAST'})
+
+        with self.assertRaises(ValueError):
+            MergePolicies({'a': 'overwrite'})
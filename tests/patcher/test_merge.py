@@ -1,7 +1,17 @@
-import unittest
+import io
+import json as std_json
+import os
+from unittest import mock
+
+import json5 as json
+import toml
+import yaml
+
+from src import options
+from src.patcher.deep_merge import MERGE, MergePolicies
 from src.patcher.merge import *
 
-from tests.utils import mock_dir
+from tests.utils import TempDirTestCase, mock_dir
 
 data1 = {'a': 1, 'b': 2}
 data2 = {'b': 3, 'c': 4}
@@ -13,6 +23,8 @@ mocks = mock_dir({
         'json': {
             'data1.json': json.dumps(data1),
             'data2.json': json.dumps(data2),
+            'deep1.json': '',
+            'deep2.json': '',
         },
         'yaml': {
             'data1.yaml': yaml.dump(data1),
@@ -49,7 +61,7 @@ def test_merge(path1: str, path2: str, merger, loader):
     return data
 
 
-class TestMerge(unittest.TestCase):
+class TestMerge(TempDirTestCase):
     @mocks
     def test_loaders(self, *mocks):
         for path1, path2, merger, loader in tests:
@@ -61,3 +73,85 @@ class TestMerge(unittest.TestCase):
         for path1, path2, merger, loader in tests:
             data = test_merge(path1, path2, merge, loader)
             self.assertEqual(data, data_merged)
+
+    @mocks
+    def test_source_cache(self, *mocks):
+        SOURCE_CACHE.clear()
+        with open('root/json/data1.json', 'w') as f:
+            json.dump(data1, f)
+        # plain JSON is parsed by the stdlib json
+        with mock.patch('json.loads', side_effect=std_json.loads) as load:
+            for _ in range(3):
+                merge_json('root/json/data2.json', 'root/json/data1.json')
+            # the source is loaded once, the target again only after the first merge changed it
+            self.assertEqual(load.call_count, 3)
+
+            # changing the source reloads it
+            with open('root/json/data2.json', 'w') as f:
+                json.dump({'d': 5}, f)
+            merge_json('root/json/data2.json', 'root/json/data1.json')
+            self.assertEqual(load.call_count, 4)
+
+        with open('root/json/data1.json', 'r') as f:
+            self.assertEqual(json.load(f), {**data_merged, 'd': 5})
+
+    def test_backends(self):
+        # strict JSON is parsed by the stdlib, JSON5 syntax falls back to json5
+        with mock.patch('json5.loads', side_effect=AssertionError):
+            self.assertEqual(json_backend().load(io.StringIO('{"a": [1, 2]}')), {'a': [1, 2]})
+        self.assertEqual(json_backend().load(io.StringIO('{a: 1, // comment\n}')), {'a': 1})
+
+        # the backends are selected once, so the parsed documents are cached by the same loaders
+        self.assertIs(yaml_backend(), yaml_backend())
+        self.assertEqual(yaml_backend().load(io.StringIO(yaml.dump(data1))), data1)
+        self.assertEqual(toml_backend().load(io.StringIO(toml.dumps(data1))), data1)
+        for backend in (json_backend(), json5_backend(), yaml_backend(), toml_backend()):
+            out = io.StringIO()
+            backend.dump(data_merged, out)
+            self.assertEqual(backend.load(io.StringIO(out.getvalue())), data_merged)
+
+    @mocks
+    def test_deep_merge(self, *mocks):
+        with open('root/json/deep1.json', 'w') as f:
+            json.dump({'a': {'b': 1, 'c': [1]}, 'd': 1}, f)
+        with open('root/json/deep2.json', 'w') as f:
+            json.dump({'a': {'c': [1, 2]}, 'd': None}, f)
+
+        policies = MergePolicies({'a.c': 'append-unique', 'd': 'delete'}, default=MERGE)
+        self.assertTrue(merge('root/json/deep2.json', 'root/json/deep1.json', policies=policies))
+        with open('root/json/deep1.json', 'r') as f:
+            self.assertEqual(json.load(f), {'a': {'b': 1, 'c': [1, 2]}})
+
+        # nothing left to change, so the target isn't written again
+        with mock.patch('json.dump', side_effect=AssertionError):
+            self.assertFalse(merge('root/json/deep2.json', 'root/json/deep1.json', policies=policies))
+
+    def test_coarse_mtime(self):
+        target, first, second = (os.path.join(self.root, name) for name in ('target.json', 'first.json', 'second.json'))
+        for path, data in ((target, {'a': 1}), (first, {'a': 2}), (second, {'b': 2})):
+            with open(path, 'w') as f:
+                std_json.dump(data, f, indent=4)
+
+        st = os.stat(target)
+        self.assertTrue(merge(first, target))
+        # the filesystem kept the mtime, and the size didn't change either
+        os.utime(target, ns=(st.st_atime_ns, st.st_mtime_ns))
+        self.assertEqual(os.stat(target).st_size, st.st_size)
+
+        self.assertTrue(merge(second, target))
+        with open(target) as f:
+            self.assertEqual(std_json.load(f), {'a': 2, 'b': 2})
+
+    def test_discard_tree(self):
+        path = os.path.join(self.root, 'instance', 'a.json')
+        self.write(path, '{}')
+
+        load_document(path)
+        misses = SOURCE_CACHE.misses
+        SOURCE_CACHE.discard_tree(os.path.join(self.root, 'inst'))
+        load_document(path)
+        self.assertEqual(SOURCE_CACHE.misses, misses)
+
+        SOURCE_CACHE.discard_tree(os.path.join(self.root, 'instance'))
+        load_document(path)
+        self.assertEqual(SOURCE_CACHE.misses, misses + 1)
@@ -0,0 +1,133 @@
+import errno
+import json
+import os
+from unittest import mock
+
+from src.instance import GameInstance
+from src.patcher.files import can_hardlink, reflink_file
+from src.patcher.patch import Method, PatchObject
+
+from tests.utils import TempDirTestCase
+
+
+class TestPatch(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        root = self.root
+        self.data = os.path.join(root, 'data')
+        os.makedirs(self.data)
+        self.write(os.path.join(self.data, 'file.txt'), 'content')
+        self.write(os.path.join(self.data, 'config.json'), '{"a": 1}')
+
+        os.makedirs(os.path.join(root, 'instance', 'mods'))
+        self.instance = GameInstance(os.path.join(root, 'instance'))
+        PatchObject.CONFIG_FILES_DIR = self.data
+
+    def target(self, file: str) -> str:
+        return os.path.join(self.instance.path, file)
+
+    def assert_applied_once(self, patch: PatchObject):
+        '''Check that the patch changes the files only the first time it's applied.'''
+        self.assertTrue(patch.has_changes(self.instance))
+        self.assertTrue(patch.apply(self.instance))
+
+        st = os.lstat(self.target(patch.file))
+        self.assertFalse(patch.has_changes(self.instance))
+        self.assertFalse(patch.apply(self.instance))
+        self.assertEqual(os.lstat(self.target(patch.file)).st_mtime_ns, st.st_mtime_ns)
+
+    def test_overwrite(self):
+        patch = PatchObject('config/file.txt', 'file.txt', Method.OVERWRITE)
+        self.assert_applied_once(patch)
+
+        # same size, different content
+        self.write(self.target('config/file.txt'), 'CONTENT')
+        self.assertTrue(patch.has_changes(self.instance))
+        self.assertTrue(patch.apply(self.instance))
+        with open(self.target('config/file.txt')) as f:
+            self.assertEqual(f.read(), 'content')
+
+    def test_overwrite_same_content(self):
+        # an equal file written by someone else is kept as is
+        os.makedirs(self.target('config'))
+        self.write(self.target('config/file.txt'), 'content')
+        patch = PatchObject('config/file.txt', 'file.txt', Method.OVERWRITE)
+        self.assertFalse(patch.has_changes(self.instance))
+        self.assertFalse(patch.apply(self.instance))
+
+    def test_insert(self):
+        self.assert_applied_once(PatchObject('file.txt', 'file.txt', Method.INSERT))
+
+    def test_symlink(self):
+        self.assert_applied_once(PatchObject('file.txt', 'file.txt', Method.SYMLINK))
+
+    def test_hardlink(self):
+        patch = PatchObject('resourcepacks/pack.zip', 'file.txt', Method.HARDLINK)
+        self.assert_applied_once(patch)
+        self.assertTrue(os.path.samefile(self.target(patch.file), os.path.join(self.data, 'file.txt')))
+
+        # an existing copy is replaced with a link
+        os.remove(self.target(patch.file))
+        self.write(self.target(patch.file), 'content')
+        self.assertTrue(patch.apply(self.instance))
+        self.assertTrue(os.path.samefile(self.target(patch.file), os.path.join(self.data, 'file.txt')))
+
+    def test_hardlink_fallback(self):
+        patch = PatchObject('resourcepacks/pack.zip', 'file.txt', Method.HARDLINK)
+        with mock.patch('os.link', side_effect=OSError(errno.EXDEV, 'Invalid cross-device link')):
+            self.assertTrue(patch.apply(self.instance))
+            self.assertFalse(patch.apply(self.instance))
+        self.assertFalse(os.path.samefile(self.target(patch.file), os.path.join(self.data, 'file.txt')))
+        with open(self.target(patch.file)) as f:
+            self.assertEqual(f.read(), 'content')
+
+        # on another filesystem, the equal copy is not a change
+        self.assertTrue(can_hardlink(os.path.join(self.data, 'file.txt'), self.target(patch.file)))
+        with mock.patch('src.patcher.patch.can_hardlink', return_value=False):
+            self.assertFalse(patch.has_changes(self.instance))
+            self.write(self.target(patch.file), 'CONTENT')
+            self.assertTrue(patch.has_changes(self.instance))
+
+    def test_reflink(self):
+        patch = PatchObject('resourcepacks/pack.zip', 'file.txt', Method.REFLINK)
+        self.assert_applied_once(patch)
+        self.assertFalse(os.path.samefile(self.target(patch.file), os.path.join(self.data, 'file.txt')))
+        with open(self.target(patch.file)) as f:
+            self.assertEqual(f.read(), 'content')
+
+    def test_reflink_fallback(self):
+        with mock.patch('src.patcher.files._clone', return_value=False):
+            self.assertFalse(reflink_file(os.path.join(self.data, 'file.txt'), self.target('copy.txt')))
+        with open(self.target('copy.txt')) as f:
+            self.assertEqual(f.read(), 'content')
+
+    def test_sync(self):
+        os.makedirs(os.path.join(self.data, 'shaders', 'lib'))
+        self.write(os.path.join(self.data, 'shaders', 'lib', 'common.glsl'), 'glsl')
+        patch = PatchObject('shaderpacks/pack', 'shaders', 'sync', delete=True)
+        self.assert_applied_once(patch)
+        self.assertTrue(os.path.isfile(self.target('shaderpacks/pack/lib/common.glsl')))
+
+    def test_merge(self):
+        self.write(self.target('config.json'), '{"b": 2}')
+        self.assert_applied_once(PatchObject('config.json', 'config.json', Method.MERGE))
+
+        # the file is only changed when the merge changes it
+        self.write(self.target('config.json'), '{"a": 2}')
+        self.assertTrue(PatchObject('config.json', 'config.json', Method.MERGE).apply(self.instance))
+
+    def test_deep_merge(self):
+        self.write(os.path.join(self.data, 'nested.json'), '{"a": {"x": 1}}')
+        for deep, merged in ((False, '{"x": 1}'), (True, '{"y": 2, "x": 1}')):
+            self.write(self.target('nested.json'), '{"a": {"y": 2}}')
+            PatchObject('nested.json', 'nested.json', Method.MERGE, deep=deep).apply(self.instance)
+            with open(self.target('nested.json')) as f:
+                self.assertEqual(json.dumps(json.load(f)['a']), merged)
+        self.assertNotEqual(PatchObject('a.json', 'a.json', Method.MERGE, deep=True).key,
+                            PatchObject('a.json', 'a.json', Method.MERGE).key)
+
+    def test_snapshot_updated(self):
+        patch = PatchObject('config/file.txt', 'file.txt', Method.INSERT)
+        self.assertFalse(self.instance.files.exists('config/*.txt'))
+        patch.apply(self.instance)
+        self.assertTrue(self.instance.files.exists('config/*.txt'))
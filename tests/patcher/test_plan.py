@@ -0,0 +1,228 @@
+import copy
+import os
+from unittest import mock
+
+from src.instance import GameInstance
+from src.patcher.conditions import FileConditionObject
+from src.patcher.config import Config
+from src.patcher.patch import Method, PatchObject
+from src.patcher.transaction import Transaction
+
+from tests.utils import TempDirTestCase
+
+
+config = {
+    'patches': [
+        {
+            'patch': {'file': 'options.txt', 'with': 'options.txt', 'method': 'insert'},
+            'if': {'file': 'options.txt', 'exists': False},
+        },
+        {
+            'patch': [
+                {'file': 'config/a.json', 'with': 'a.json', 'method': 'overwrite'},
+                {'file': 'config/b.json', 'with': 'a.json', 'method': 'overwrite'},
+            ],
+            'if': {'file': 'mods/*.jar'},
+        },
+    ]
+}
+
+
+class TestPlan(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.data = os.path.join(self.root, 'data')
+        for name in ('options.txt', 'a.json'):
+            self.write(os.path.join(self.data, name), name)
+
+        # instance1 has a mod, instance2 already has options.txt
+        self.write('instances/instance1/mods/mod.jar', '')
+        os.makedirs(os.path.join(self.root, 'instances', 'instance2', 'saves'))
+        self.write('instances/instance2/options.txt', '')
+
+        self.instances = GameInstance.from_path(os.path.join(self.root, 'instances'))
+        self.instances.sort(key=lambda instance: instance.path)
+        # loading the config modifies it
+        self.config = Config(copy.deepcopy(config), self.data)
+
+    def test_plan(self):
+        plan = self.config.plan(self.instances)
+        i1, i2 = self.instances
+        self.assertEqual(
+            [(instance, patch.file) for instance, patch, _ in plan],
+            [(i1, 'options.txt'), (i1, 'config/a.json'), (i1, 'config/b.json')]
+        )
+
+    def test_apply_plan_without_conditions(self):
+        plan = self.config.plan(self.instances)
+        with mock.patch.object(FileConditionObject, '_check') as check:
+            self.config.apply(plan)
+        check.assert_not_called()
+
+        i1, _ = self.instances
+        for file in ('options.txt', 'config/a.json', 'config/b.json'):
+            self.assertTrue(os.path.isfile(os.path.join(i1.path, file)))
+
+    def test_verify(self):
+        plan = self.config.plan(self.instances)
+        i1, _ = self.instances
+
+        # options.txt was created after the preview, so inserting it is stale
+        self.write(os.path.join(i1.path, 'options.txt'), 'mine')
+        with mock.patch('builtins.print') as print_:
+            self.config.apply(plan, verify=True)
+        self.assertIn('Skipping stale patch', print_.call_args.args[0])
+
+        self.assertEqual(self.read(os.path.join(i1.path, 'options.txt')), 'mine')
+        self.assertTrue(os.path.isfile(os.path.join(i1.path, 'config/b.json')))
+
+    def test_jobs(self):
+        for jobs in (1, 4):
+            for instance in self.instances:
+                for file in ('options.txt', 'config/a.json', 'config/b.json'):
+                    if os.path.exists(os.path.join(instance.path, file)):
+                        os.remove(os.path.join(instance.path, file))
+                instance.files.clear()
+
+            plan = self.config.plan(self.instances)
+            self.assertEqual(self.config.apply(plan, jobs=jobs), [])
+            i1, _ = self.instances
+            for file in ('options.txt', 'config/a.json', 'config/b.json'):
+                self.assertTrue(os.path.isfile(os.path.join(i1.path, file)))
+
+    def test_errors_per_instance(self):
+        i1, i2 = self.instances
+        bad = Config({'patches': [
+            {
+                'patch': {'file': 'first.txt', 'with': 'a.json', 'method': 'overwrite'},
+            },
+            {
+                'patch': {'file': 'broken.txt', 'with': 'missing.txt', 'method': 'overwrite'},
+                'if': {'instance_pattern': '.*/instance1$'},
+            },
+            {
+                'patch': {'file': 'last.txt', 'with': 'a.json', 'method': 'overwrite'},
+            },
+        ]}, self.data)
+
+        for jobs in (1, 2):
+            errors = bad.apply(self.instances, jobs=jobs)
+            self.assertEqual([instance for instance, _ in errors], [i1])
+            self.assertIsInstance(errors[0][1], FileNotFoundError)
+
+            # the failed instance stops at the error, the other one is fully patched
+            self.assertTrue(os.path.isfile(os.path.join(i1.path, 'first.txt')))
+            self.assertFalse(os.path.isfile(os.path.join(i1.path, 'last.txt')))
+            self.assertTrue(os.path.isfile(os.path.join(i2.path, 'last.txt')))
+
+    def test_stream(self):
+        i1, i2 = self.instances
+        seen = []
+
+        def instances():
+            for instance in self.instances:
+                # each instance is patched before the next one is requested
+                seen.append([os.path.isfile(os.path.join(i.path, 'options.txt')) for i in (i1, i2)])
+                yield instance
+
+        with mock.patch('builtins.print'):
+            applied, errors = self.config.stream(instances())
+            self.assertEqual((applied, errors), (3, []))
+            self.assertEqual(seen, [[False, True], [True, True]])
+            self.assertTrue(os.path.isfile(os.path.join(i1.path, 'config/b.json')))
+            self.assertEqual(self.config.stream(self.instances), (0, []))
+
+    def test_transactional(self):
+        i1, i2 = self.instances
+        bad = Config({'patches': [
+            {
+                'patch': {'file': 'first.txt', 'with': 'a.json', 'method': 'overwrite'},
+            },
+            {
+                'patch': {'file': 'broken.txt', 'with': 'missing.txt', 'method': 'overwrite'},
+                'if': {'instance_pattern': '.*/instance1$'},
+            },
+            {
+                'patch': {'file': 'last.txt', 'with': 'a.json', 'method': 'overwrite'},
+            },
+        ]}, self.data)
+
+        for jobs in (1, 2):
+            errors = bad.apply(self.instances, jobs=jobs, transactional=True)
+            self.assertEqual([instance for instance, _ in errors], [i1])
+            self.assertIsInstance(errors[0][1], FileNotFoundError)
+
+            # the failed instance isn't changed at all, the other one is fully patched
+            self.assertFalse(os.path.exists(os.path.join(i1.path, 'first.txt')))
+            self.assertTrue(os.path.isfile(os.path.join(i2.path, 'first.txt')))
+            self.assertTrue(os.path.isfile(os.path.join(i2.path, 'last.txt')))
+            for instance in self.instances:
+                self.assertFalse(os.path.exists(os.path.join(instance.path, '.mc-patcher', 'staging')))
+
+        # the committed patches are recorded like the ones applied in place
+        self.assertEqual(bad.plan([i2]).steps, [])
+
+    def test_plan_errors_per_instance(self):
+        i1, i2 = self.instances
+        self.write(os.path.join(self.data, 'x.json'), '{"a": 2}')
+        for instance, content in ((i1, '{"a": '), (i2, '{"a": 1}')):
+            self.write(os.path.join(instance.path, 'config', 'x.json'), content)
+        merging = Config({'patches': [{'patch': {'file': 'config/x.json', 'with': 'x.json', 'method': 'merge'}}]},
+                         self.data)
+
+        # the broken target of instance1 doesn't stop instance2 from being planned and patched
+        plan = merging.plan(self.instances)
+        self.assertEqual([instance for instance, _ in plan.errors], [i1])
+        self.assertIsInstance(plan.errors[0][1], ValueError)
+        self.assertEqual([instance for instance, _, _ in plan], [i2])
+        self.assertEqual([instance for instance, _ in plan.apply(jobs=2)], [i1])
+        self.assertEqual(self.read(os.path.join(i2.path, 'config', 'x.json')), '{\n    "a": 2\n}')
+
+        applied, errors = merging.stream(self.instances)
+        self.assertEqual((applied, [instance for instance, _ in errors]), (0, [i1]))
+
+    def test_recover_in_every_mode(self):
+        i1, _ = self.instances
+        # a transactional commit that stopped after inserting options.txt
+        transaction = Transaction(i1.path)
+        PatchObject('options.txt', 'options.txt', Method.INSERT).stage(i1, transaction)
+        transaction._write_journal([('options.txt', None)])
+        os.replace(transaction.staged['options.txt'], os.path.join(i1.path, 'options.txt'))
+
+        # planning without --transactional rolls it back, so options.txt is inserted again
+        with mock.patch('builtins.print') as print_:
+            plan = self.config.plan(self.instances)
+        self.assertIn('Rolled back an interrupted commit', print_.call_args.args[0])
+        self.assertFalse(os.path.exists(transaction.journal_path))
+        self.assertIn((i1, 'options.txt'), [(instance, patch.file) for instance, patch, _ in plan])
+
+    def test_overlapping_targets(self):
+        i1, _ = self.instances
+        self.write(os.path.join(self.data, 'general.txt'), 'general')
+        self.write(os.path.join(self.data, 'specific.txt'), 'specific')
+        self.write(os.path.join(self.data, 'general.json'), '{"a": 1, "b": 1}')
+        self.write(os.path.join(self.data, 'specific.json'), '{"a": 2}')
+        overlapping = Config({'patches': [
+            {'patch': [
+                {'file': 'config/x.txt', 'with': 'general.txt', 'method': 'overwrite'},
+                {'file': 'config/x.json', 'with': 'general.json', 'method': 'merge'},
+            ]},
+            {'patch': [
+                {'file': 'config/x.txt', 'with': 'specific.txt', 'method': 'overwrite'},
+                {'file': 'config/x.json', 'with': 'specific.json', 'method': 'merge'},
+            ]},
+        ]}, self.data)
+        self.write(os.path.join(i1.path, 'config', 'x.json'), '{}')
+
+        # the last patch of each target wins on every run, and the next runs don't write anything
+        for run, use_manifest in enumerate((True, True, False, False, True)):
+            plan = overlapping.plan([i1], use_manifest)
+            # the first overwrite of x.txt is replaced by the second one, so it is never applied
+            self.assertEqual(len(plan), 0 if run else 3)
+            self.assertEqual(plan.apply(), [])
+            self.assertEqual(self.read(os.path.join(i1.path, 'config', 'x.txt')), 'specific')
+            self.assertEqual(self.read(os.path.join(i1.path, 'config', 'x.json')), '{\n    "a": 2,\n    "b": 1\n}')
+
+        # overwriting the target makes the earlier overwrite pointless
+        self.write(os.path.join(i1.path, 'config', 'x.txt'), 'mine')
+        self.assertEqual([patch.with_file for _, patch, _ in overlapping.plan([i1])], ['specific.txt'])
@@ -0,0 +1,103 @@
+import os
+from unittest import mock
+
+from src.patcher.sync import SyncPlan, sync
+
+from tests.utils import TempDirTestCase
+
+
+def read_tree(root: str) -> dict[str, str]:
+    tree = {}
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            with open(path, encoding='utf-8') as f:
+                tree[os.path.relpath(path, root).replace(os.sep, '/')] = f.read()
+    return tree
+
+
+class TestSync(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.source = os.path.join(self.root, 'source')
+        self.target = os.path.join(self.root, 'instance', 'shaderpacks')
+        for path, content in {
+            'a.txt': 'a',
+            'pack/shaders.properties': 'b',
+            'pack/lib/common.glsl': 'c',
+        }.items():
+            self.write(os.path.join(self.source, path), content)
+
+    def test_sync(self):
+        self.assertTrue(sync(self.source, self.target, dry_run=True))
+        self.assertFalse(os.path.exists(self.target))
+
+        self.assertTrue(sync(self.source, self.target))
+        self.assertEqual(read_tree(self.target), read_tree(self.source))
+
+        # nothing changed, nothing is copied
+        with mock.patch('src.patcher.sync.copy_file') as copy_file:
+            self.assertFalse(sync(self.source, self.target))
+        copy_file.assert_not_called()
+
+    def test_changed_files(self):
+        sync(self.source, self.target)
+        self.write(os.path.join(self.source, 'pack/lib/common.glsl'), 'changed')
+        self.write(os.path.join(self.source, 'pack/new.glsl'), 'new')
+
+        plan = SyncPlan(self.source, self.target)
+        self.assertEqual(sorted(plan.copies), ['pack/lib/common.glsl', 'pack/new.glsl'])
+        plan.apply()
+        self.assertEqual(read_tree(self.target), read_tree(self.source))
+
+    def test_delete(self):
+        sync(self.source, self.target)
+        self.write(os.path.join(self.target, 'extra.txt'), 'extra')
+        self.write(os.path.join(self.target, 'extra/file.txt'), 'extra')
+
+        # extraneous files are kept by default
+        self.assertFalse(sync(self.source, self.target))
+        self.assertIn('extra.txt', read_tree(self.target))
+
+        self.assertEqual(sorted(SyncPlan(self.source, self.target, delete=True).removals), ['extra', 'extra.txt'])
+        self.assertTrue(sync(self.source, self.target, delete=True))
+        self.assertEqual(read_tree(self.target), read_tree(self.source))
+
+    def test_missing_source(self):
+        sync(self.source, self.target)
+        # a typo in the source must not delete the whole target
+        with self.assertRaises(FileNotFoundError):
+            sync(os.path.join(self.root, 'sourec'), self.target, delete=True)
+        with self.assertRaises(NotADirectoryError):
+            sync(os.path.join(self.source, 'a.txt'), self.target, delete=True)
+        self.assertEqual(read_tree(self.target), read_tree(self.source))
+
+    def test_checksum(self):
+        sync(self.source, self.target)
+        # same content, different mtime
+        os.utime(os.path.join(self.target, 'a.txt'), ns=(0, 0))
+        self.assertEqual(SyncPlan(self.source, self.target).copies, ['a.txt'])
+        self.assertEqual(SyncPlan(self.source, self.target, checksum=True).copies, [])
+
+    def test_type_conflict(self):
+        self.write(os.path.join(self.target, 'a.txt', 'file'), 'dir in place of a file')
+        self.write(os.path.join(self.target, 'pack'), 'file in place of a dir')
+        self.assertTrue(sync(self.source, self.target))
+        self.assertEqual(read_tree(self.target), read_tree(self.source))
+
+    def test_symlinked_target(self):
+        # a target that is a symlink to another folder is replaced, not written through
+        other = os.path.join(self.root, 'other')
+        os.makedirs(other)
+        os.makedirs(os.path.dirname(self.target))
+        os.symlink(other, self.target, target_is_directory=True)
+
+        self.assertTrue(sync(self.source, self.target))
+        self.assertFalse(os.path.islink(self.target))
+        self.assertEqual(os.listdir(other), [])
+
+    def test_many_files(self):
+        for i in range(100):
+            self.write(os.path.join(self.source, 'many', f'{i}.txt'), str(i))
+        self.assertTrue(sync(self.source, self.target))
+        self.assertEqual(read_tree(self.target), read_tree(self.source))
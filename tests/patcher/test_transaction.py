@@ -0,0 +1,87 @@
+import json
+import os
+from unittest import mock
+
+from src.instance import GameInstance
+from src.patcher.patch import Method, PatchObject
+from src.patcher.transaction import Transaction, recover
+from tests.utils import TempDirTestCase
+
+
+class TestTransaction(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.data = os.path.join(self.root, 'data')
+        self.instance = GameInstance(os.path.join(self.root, 'instance'))
+        os.makedirs(os.path.join(self.instance.path, 'config'))
+        self.write(os.path.join(self.data, 'a.json'), json.dumps({'a': 1}))
+        self.write(os.path.join(self.data, 'b.json'), json.dumps({'b': 2}))
+        self.write(self.target('config/old.json'), json.dumps({'old': 0}))
+        PatchObject.CONFIG_FILES_DIR = self.data
+
+    def target(self, file: str) -> str:
+        return os.path.join(self.instance.path, file)
+
+    def test_stage_and_commit(self):
+        transaction = Transaction(self.instance.path)
+        self.assertTrue(PatchObject('config/new.json', 'a.json', Method.INSERT).stage(self.instance, transaction))
+        # later patches see the staged files
+        self.assertTrue(PatchObject('config/new.json', 'b.json', Method.MERGE).stage(self.instance, transaction))
+        self.assertTrue(PatchObject('config/old.json', 'b.json', Method.MERGE).stage(self.instance, transaction))
+        self.assertFalse(PatchObject('config/new.json', 'b.json', Method.MERGE).stage(self.instance, transaction))
+        self.assertEqual(len(transaction), 2)
+
+        # nothing is changed before the commit
+        self.assertFalse(os.path.exists(self.target('config/new.json')))
+        self.assertEqual(json.loads(self.read(self.target('config/old.json'))), {'old': 0})
+
+        transaction.commit()
+        self.assertEqual(json.loads(self.read(self.target('config/new.json'))), {'a': 1, 'b': 2})
+        self.assertEqual(json.loads(self.read(self.target('config/old.json'))), {'old': 0, 'b': 2})
+        self.assertFalse(os.path.exists(transaction.staging_dir))
+        self.assertFalse(os.path.exists(transaction.journal_path))
+
+    def test_unchanged_merge_is_not_staged(self):
+        self.write(self.target('config/old.json'), json.dumps({'b': 2}))
+        transaction = Transaction(self.instance.path)
+        self.assertFalse(PatchObject('config/old.json', 'b.json', Method.MERGE).stage(self.instance, transaction))
+        self.assertEqual(len(transaction), 0)
+
+    def test_failed_commit(self):
+        transaction = Transaction(self.instance.path)
+        PatchObject('config/new.json', 'a.json', Method.INSERT).stage(self.instance, transaction)
+        PatchObject('config/old.json', 'a.json', Method.OVERWRITE).stage(self.instance, transaction)
+
+        # the second rename fails
+        replace = os.replace
+        failing = transaction.staged['config/old.json']
+
+        def fail(src, dst):
+            if src == failing:
+                raise PermissionError(dst)
+            replace(src, dst)
+
+        with mock.patch('os.replace', side_effect=fail):
+            with self.assertRaises(PermissionError):
+                transaction.commit()
+        # the failed commit restored the instance itself
+        self.assertFalse(os.path.exists(self.target('config/new.json')))
+        self.assertEqual(json.loads(self.read(self.target('config/old.json'))), {'old': 0})
+        self.assertFalse(recover(self.instance.path))
+
+    def test_recover_journal(self):
+        transaction = Transaction(self.instance.path)
+        PatchObject('config/new.json', 'a.json', Method.INSERT).stage(self.instance, transaction)
+        PatchObject('config/old.json', 'a.json', Method.OVERWRITE).stage(self.instance, transaction)
+
+        # a journal left by a commit that stopped after replacing the files
+        backups = {file: transaction._backup(file) for file in transaction.staged}
+        transaction._write_journal(list(backups.items()))
+        for file, staged in transaction.staged.items():
+            os.replace(staged, self.target(file))
+
+        self.assertTrue(recover(self.instance.path))
+        self.assertFalse(os.path.exists(self.target('config/new.json')))
+        self.assertEqual(json.loads(self.read(self.target('config/old.json'))), {'old': 0})
+        self.assertFalse(os.path.exists(transaction.staging_dir))
+        self.assertFalse(os.path.exists(transaction.journal_path))
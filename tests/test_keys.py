@@ -0,0 +1,41 @@
+import unittest
+from io import StringIO
+
+from src import keys, options
+
+
+class TestKeys(unittest.TestCase):
+    def test_tables(self):
+        # every code has a single name, so the tables translate both ways
+        self.assertEqual(len(keys.CODES_TO_NAMES), len(keys.NAMES_TO_CODES))
+        for code, name in keys.CODES_TO_NAMES.items():
+            self.assertEqual(keys.NAMES_TO_CODES[name], code)
+
+        self.assertEqual(keys.CODES_TO_NAMES[2], 'key.keyboard.1')
+        self.assertEqual(keys.CODES_TO_NAMES[71], 'key.keyboard.keypad.7')
+        self.assertEqual(keys.CODES_TO_NAMES[-97], 'key.mouse.4')
+
+    def test_key_format(self):
+        self.assertEqual(keys.key_format(None), keys.LWJGL2)
+        self.assertEqual(keys.key_format(1343), keys.LWJGL2)
+        self.assertEqual(keys.key_format(keys.LWJGL3_VERSION), keys.LWJGL3)
+
+    def test_translate_all(self):
+        old = {'version': 1343, 'key_key.jump': 57, 'key_key.chat': '20', 'key_key.kana': 112, 'fov': 70}
+        new = keys.translate_all(old, 1343, 3465)
+        self.assertEqual(new, {
+            'version': 1343, 'key_key.jump': 'key.keyboard.space', 'key_key.chat': 'key.keyboard.t',
+            'key_key.kana': 112, 'fov': 70,
+        })
+        self.assertEqual(keys.translate_all(new, 3465, 1343), {**old, 'key_key.chat': 20})
+        # the same format is kept as it is
+        self.assertEqual(keys.translate_all(old, 1343, 1139), old)
+        self.assertEqual(keys.translate('key.keyboard.minus', 3465, None), 12)
+
+    def test_options_round_trip(self):
+        # the number row and the keypad were mixed up in the old table
+        text = 'version:1343\nkey_key.hotbar.1:2\nkey_key.hotbar.2:3\nkey_key.zoom:71\nkey_key.menu:221'
+        loaded = options.load(StringIO(text))
+        self.assertEqual(loaded['key_key.hotbar.1'], 'key.keyboard.1')
+        self.assertEqual(loaded['key_key.zoom'], 'key.keyboard.keypad.7')
+        self.assertEqual(options.dump(loaded), text)
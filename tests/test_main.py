@@ -0,0 +1,16 @@
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestMain(unittest.TestCase):
+    def test_lazy_imports(self):
+        # the merge backends are only loaded when a file of their type is merged
+        code = 'import sys, main; print(" ".join(sorted(sys.modules)))'
+        modules = subprocess.run([sys.executable, '-c', code], cwd=ROOT,
+                                 capture_output=True, text=True, check=True).stdout.split()
+        for module in ('json5', 'yaml', 'toml', 'src.options', 'hashlib', 'concurrent.futures'):
+            self.assertNotIn(module, modules)
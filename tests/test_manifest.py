@@ -0,0 +1,100 @@
+import os
+from unittest import mock
+
+from src.instance import GameInstance
+from src.manifest import Manifest
+from src.patcher.config import Config
+from src.patcher.patch import PatchObject
+
+from tests.utils import TempDirTestCase
+
+
+def make_config(data: str) -> Config:
+    return Config({'patches': [
+        {'patch': {'file': 'config/a.txt', 'with': 'a.txt', 'method': 'overwrite'}},
+        {'patch': {'file': 'config/b.json', 'with': 'b.json', 'method': 'merge'}},
+    ]}, data)
+
+
+class TestManifest(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        root = self.root
+        self.data = os.path.join(root, 'data')
+        os.makedirs(self.data)
+        self.write(os.path.join(self.data, 'a.txt'), 'a')
+        self.write(os.path.join(self.data, 'b.json'), '{"b": 1}')
+
+        self.instance_path = os.path.join(root, 'instance')
+        os.makedirs(os.path.join(self.instance_path, 'config'))
+        self.write(os.path.join(self.instance_path, 'config', 'b.json'), '{"c": 1}')
+
+    def run_patcher(self, use_manifest: bool = True) -> tuple[int, int]:
+        '''Plan and apply the config on a fresh instance, return the planned steps and the number of file checks.'''
+        instance = GameInstance(self.instance_path)
+        config = make_config(self.data)
+        with mock.patch.object(PatchObject, 'has_changes', autospec=True,
+                               side_effect=PatchObject.has_changes) as has_changes:
+            plan = config.plan([instance], use_manifest)
+        self.assertEqual(config.apply(plan), [])
+        return len(plan), has_changes.call_count
+
+    def test_steady_state(self):
+        self.assertEqual(self.run_patcher(), (2, 2))
+        self.assertTrue(os.path.isfile(os.path.join(self.instance_path, '.mc-patcher', 'state.json')))
+
+        # nothing changed, so the files are not even compared
+        self.assertEqual(self.run_patcher(), (0, 0))
+        self.assertEqual(self.run_patcher(use_manifest=False), (0, 2))
+
+    def test_changed_target(self):
+        self.run_patcher()
+        self.write(os.path.join(self.instance_path, 'config', 'b.json'), '{"c": 2}')
+        self.assertEqual(self.run_patcher(), (1, 1))
+        self.assertEqual(self.run_patcher(), (0, 0))
+
+    def test_changed_source(self):
+        self.run_patcher()
+        self.write(os.path.join(self.data, 'a.txt'), 'b')
+        self.assertEqual(self.run_patcher(), (1, 1))
+
+    def test_unchanged_is_recorded(self):
+        # the target is already up to date, so it's recorded without being written
+        self.write(os.path.join(self.instance_path, 'config', 'a.txt'), 'a')
+        self.write(os.path.join(self.instance_path, 'config', 'b.json'), '{\n    "c": 1,\n    "b": 1\n}')
+        self.assertEqual(self.run_patcher(), (0, 2))
+        self.assertEqual(self.run_patcher(), (0, 0))
+
+    def test_hashes(self):
+        self.run_patcher()
+        entries = Manifest(self.instance_path).entries
+        entry = entries['config/a.txt']
+        self.assertEqual([patch['key'] for patch in entry['patches']], ['overwrite:a.txt:config/a.txt'])
+        self.assertEqual(entry['patches'][0]['source']['hash'], entry['target']['hash'])
+
+    def test_plan_is_not_recorded(self):
+        # a declined preview leaves the instance as it is, even if a patch was found applied
+        self.write(os.path.join(self.instance_path, 'config', 'a.txt'), 'a')
+        plan = make_config(self.data).plan([GameInstance(self.instance_path)])
+        self.assertEqual(len(plan), 1)
+        self.assertFalse(os.path.exists(os.path.join(self.instance_path, '.mc-patcher')))
+        self.assertEqual(plan.apply(), [])
+        self.assertEqual(self.run_patcher(), (0, 0))
+
+    def test_later_patch_of_target(self):
+        self.write(os.path.join(self.data, 'c.json'), '{"b": 2}')
+        both = Config({'patches': [
+            {'patch': {'file': 'config/b.json', 'with': 'b.json', 'method': 'merge'}},
+            {'patch': {'file': 'config/b.json', 'with': 'c.json', 'method': 'merge'}},
+        ]}, self.data)
+        for _ in range(2):
+            self.assertEqual(both.apply([GameInstance(self.instance_path)]), [])
+        self.assertEqual(len(both.plan([GameInstance(self.instance_path)])), 0)
+
+        # the manifest knows that c.json was merged after b.json, so b.json alone is merged again
+        instance = GameInstance(self.instance_path)
+        plan = make_config(self.data).plan([instance])
+        self.assertEqual([patch.with_file for _, patch, _ in plan], ['a.txt', 'b.json'])
+        self.assertEqual(plan.apply(), [])
+        with open(os.path.join(self.instance_path, 'config', 'b.json')) as f:
+            self.assertEqual(f.read(), '{\n    "c": 1,\n    "b": 1\n}')
@@ -0,0 +1,110 @@
+import json
+import os
+import zipfile
+
+from src.instance import GameInstance
+from src.mods import ModIndex, VersionRange, read_jar, version_key
+from src.patcher.conditions import BaseConditionObject, ModConditionObject
+
+from tests.utils import TempDirTestCase
+
+
+def make_jar(path: str, files: dict[str, str]):
+    with zipfile.ZipFile(path, 'w') as jar:
+        for name, content in files.items():
+            jar.writestr(name, content)
+
+
+class TestMods(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.instance_path = self.root
+        self.mods = os.path.join(self.instance_path, 'mods')
+        os.makedirs(self.mods)
+
+        make_jar(os.path.join(self.mods, 'sodium-fabric-0.5.8+mc1.20.1.jar'), {
+            'fabric.mod.json': json.dumps({'id': 'sodium', 'version': '0.5.8+mc1.20.1', 'provides': ['rubidium']}),
+        })
+        make_jar(os.path.join(self.mods, 'qsl.jar'), {
+            'quilt.mod.json': json.dumps({'quilt_loader': {
+                'id': 'qsl', 'version': '6.1.2', 'provides': [{'id': 'quilted_fabric_api', 'version': '7.4.0'}],
+            }}),
+        })
+        make_jar(os.path.join(self.mods, 'jei.jar'), {
+            'META-INF/mods.toml': '[[mods]]\nmodId="jei"\nversion="${file.jarVersion}"\n',
+            'META-INF/MANIFEST.MF': 'Manifest-Version: 1.0\nImplementation-Version: 15.2.0.27\n',
+        })
+        make_jar(os.path.join(self.mods, 'library.jar'), {'com/example/Library.class': ''})
+        self.write(os.path.join(self.mods, 'broken.jar'), 'not a zip')
+
+    def test_read_jar(self):
+        self.assertEqual(read_jar(os.path.join(self.mods, 'sodium-fabric-0.5.8+mc1.20.1.jar')),
+                         [['sodium', '0.5.8+mc1.20.1'], ['rubidium', '0.5.8+mc1.20.1']])
+        self.assertEqual(read_jar(os.path.join(self.mods, 'qsl.jar')),
+                         [['qsl', '6.1.2'], ['quilted_fabric_api', '7.4.0']])
+        self.assertEqual(read_jar(os.path.join(self.mods, 'jei.jar')), [['jei', '15.2.0.27']])
+        self.assertEqual(read_jar(os.path.join(self.mods, 'library.jar')), [])
+        self.assertEqual(read_jar(os.path.join(self.mods, 'broken.jar')), [])
+
+        # metadata of the wrong types isn't a mod either
+        for name, metadata in (('null.jar', {'id': 'a', 'provides': None}), ('list.jar', [{'id': 'a'}])):
+            make_jar(os.path.join(self.mods, name), {'fabric.mod.json': json.dumps(metadata)})
+            self.assertEqual(read_jar(os.path.join(self.mods, name)), [])
+
+    def test_version_range(self):
+        self.assertEqual(version_key('0.5.8+mc1.20.1'), (0, 5, 8))
+        self.assertEqual(version_key('1.0.0-beta.2'), (1, 0, 0))
+        # Forge mods put the Minecraft version first
+        self.assertEqual(version_key('1.20.1-2.1.0'), (2, 1, 0))
+        self.assertEqual(version_key('mc1.20.1-2.1.0-beta.1'), (2, 1, 0))
+
+        cases = [
+            ('>=0.5 <0.6', '0.5.8+mc1.20.1', True),
+            ('>=0.5 <0.6', '0.6', False),
+            ('1.20.x', '1.20.4', True),
+            ('1.20.*', '1.21', False),
+            ('1.20', '1.20.0', True),
+            ('!=1.20', '1.20.1', True),
+            ('<1 || >=2', '1.5', False),
+            ('<1 || >=2', '2.0.1', True),
+            ('*', '0.0.1', True),
+            ('>=2', '1.20.1-2.1.0', True),
+        ]
+        for spec, version, expected in cases:
+            self.assertEqual(VersionRange(spec).matches(version), expected, (spec, version))
+
+    def test_index(self):
+        index = ModIndex(self.instance_path)
+        installed = index.scan(os.listdir(self.mods))
+        self.assertEqual(installed['sodium'], ['0.5.8+mc1.20.1'])
+        self.assertEqual(installed['jei'], ['15.2.0.27'])
+        self.assertEqual(index.opened, 5)
+
+        # a new index only opens the changed jars
+        make_jar(os.path.join(self.mods, 'qsl.jar'), {
+            'quilt.mod.json': json.dumps({'quilt_loader': {'id': 'qsl', 'version': '7.0.0'}}),
+        })
+        os.remove(os.path.join(self.mods, 'jei.jar'))
+        index = ModIndex(self.instance_path)
+        installed = index.scan(os.listdir(self.mods))
+        self.assertEqual(index.opened, 1)
+        self.assertEqual(installed['qsl'], ['7.0.0'])
+        self.assertNotIn('jei', installed)
+        self.assertNotIn('jei.jar', ModIndex(self.instance_path).jars)
+
+    def test_condition(self):
+        instance = GameInstance(self.instance_path)
+        cases = [
+            ({'mod': 'sodium'}, True),
+            ({'mod': 'rubidium', 'version': '>=0.5'}, True),
+            ({'mod': 'sodium', 'version': '<0.5'}, False),
+            ({'mod': ['iris', 'jei'], 'version': '15.x'}, True),
+            ({'mod': 'iris'}, False),
+            ({'mod': 'iris', 'exists': False}, True),
+        ]
+        for data, expected in cases:
+            condition = BaseConditionObject.create_condition(data)
+            self.assertIsInstance(condition, ModConditionObject)
+            self.assertEqual(condition.check(instance), expected, data)
+        # all conditions share the same scan of the mods folder
+        self.assertEqual(instance.mods.opened, 5)
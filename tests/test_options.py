@@ -1,7 +1,7 @@
 import unittest
 from io import StringIO
 
-from src.options import load, dump, KEY_CODES
+from src.options import load, dump, merge, KEY_CODES
 
 test_new_options = '''
 version:3120
@@ -74,3 +74,18 @@ class TestOptions(unittest.TestCase):
 
     def test_dump_old(self):
         self.assertEqual(dump(test_old_dict).strip(), test_old_options.strip())
+
+    def test_merge(self):
+        text = 'version:1343\r\nautoJump:false\r\nfov:070\r\nkey_key.jump:57\r\nlang:en_us'
+        source = {'autoJump': True, 'key_key.jump': 'key.keyboard.space', 'key_key.chat': 'key.keyboard.t'}
+
+        # untouched lines are kept as they are, even if `dump` would write them differently
+        merged = merge(StringIO(text, newline=''), source)
+        self.assertEqual(
+            merged,
+            'version:1343\r\nautoJump:true\r\nfov:070\r\nkey_key.jump:57\r\nlang:en_us\r\nkey_key.chat:20\r\n'
+        )
+        self.assertIsNone(merge(StringIO(merged, newline=''), source))
+
+        self.assertEqual(merge(StringIO(merged, newline=''), {}, delete={'fov', 'key_key.chat'}),
+                         'version:1343\r\nautoJump:true\r\nkey_key.jump:57\r\nlang:en_us\r\n')
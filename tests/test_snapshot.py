@@ -0,0 +1,78 @@
+import glob
+import os
+
+from tests.utils import TempDirTestCase, mock_dir
+
+from src.snapshot import FileSnapshot, GlobPattern
+
+
+mocks = mock_dir({
+    'root': {
+        'mods': {
+            'sodium-1.0.jar': '',
+            'lithium.jar': '',
+        },
+        'config': {
+            'ias.json': '',
+        },
+        'options.txt': '',
+    }
+})
+
+files = [
+    'options.txt',
+    '.hidden',
+    'mods/Sodium-1.0.jar',
+    'mods/lithium.jar',
+    'mods/.disabled.jar',
+    'mods/nested/deep.jar',
+    'config/ias.json',
+    'config/sub/a.toml',
+]
+patterns = [
+    'options.txt', 'options.*', '*.txt', '*', '.*', 'missing', 'missing/*',
+    'mods/*.jar', 'mods/Sodium*.jar', 'mods/[Ss]odium*', 'mods/?ithium.jar', 'mods/.*.jar',
+    '**/*.jar', '*/*', '*/*/*', 'mods/', 'mods/*/', 'mods/lithium.jar/', 'config/*/a.toml',
+    'config/sub', 'mods/nested/*', '**/ias.json', 'options.txt/x',
+]
+
+
+class TestSnapshot(TempDirTestCase):
+    def test_same_as_glob(self):
+        for file in files:
+            self.write(file, '')
+
+        snapshot = FileSnapshot(self.root)
+        for pattern in patterns:
+            self.assertEqual(
+                snapshot.exists(pattern), glob.glob(pattern, root_dir=self.root) != [],
+                f'pattern: {pattern}'
+            )
+
+    def test_compile_shared(self):
+        self.assertIs(GlobPattern.compile('mods/*.jar'), GlobPattern.compile('mods/*.jar'))
+
+    @mocks
+    def test_lists_once(self, *mocks):
+        _, scandir, *_ = mocks
+        snapshot = FileSnapshot('root')
+        for _ in range(3):
+            self.assertTrue(snapshot.exists('mods/sodium*.jar'))
+            self.assertTrue(snapshot.exists('mods/lithium.jar'))
+            self.assertFalse(snapshot.exists('mods/iris*.jar'))
+            self.assertTrue(snapshot.exists('config/ias.json'))
+        self.assertEqual(scandir.call_count, 3)  # root, mods and config
+
+    def test_invalidate(self):
+        snapshot = FileSnapshot(self.root)
+        self.assertFalse(snapshot.exists('config/ias.json'))
+        self.assertFalse(snapshot.exists('config/*'))
+
+        self.write('config/ias.json', '')
+        # still cached
+        self.assertFalse(snapshot.exists('config/ias.json'))
+
+        snapshot.invalidate('config/ias.json')
+        self.assertTrue(snapshot.exists('config/ias.json'))
+        self.assertTrue(snapshot.exists('*/ias.json'))
+        self.assertFalse(snapshot.exists('config/ias.json/'))
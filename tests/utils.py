@@ -1,8 +1,11 @@
 import fnmatch
+import tempfile
 import typing
+import unittest
 from unittest import mock
 
 import os
+import stat
 from io import StringIO
 
 
@@ -46,13 +49,16 @@ class File:
 
     def __init__(self, content: str):
         self.content = content
+        self.mtime_ns = 0  # increased on every write
 
-    def get_io(self):
+    def get_io(self, mode: str = 'r'):
         '''Returns a StringIO that mocks the file.'''
-        io = StringIO(self.content)
+        io = StringIO('' if 'w' in mode else self.content)
         default_close = io.close  # save the original close method
 
         def close():  # override the close method to save the content before closing
+            if 'w' in mode:
+                self.mtime_ns += 1
             self.content = io.getvalue()
             default_close()
         io.close = close
@@ -60,6 +66,37 @@ class File:
         return io
 
 
+class MockDirEntry:
+    '''Mocks an `os.DirEntry` of a mocked directory.'''
+
+    def __init__(self, name: str, path: str, content: typing.Union[File, dict]):
+        self.name = name
+        self.path = path
+        self.content = content
+
+    def is_dir(self, *, follow_symlinks: bool = True) -> bool:
+        return isinstance(self.content, dict)
+
+    def is_file(self, *, follow_symlinks: bool = True) -> bool:
+        return not self.is_dir()
+
+    def is_symlink(self) -> bool:
+        return False
+
+
+class MockScandir(list):
+    '''Mocks the iterator returned by `os.scandir`, which is also a context manager.'''
+
+    def __enter__(self):
+        return iter(self)
+
+    def __exit__(self, *args):
+        pass
+
+    def close(self):
+        pass
+
+
 MockDir = typing.Dict[str, typing.Union[str, 'MockDir']]
 
 
@@ -67,10 +104,12 @@ def mock_dir(obj: MockDir) -> Mocks:
     """
     Creates mocks for
     - os.listdir
+    - os.scandir
     - os.path.isdir
     - os.path.isfile
     - os.path.join
     - os.path.exists
+    - os.stat
     - os.walk
     - glob.glob
     - open
@@ -118,12 +157,30 @@ def mock_dir(obj: MockDir) -> Mocks:
         return items
 
     mock_listdir = mock.patch('os.listdir', side_effect=lambda path: list(get(path).keys()))
+
+    def mock_scandir_effect(path: str):
+        current = get(path)
+        if not isinstance(current, dict):
+            raise FileNotFoundError(f'No such file or directory: {path}')
+        return MockScandir([MockDirEntry(name, f'{path}/{name}', content) for name, content in current.items()])
+    mock_scandir = mock.patch('os.scandir', side_effect=mock_scandir_effect)
     mock_isdir = mock.patch('os.path.isdir', side_effect=lambda path: isinstance(get(path), dict))
-    mock_isfile = mock.patch('os.path.isfile', side_effect=lambda path: not isinstance(get(path), dict))
+    mock_isfile = mock.patch('os.path.isfile', side_effect=lambda path: isinstance(get(path), File))
     default_join = os.path.join
     mock_join = mock.patch('os.path.join', side_effect=lambda *args: default_join(*args).replace('\\', '/'))
     mock_exists = mock.patch('os.path.exists', side_effect=lambda path: get(path) is not None)
 
+    def mock_stat_effect(path: str, *args, **kwargs):
+        current = get(path)
+        if current is None:
+            raise FileNotFoundError(f'No such file or directory: {path}')
+        if isinstance(current, dict):
+            return os.stat_result((stat.S_IFDIR | 0o755, 0, 0, 0, 0, 0, 0, 0, 0, 0))
+        st = os.stat_result((stat.S_IFREG | 0o644, 0, 0, 0, 0, 0, len(current.content), 0, 0, 0))
+        # os.stat_result only takes the nanosecond timestamps as extra fields
+        return os.stat_result(tuple(st) + (0, 0, 0, 0, current.mtime_ns, 0))
+    mock_stat = mock.patch('os.stat', side_effect=mock_stat_effect)
+
     def mock_walk_effect(path: str):
         current = get(path)
         if not isinstance(current, dict):
@@ -151,20 +208,46 @@ def mock_dir(obj: MockDir) -> Mocks:
         return matches
     mock_glob = mock.patch('glob.glob', side_effect=mock_glob_effect)
 
-    def mock_open_effect(path: str, *args, **kwargs):
+    def mock_open_effect(path: str, mode: str = 'r', *args, **kwargs):
         file = get(path)
         if file is None:
             raise FileNotFoundError(f'No such file or directory: {path}')
-        return file.get_io()  # return a StringIO object that mocks the file
+        return file.get_io(mode)  # return a StringIO object that mocks the file
     mock_open = mock.patch('builtins.open', side_effect=mock_open_effect)
 
     return Mocks(
         os_path_listdir=mock_listdir,
+        os_scandir=mock_scandir,
         os_path_isdir=mock_isdir,
         os_path_isfile=mock_isfile,
         os_path_join=mock_join,
         os_path_exists=mock_exists,
+        os_stat=mock_stat,
         os_walk=mock_walk,
         glob_glob=mock_glob,
         open=mock_open,
     )
+
+
+class TempDirTestCase(unittest.TestCase):
+    '''
+    A test case with a real temporary folder, for the code that needs a real filesystem (links, mtimes, zip files...)
+    that `mock_dir` doesn't mock. The folder is `self.root`, and is removed after each test.
+    '''
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+
+    def write(self, path: str, content: str):
+        '''Write a file, creating its folders. Relative paths are inside `self.root`.'''
+        path = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    def read(self, path: str) -> str:
+        '''Read a file, relative paths are inside `self.root`.'''
+        with open(os.path.join(self.root, path), 'r', encoding='utf-8') as f:
+            return f.read()